@@ -0,0 +1,111 @@
+import asyncio
+import os
+import random
+import subprocess
+import sys
+import time
+from typing import Dict, List
+
+import httpx
+
+# Starts the API once with the async engine and once with the sync fallback,
+# drives each with the same number of concurrent clients, and compares
+# throughput and tail latency.
+
+API_KEY = "brat"
+PORT = 3100
+CLIENTS = int(os.getenv("BENCH_CLIENTS", "500"))
+DURATION_SECONDS = float(os.getenv("BENCH_DURATION", "30"))
+MAX_PLAYER_ID = int(os.getenv("BENCH_MAX_PLAYER_ID", "100000"))
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def start_server(db_async: bool) -> subprocess.Popen:
+    # Unthrottled, so both runs measure the engine rather than 429s and 503s
+    env = dict(
+        os.environ, DB_ASYNC="true" if db_async else "false", RATE_LIMIT_PER_SECOND="0", SHED_CHECKOUT_WAITERS="0"
+    )
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "src.api.server:app", "--port", str(PORT), "--log-level", "warning"],
+        cwd=REPO_ROOT,
+        env=env,
+    )
+
+async def wait_until_ready(client: httpx.AsyncClient):
+    for _ in range(100):
+        try:
+            await client.get("/")
+            return
+        except httpx.TransportError:
+            await asyncio.sleep(0.1)
+    raise RuntimeError("Server did not start")
+
+async def run_clients(client: httpx.AsyncClient) -> Dict:
+    latencies: List[float] = []
+    errors = 0
+    deadline = time.perf_counter() + DURATION_SECONDS
+
+    async def one_client():
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            # Spread over many players so most requests miss the inventory cache
+            player_id = random.randint(1, MAX_PLAYER_ID)
+            start = time.perf_counter()
+            try:
+                response = await client.get(f"/players/{player_id}/inventory", params={"limit": 50})
+                if response.status_code >= 400:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    await asyncio.gather(*(one_client() for _ in range(CLIENTS)))
+
+    latencies.sort()
+    def percentile(p: float) -> float:
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))]
+
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput": len(latencies) / DURATION_SECONDS,
+        "p50_ms": percentile(0.50),
+        "p99_ms": percentile(0.99),
+        "max_ms": latencies[-1],
+    }
+
+async def benchmark(db_async: bool) -> Dict:
+    server = start_server(db_async)
+    try:
+        limits = httpx.Limits(max_connections=CLIENTS, max_keepalive_connections=CLIENTS)
+        async with httpx.AsyncClient(
+            base_url=f"http://localhost:{PORT}",
+            headers={"access_token": API_KEY},
+            limits=limits,
+            timeout=60,
+        ) as client:
+            await wait_until_ready(client)
+            return await run_clients(client)
+    finally:
+        server.terminate()
+        server.wait()
+
+def main():
+    print(f"Benchmarking GET /players/{{player_id}}/inventory with {CLIENTS} clients for {DURATION_SECONDS:.0f}s per mode")
+    print()
+    results = {}
+    for mode, db_async in (("async", True), ("sync", False)):
+        print(f"Running {mode} engine...")
+        results[mode] = asyncio.run(benchmark(db_async))
+
+    print()
+    print(f"{'mode':6} {'clients':>8} {'req/s':>9} {'p50 ms':>9} {'p99 ms':>9} {'max ms':>9} {'errors':>7}")
+    for mode, result in results.items():
+        print(
+            f"{mode:6} {CLIENTS:8d} {result['throughput']:9.1f} {result['p50_ms']:9.2f} {result['p99_ms']:9.2f} "
+            f"{result['max_ms']:9.2f} {result['errors']:7d}"
+        )
+
+
+if __name__ == "__main__":
+    main()
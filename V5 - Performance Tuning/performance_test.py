@@ -1,229 +1,336 @@
-import time
-import requests
+import argparse
+import asyncio
+import json
+import math
 import random
-from typing import Dict, List, Tuple, Optional
+import sys
+import time
+from collections import defaultdict
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import httpx
+
+# Concurrent load generator for the API. Runs a weighted mix of scenarios,
+# either closed-loop (a fixed number of clients back to back) or open-loop
+# (new scenarios arrive at a fixed rate whether or not earlier ones finished),
+# and reports latency percentiles, throughput and errors per endpoint.
+#
+#   python "V5 - Performance Tuning/performance_test.py" --concurrency 100 --duration 60
+#   python "V5 - Performance Tuning/performance_test.py" --rate 500 --output run.json --baseline baseline.json
+#
+# The default key is rate-limited, so start the API unthrottled, or anything
+# above RATE_LIMIT_PER_SECOND mostly measures 429s:
+#
+#   RATE_LIMIT_PER_SECOND=0 SHED_CHECKOUT_WAITERS=0 uvicorn src.api.server:app --port 3000
 
 API_BASE = "http://localhost:3000"
 API_KEY = "brat"
 
-def test_endpoint(endpoint: str, method: str = "GET", data: Optional[Dict] = None) -> Optional[float]:
-    headers = {
-        "access_token": API_KEY,
-        "Content-Type": "application/json"
-    }
-    url = f"{API_BASE}{endpoint}"
-    
-    start_time = time.time()
-    
-    try:
-        if method == "GET":
-            response = requests.get(url, headers=headers)
-        elif method == "POST":
-            response = requests.post(url, headers=headers, json=data)
-        elif method == "PATCH":
-            response = requests.patch(url, headers=headers, json=data)
-        elif method == "PUT":
-            response = requests.put(url, headers=headers, json=data)
-        elif method == "DELETE":
-            response = requests.delete(url, headers=headers)
-        
-        end_time = time.time()
-        duration_ms = (end_time - start_time)*1000
-        
-        if response.status_code >=400:
-            print(f"Error {response.status_code} for {method}{endpoint}:{response.text}")
-            return None
-        
-        return duration_ms
-        
-    except Exception as e:
-        print(f"Exception for {method}{endpoint}:{e}")
-        return None
-
-def get_player_with_inventory():
-    for player_id in random.sample(range(1, 1001), 20):  # checking 20 random players
-        response = requests.get(
-            f"{API_BASE}/players/{player_id}/inventory",
-            headers={"access_token": API_KEY}
-        )
-        if response.status_code == 200:
-            inventory = response.json()
-            if inventory.get('items') and len(inventory['items']) > 0:
-                return player_id, inventory['items'][0]['item_id']
-    return None, None
-
-def test_sequential_inventory_operations(player_id: int, item_id: int, enchantment_id: int):
-    results = []
-    
-    print(f"Step 1: Adding item {item_id} to player {player_id} inventory")
-    duration = test_endpoint(f"/players/{player_id}/inventory", "POST", {"item_id": item_id, "quantity": 2})
-    if duration:
-        results.append({
-            'endpoint': f"POST /players/{player_id}/inventory",
-            'description': "Add item to inventory",
-            'duration_ms': duration
-        })
-        
-        print(f"Step 2: Removing 1 quantity of item {item_id}")
-        duration = test_endpoint(f"/players/{player_id}/inventory/{item_id}", "PATCH", {"quantity": 1})
-        if duration:
-            results.append({
-                'endpoint': f"PATCH /players/{player_id}/inventory/{item_id}",
-                'description': "Remove item quantity from inventory",
-                'duration_ms': duration
-            })
-            
-            print(f"Step 3: Enchanting item {item_id}")
-            duration = test_endpoint(f"/players/{player_id}/inventory/{item_id}/enchant", "POST", {"enchantment_id": enchantment_id})
-            if duration:
-                results.append({
-                    'endpoint': f"POST /players/{player_id}/inventory/{item_id}/enchant",
-                    'description': "Enchant item in inventory",
-                    'duration_ms': duration
-                })
-                
-                print(f"Step 4: Removing enchantments from item {item_id}")
-                duration = test_endpoint(f"/players/{player_id}/inventory/{item_id}/enchantments", "DELETE")
-                if duration:
-                    results.append({
-                        'endpoint': f"DELETE /players/{player_id}/inventory/{item_id}/enchantments",
-                        'description': "Remove enchantments from item",
-                        'duration_ms': duration
-                    })
-    
-    return results
+PERCENTILES = (50, 95, 99, 99.9)
 
-def run_all_endpoint_tests():
-    print("Testing all API endpoints")
-    print()
-    
-    sample_player_id = random.randint(1, 1000)
-    sample_item_id = random.randint(1, 1000)
-    sample_enchantment_id = random.randint(1, 500)
-    
-    player_with_inventory, existing_item_id = get_player_with_inventory()
-    if not player_with_inventory:
-        print("Could not find player with inventory items")
-        player_with_inventory = sample_player_id
-        existing_item_id = sample_item_id
-    
-    print(f"Using player {sample_player_id} for basic tests")
-    print(f"Using player {player_with_inventory} with item {existing_item_id} for existing inventory operations")
-    print()
-    
-    results = []
-    
- 
-    basic_endpoints = [
-
-        ("/", "GET", None, "Root endpoint"),
-        
-        # Players 
-        (f"/players/{sample_player_id}/inventory", "GET", None, "Get player inventory"),
-        ("/players", "POST", {"username": f"test_user_{int(time.time())}"}, "Create player"),
-        (f"/players/{player_with_inventory}/inventory", "GET", None, "Get inventory of player with items"),
-        
-        # Items
-        ("/items", "GET", None, "Get all items"),
-        ("/items?item_type=weapon", "GET", None, "Get items by type"),
-        ("/items?rarity=common", "GET", None, "Get items by rarity"),
-        ("/items?item_type=weapon&rarity=epic", "GET", None, "Get items by type and rarity"),
-        (f"/items/{sample_item_id}", "GET", None, "Get specific item"),
-        ("/items", "POST", {"name": f"Test Item {int(time.time())}", "item_type": "weapon", "rarity": "common"}, "Create item"),
-        
-        # Enchantments
-        ("/enchantments", "GET", None, "Get all enchantments"),
-        ("/enchantments", "POST", {"name": f"Test Enchantment {int(time.time())}", "effect_description": "Test effect"}, "Create enchantment"),
-        (f"/enchantments/{sample_enchantment_id}/effect_description", "PUT", {"effect_description": "Updated effect"}, "Update enchantment"),
-    ]
-    
-    for endpoint, method, data, description in basic_endpoints:
-        print(f"Testing {method:6} {endpoint:50}", end=" ... ")
-        
-        duration = test_endpoint(endpoint, method, data)
-        
-        if duration is not None:
-            print(f"{duration:7.2f}ms")
-            results.append({
-                'endpoint': f"{method} {endpoint}",
-                'description': description,
-                'duration_ms': duration
-            })
-        else:
-            print("FAILED")
-    
-    print()
 
+class Recorder:
+    """Latencies and status codes per endpoint, labelled by route template."""
 
-    print("Testing sequential inventory operations...")
-    print()
-    
-    inventory_results = test_sequential_inventory_operations(sample_player_id, sample_item_id, sample_enchantment_id)
-    results.extend(inventory_results)
-    
-    if player_with_inventory and existing_item_id:
-        print()
-        print("Testing operations on existing inventory...")
-        print()
-        
-        print(f"Testing enchant on existing item {existing_item_id} in player {player_with_inventory} inventory")
-        duration = test_endpoint(f"/players/{player_with_inventory}/inventory/{existing_item_id}/enchant", "POST", {"enchantment_id": sample_enchantment_id})
-        if duration:
-            results.append({
-                'endpoint': f"POST /players/{player_with_inventory}/inventory/{existing_item_id}/enchant",
-                'description': "Enchant existing item in inventory",
-                'duration_ms': duration
-            })
-            
-            print(f"Testing remove enchantments from existing item {existing_item_id}")
-            duration = test_endpoint(f"/players/{player_with_inventory}/inventory/{existing_item_id}/enchantments", "DELETE")
-            if duration:
-                results.append({
-                    'endpoint': f"DELETE /players/{player_with_inventory}/inventory/{existing_item_id}/enchantments",
-                    'description': "Remove enchantments from existing item",
-                    'duration_ms': duration
-                })
-    
-    return results
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.statuses: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+
+    async def request(self, client: httpx.AsyncClient, label: str, method: str, url: str,
+                      started: Optional[float] = None, **kwargs) -> Optional[httpx.Response]:
+        # In open-loop mode latency counts from when the request was due, so
+        # time spent queued behind a slow server is not hidden
+        start = started if started is not None else time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+            status = str(response.status_code)
+        except httpx.HTTPError as e:
+            response = None
+            status = type(e).__name__
+        self.latencies[label].append((time.perf_counter() - start) * 1000)
+        self.statuses[label][status] += 1
+        return response
+
+
+class Workload:
+    def __init__(self, args):
+        self.max_player_id = args.max_player_id
+        self.max_item_id = args.max_item_id
+        self.max_enchantment_id = args.max_enchantment_id
+
+    def player_id(self) -> int:
+        return random.randint(1, self.max_player_id)
 
-def print_performance_results(results: List[Dict]):
-    if not results:
-        print("No successful tests to report")
+    def item_id(self) -> int:
+        return random.randint(1, self.max_item_id)
+
+    def enchantment_id(self) -> int:
+        return random.randint(1, self.max_enchantment_id)
+
+
+# Each scenario is one user action; only its first request gets the open-loop start time
+
+async def get_inventory(client, recorder: Recorder, workload: Workload, started: Optional[float]):
+    await recorder.request(client, "GET /players/{player_id}/inventory", "GET",
+                           f"/players/{workload.player_id()}/inventory", started, params={"limit": 50})
+
+async def get_inventories(client, recorder: Recorder, workload: Workload, started: Optional[float]):
+    ids = ",".join(str(workload.player_id()) for _ in range(20))
+    await recorder.request(client, "GET /players/inventory", "GET", "/players/inventory", started,
+                           params={"ids": ids})
+
+async def get_items(client, recorder: Recorder, workload: Workload, started: Optional[float]):
+    params = random.choice([{}, {"item_type": "weapon"}, {"rarity": "common"}, {"item_type": "weapon", "rarity": "epic"}])
+    await recorder.request(client, "GET /items", "GET", "/items", started, params=params)
+
+async def get_item(client, recorder: Recorder, workload: Workload, started: Optional[float]):
+    await recorder.request(client, "GET /items/{item_id}", "GET", f"/items/{workload.item_id()}", started)
+
+async def get_enchantments(client, recorder: Recorder, workload: Workload, started: Optional[float]):
+    await recorder.request(client, "GET /enchantments", "GET", "/enchantments", started)
+
+async def inventory_flow(client, recorder: Recorder, workload: Workload, started: Optional[float]):
+    # The sequential flow of the original script: add, remove one, enchant, disenchant
+    player_id, item_id = workload.player_id(), workload.item_id()
+    response = await recorder.request(client, "POST /players/{player_id}/inventory", "POST",
+                                      f"/players/{player_id}/inventory", started,
+                                      json={"item_id": item_id, "quantity": 2})
+    if response is None or response.status_code >= 400:
         return
-    
-    sorted_results = sorted(results, key=lambda x: x['duration_ms'], reverse=True)
-    
-    print()
-    print("PERFORMANCE RESULTS")
+    await recorder.request(client, "PATCH /players/{player_id}/inventory/{item_id}", "PATCH",
+                           f"/players/{player_id}/inventory/{item_id}", json={"quantity": 1})
+    await recorder.request(client, "POST /players/{player_id}/inventory/{item_id}/enchant", "POST",
+                           f"/players/{player_id}/inventory/{item_id}/enchant",
+                           json={"enchantment_id": workload.enchantment_id()})
+    await recorder.request(client, "DELETE /players/{player_id}/inventory/{item_id}/enchantments", "DELETE",
+                           f"/players/{player_id}/inventory/{item_id}/enchantments")
 
+Scenario = Callable[[httpx.AsyncClient, Recorder, Workload, Optional[float]], Awaitable[None]]
+
+SCENARIOS: Dict[str, Scenario] = {
+    "get_inventory": get_inventory,
+    "get_inventories": get_inventories,
+    "get_items": get_items,
+    "get_item": get_item,
+    "get_enchantments": get_enchantments,
+    "inventory_flow": inventory_flow,
+}
+
+DEFAULT_MIX = "get_inventory=50,get_inventories=5,get_items=10,get_item=10,get_enchantments=5,inventory_flow=20"
+
+
+def parse_mix(mix: str) -> Dict[str, float]:
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in SCENARIOS:
+            raise SystemExit(f"Unknown scenario '{name}'. Choose from: {', '.join(SCENARIOS)}")
+        weights[name] = float(weight or 1)
+    return weights
+
+
+async def closed_loop(client, recorder: Recorder, workload: Workload, weights: Dict[str, float],
+                      concurrency: int, deadline: float):
+    names, scenario_weights = list(weights), list(weights.values())
+
+    async def one_client():
+        while time.perf_counter() < deadline:
+            name = random.choices(names, scenario_weights)[0]
+            await SCENARIOS[name](client, recorder, workload, None)
+
+    await asyncio.gather(*(one_client() for _ in range(concurrency)))
+
+
+async def open_loop(client, recorder: Recorder, workload: Workload, weights: Dict[str, float],
+                    concurrency: int, deadline: float, rate: float) -> int:
+    """Starts scenarios as a Poisson process at `rate` per second.
+
+    At most `concurrency` run at once; arrivals beyond that wait for a slot,
+    and the wait counts towards their latency. Returns how many arrivals were
+    still waiting when the run ended.
+    """
+    names, scenario_weights = list(weights), list(weights.values())
+    slots = asyncio.Semaphore(concurrency)
+    tasks = set()
+
+    async def arrival(due: float):
+        async with slots:
+            if time.perf_counter() >= deadline:
+                return
+            name = random.choices(names, scenario_weights)[0]
+            await SCENARIOS[name](client, recorder, workload, due)
+
+    next_arrival = time.perf_counter()
+    while next_arrival < deadline:
+        delay = next_arrival - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        task = asyncio.create_task(arrival(next_arrival))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+        next_arrival += random.expovariate(rate)
+
+    backlog = sum(1 for task in tasks if not task.done())
+    await asyncio.gather(*tasks)
+    return backlog
+
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    # Nearest-rank, so p99.9 is a real observed latency
+    rank = max(1, math.ceil(p / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def summarize(recorder: Recorder, elapsed: float) -> Dict:
+    endpoints = {}
+    for label, latencies in sorted(recorder.latencies.items()):
+        latencies.sort()
+        statuses = dict(recorder.statuses[label])
+        server_errors = sum(count for status, count in statuses.items() if not status.isdigit() or int(status) >= 500)
+        client_errors = sum(count for status, count in statuses.items() if status.isdigit() and 400 <= int(status) < 500)
+        endpoints[label] = {
+            "requests": len(latencies),
+            "throughput": len(latencies) / elapsed,
+            "error_rate": server_errors / len(latencies),
+            "client_error_rate": client_errors / len(latencies),
+            "statuses": statuses,
+            "mean_ms": sum(latencies) / len(latencies),
+            **{f"p{p:g}_ms": percentile(latencies, p) for p in PERCENTILES},
+            "max_ms": latencies[-1],
+        }
+
+    every = sorted(latency for latencies in recorder.latencies.values() for latency in latencies)
+    total = sum(endpoint["requests"] for endpoint in endpoints.values())
+    overall = {
+        "requests": total,
+        "throughput": total / elapsed,
+        "error_rate": sum(endpoint["error_rate"] * endpoint["requests"] for endpoint in endpoints.values()) / total if total else 0.0,
+        **({f"p{p:g}_ms": percentile(every, p) for p in PERCENTILES} if every else {}),
+    }
+    return {"overall": overall, "endpoints": endpoints}
+
+
+def print_results(results: Dict):
     print()
-    print("All endpoints (slowest to fastest):")
-    print()
-    
-    for i, result in enumerate(sorted_results, 1):
-        print(f"{i:2d}. {result['endpoint']:50} {result['duration_ms']:7.2f}ms - {result['description']}")
-    
-    print()
-    print("SUMMARY:")
+    print(f"{'endpoint':62} {'reqs':>7} {'req/s':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'p99.9':>8} {'err%':>6}")
+    for label, stats in list(results["endpoints"].items()) + [("OVERALL", results["overall"])]:
+        if not stats["requests"]:
+            continue
+        print(
+            f"{label:62} {stats['requests']:7d} {stats['throughput']:8.1f} {stats['p50_ms']:8.2f} "
+            f"{stats['p95_ms']:8.2f} {stats['p99_ms']:8.2f} {stats['p99.9_ms']:8.2f} {stats['error_rate'] * 100:6.2f}"
+        )
+
+
+def compare(results: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """Lists endpoints whose p99, throughput or error rate got worse than the baseline allows."""
+    regressions = []
+    before_config, after_config = baseline.get("config", {}), results["config"]
+    for key in ("mode", "rate", "concurrency", "mix"):
+        if before_config.get(key) != after_config.get(key):
+            print(f"Note: baseline was run with {key}={before_config.get(key)}, this run used {after_config.get(key)}")
+    current = dict(results["endpoints"], OVERALL=results["overall"])
+    previous = dict(baseline["endpoints"], OVERALL=baseline["overall"])
     print()
-    print(f"Total endpoints tested: {len(results)}")
-    print(f"Fastest endpoint: {sorted_results[-1]['endpoint']} ({sorted_results[-1]['duration_ms']:.2f}ms)")
-    print(f"Slowest endpoint: {sorted_results[0]['endpoint']} ({sorted_results[0]['duration_ms']:.2f}ms)")
-    
-    total_time = sum(r['duration_ms'] for r in results)
-    avg_time = total_time / len(results)
-    print(f"Average response time: {avg_time:.2f}ms")
+    print(f"{'vs baseline':62} {'p99':>10} {'req/s':>10}")
+    for label, before in previous.items():
+        after = current.get(label)
+        if after is None or not after["requests"] or not before["requests"]:
+            continue
+        p99_change = after["p99_ms"] / before["p99_ms"] - 1 if before["p99_ms"] else 0.0
+        throughput_change = after["throughput"] / before["throughput"] - 1 if before["throughput"] else 0.0
+        print(f"{label:62} {p99_change * 100:+9.1f}% {throughput_change * 100:+9.1f}%")
+        if p99_change > tolerance:
+            regressions.append(f"{label}: p99 {before['p99_ms']:.2f}ms -> {after['p99_ms']:.2f}ms")
+        if throughput_change < -tolerance:
+            regressions.append(f"{label}: throughput {before['throughput']:.1f} -> {after['throughput']:.1f} req/s")
+        if after["error_rate"] > before["error_rate"] + 0.01:
+            regressions.append(f"{label}: error rate {before['error_rate']:.2%} -> {after['error_rate']:.2%}")
+    return regressions
+
+
+async def run(args) -> Dict:
+    weights = parse_mix(args.mix)
+    workload = Workload(args)
+    recorder = Recorder()
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(
+        base_url=args.base_url,
+        headers={"access_token": args.api_key},
+        limits=limits,
+        timeout=args.timeout,
+    ) as client:
+        if args.warmup > 0:
+            print(f"Warming up for {args.warmup:.0f}s...")
+            await closed_loop(client, Recorder(), workload, weights, args.concurrency,
+                              time.perf_counter() + args.warmup)
+
+        mode = f"open-loop at {args.rate:g}/s" if args.rate else "closed-loop"
+        print(f"Running {mode} with concurrency {args.concurrency} for {args.duration:.0f}s...")
+        started = time.perf_counter()
+        deadline = started + args.duration
+        backlog = 0
+        if args.rate:
+            backlog = await open_loop(client, recorder, workload, weights, args.concurrency, deadline, args.rate)
+        else:
+            await closed_loop(client, recorder, workload, weights, args.concurrency, deadline)
+        elapsed = time.perf_counter() - started
+
+    results = summarize(recorder, elapsed)
+    results["config"] = {
+        "base_url": args.base_url,
+        "mode": "open" if args.rate else "closed",
+        "rate": args.rate,
+        "concurrency": args.concurrency,
+        "duration": args.duration,
+        "mix": weights,
+        "backlog_at_end": backlog,
+        "timestamp": time.time(),
+    }
+    return results
 
 
 def main():
-    print("API Performance Testing")
-    print("Testing all endpoints with existing data")
-    print()
-    
-    results = run_all_endpoint_tests()
-    
-    print_performance_results(results)
+    parser = argparse.ArgumentParser(description="Concurrent load test for the Item Management API")
+    parser.add_argument("--base-url", default=API_BASE)
+    parser.add_argument("--api-key", default=API_KEY)
+    parser.add_argument("--concurrency", type=int, default=50, help="clients (closed-loop) or max in flight (open-loop)")
+    parser.add_argument("--duration", type=float, default=30, help="seconds to measure")
+    parser.add_argument("--warmup", type=float, default=5, help="seconds to run before measuring")
+    parser.add_argument("--rate", type=float, default=None, help="open-loop arrivals per second; omit for closed-loop")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="weighted scenarios, e.g. get_inventory=3,inventory_flow=1")
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--max-player-id", type=int, default=1000)
+    parser.add_argument("--max-item-id", type=int, default=1000)
+    parser.add_argument("--max-enchantment-id", type=int, default=500)
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--baseline", help="compare against results saved by an earlier --output")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="allowed relative p99/throughput regression")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    print_results(results)
+    if results["config"]["backlog_at_end"]:
+        print(f"\n{results['config']['backlog_at_end']} arrivals were still queued at the end; the server could not keep up with --rate")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print()
+            print("REGRESSIONS:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print("\nNo regressions against the baseline")
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
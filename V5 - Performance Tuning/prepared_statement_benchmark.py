@@ -0,0 +1,136 @@
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from typing import Callable, Dict, List, Tuple
+
+import sqlalchemy
+
+# Measures what server-side prepared statements save per request. Each read
+# request's statements from src/statements.py run on two engines, one with
+# psycopg preparing every statement (prepare_threshold=0) and one that never
+# prepares (prepare_threshold=None), for the same sampled parameters. The
+# planner's own Planning Time for each statement is reported alongside, which
+# is the part a prepared statement stops paying once Postgres settles on a
+# generic plan.
+#
+#   python "V5 - Performance Tuning/prepared_statement_benchmark.py" --requests 2000
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from src import config, statements  # noqa: E402
+
+Step = Tuple[sqlalchemy.TextClause, dict]
+
+
+def scenarios(connection, rng: random.Random) -> Dict[str, Callable[[], List[Step]]]:
+    """Each scenario returns the statements one request runs, with fresh parameters."""
+    max_player_id = connection.execute(sqlalchemy.text("SELECT max(player_id) FROM player")).scalar()
+    if max_player_id is None:
+        raise SystemExit("No players found; run data_generator.py first")
+    item_ids = connection.execute(sqlalchemy.text("SELECT item_id FROM item")).scalars().all()
+    rarities = ["common", "uncommon", "rare", "epic", "legendary"]
+
+    def player() -> int:
+        return rng.randint(1, max_player_id)
+
+    def inventory_page():
+        player_id = player()
+        return [
+            (statements.INVENTORY_VERSION, {"player_id": player_id}),
+            (statements.INVENTORY_PAGES[(False, True)], {"player_id": player_id, "limit": 51}),
+        ]
+
+    def inventory_whole():
+        player_id = player()
+        return [
+            (statements.INVENTORY_VERSION, {"player_id": player_id}),
+            (statements.INVENTORY_PAGES[(False, False)], {"player_id": player_id}),
+        ]
+
+    def batch_inventory():
+        return [(statements.BATCH_INVENTORY, {"player_ids": [player() for _ in range(20)]})]
+
+    def filtered_items():
+        filters = {"item_type": rng.choice(["weapon", "food", "clothing"]), "rarity": rng.choice(rarities)}
+        return [
+            (statements.CATALOG_VERSION, {"name": "item"}),
+            (statements.ITEMS[(True, True)], filters),
+        ]
+
+    def item():
+        return [(statements.ITEM_BY_ID, {"item_id": rng.choice(item_ids)})]
+
+    return {
+        "GET /players/{id}/inventory?limit=50": inventory_page,
+        "GET /players/{id}/inventory": inventory_whole,
+        "GET /players/inventory?ids=(20)": batch_inventory,
+        "GET /items?item_type&rarity": filtered_items,
+        "GET /items/{item_id}": item,
+    }
+
+
+def planning_ms(connection, steps: List[Step]) -> float:
+    total = 0.0
+    for statement, params in steps:
+        plan = connection.execute(
+            sqlalchemy.text("EXPLAIN (SUMMARY, FORMAT JSON) " + statement.text), params
+        ).scalar()
+        total += plan[0]["Planning Time"]
+    return total
+
+
+def run(engine, requests: List[List[Step]]) -> List[float]:
+    latencies = []
+    with engine.connect() as connection:
+        for steps in requests:
+            start = time.perf_counter()
+            with connection.begin():
+                for statement, params in steps:
+                    connection.execute(statement, params).fetchall()
+            latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare requests with and without server-side prepared statements")
+    parser.add_argument("--requests", type=int, default=2000, help="requests per scenario and mode")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    url = config.get_settings().POSTGRES_URI
+    engines = {
+        "unprepared": sqlalchemy.create_engine(url, pool_size=1, connect_args={"prepare_threshold": None}),
+        "prepared": sqlalchemy.create_engine(url, pool_size=1, connect_args={"prepare_threshold": 0}),
+    }
+
+    with engines["unprepared"].connect() as connection:
+        requests = {}
+        plans = {}
+        for name, build in scenarios(connection, random.Random(args.seed)).items():
+            requests[name] = [build() for _ in range(args.requests)]
+            plans[name] = statistics.fmean(planning_ms(connection, steps) for steps in requests[name][:50])
+
+    print(f"{args.requests} requests per scenario and mode, one connection each")
+    print()
+    print(f"{'request':38} {'plan ms':>8} {'unprepared':>11} {'prepared':>9} {'saved ms':>9} {'saved':>6}")
+    for name, batch in requests.items():
+        means = {}
+        for mode, engine in engines.items():
+            run(engine, batch[:50])  # warm up, and let psycopg prepare
+            means[mode] = statistics.fmean(run(engine, batch))
+        saved = means["unprepared"] - means["prepared"]
+        print(
+            f"{name:38} {plans[name]:8.3f} {means['unprepared']:11.3f} {means['prepared']:9.3f} "
+            f"{saved:9.3f} {saved / means['unprepared']:6.1%}"
+        )
+
+    for engine in engines.values():
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+import json
+import os
+import random
+import sys
+import time
+from collections import namedtuple
+from typing import Callable, Dict
+
+# Measures the per-row cost of turning database rows into a response body,
+# with no database or HTTP involved:
+#
+#   models + response_model  the old path: a Pydantic model per row, validated
+#                            again and serialized by FastAPI's response_model,
+#                            then encoded with the json module
+#   dicts + json             plain dicts per row, encoded with the json module
+#   dicts + orjson           plain dicts per row, encoded with orjson (default)
+#
+#   python "V5 - Performance Tuning/serialization_benchmark.py"
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from fastapi.responses import JSONResponse, ORJSONResponse  # noqa: E402
+from fastapi.routing import serialize_response  # noqa: E402
+from fastapi.utils import create_model_field  # noqa: E402
+
+from src.api import items, players  # noqa: E402
+
+INVENTORY_ITEMS = 150
+CATALOG_ITEMS = 1000
+REPEATS = int(os.getenv("BENCH_REPEATS", "200"))
+
+# Attribute access like a SQLAlchemy Row
+InventoryRow = namedtuple(
+    "InventoryRow", "player_inventory_item_id item_id name item_type rarity quantity enchantments"
+)
+ItemRow = namedtuple("ItemRow", "item_id name item_type rarity")
+
+ENCHANTMENT_NAMES = ["Flame", "Frost", "Sharpness", "Unbreaking", "Luck", "Mending"]
+
+
+def inventory_rows(count: int) -> list:
+    rng = random.Random(1)
+    return [
+        InventoryRow(
+            player_inventory_item_id=index,
+            item_id=index,
+            name=f"Item {index}",
+            item_type=rng.choice(["weapon", "food", "clothing"]),
+            rarity=rng.choice(["common", "rare", "epic", "legendary"]),
+            quantity=rng.randint(1, 99),
+            enchantments=rng.sample(ENCHANTMENT_NAMES, rng.randint(0, 3)),
+        )
+        for index in range(count)
+    ]
+
+def catalog_rows(count: int) -> list:
+    rng = random.Random(2)
+    return [
+        ItemRow(
+            item_id=index,
+            name=f"Item {index}",
+            item_type=rng.choice(["weapon", "food", "clothing"]),
+            rarity=rng.choice(["common", "rare", "epic", "legendary"]),
+        )
+        for index in range(count)
+    ]
+
+def validated(response_model) -> Callable:
+    """The work FastAPI does for a handler that returns models under response_model."""
+    field = create_model_field(name="Response", type_=response_model, mode="serialization")
+
+    def render(content) -> bytes:
+        # serialize_response never suspends for async handlers, so drive it
+        # directly instead of paying for an event loop per call
+        coroutine = serialize_response(field=field, response_content=content)
+        try:
+            coroutine.send(None)
+        except StopIteration as done:
+            return JSONResponse(done.value).body
+        raise RuntimeError("serialize_response suspended")
+
+    return render
+
+def inventory_paths(rows: list) -> Dict[str, Callable[[], bytes]]:
+    render_validated = validated(players.InventoryResponse)
+
+    def models():
+        inventory = players.InventoryResponse(
+            items=[
+                players.InventoryItem(
+                    item_id=row.item_id,
+                    name=row.name,
+                    item_type=row.item_type,
+                    rarity=row.rarity,
+                    quantity=row.quantity,
+                    enchantments=row.enchantments,
+                )
+                for row in rows
+            ],
+            message=f"Player 1 has {len(rows)} item(s) in their inventory.",
+        )
+        return render_validated(inventory)
+
+    def dicts(response_class):
+        def render():
+            items = [players.inventory_row_json(row) for row in rows]
+            return response_class(players.inventory_response(1, items, None, paged=False)).body
+        return render
+
+    return {
+        "models + response_model": models,
+        "dicts + json": dicts(JSONResponse),
+        "dicts + orjson": dicts(ORJSONResponse),
+    }
+
+def catalog_paths(rows: list) -> Dict[str, Callable[[], bytes]]:
+    render_validated = validated(list[items.Item])
+
+    def models():
+        return render_validated([
+            items.Item(item_id=row.item_id, name=row.name, item_type=row.item_type, rarity=row.rarity)
+            for row in rows
+        ])
+
+    def dicts(response_class):
+        def render():
+            return response_class([items.item_json(row) for row in rows]).body
+        return render
+
+    return {
+        "models + response_model": models,
+        "dicts + json": dicts(JSONResponse),
+        "dicts + orjson": dicts(ORJSONResponse),
+    }
+
+def measure(render: Callable[[], bytes]) -> float:
+    """Best-of-REPEATS seconds per call, after a warm-up."""
+    for _ in range(10):
+        render()
+    best = float("inf")
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        render()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def report(title: str, rows: int, paths: Dict[str, Callable[[], bytes]]):
+    print(f"{title} ({rows} rows, best of {REPEATS})")
+    print(f"{'path':26} {'ms/response':>12} {'us/row':>9} {'speedup':>8}")
+    baseline = None
+    for name, render in paths.items():
+        seconds = measure(render)
+        baseline = baseline or seconds
+        print(f"{name:26} {seconds * 1000:12.3f} {seconds * 1e6 / rows:9.2f} {baseline / seconds:7.1f}x")
+    print()
+
+def main():
+    # The fast paths must produce the same JSON the old path did
+    inventory = inventory_rows(INVENTORY_ITEMS)
+    catalog = catalog_rows(CATALOG_ITEMS)
+    for paths in (inventory_paths(inventory), catalog_paths(catalog)):
+        bodies = [json.loads(render()) for render in paths.values()]
+        if any(body != bodies[0] for body in bodies):
+            raise SystemExit("Response bodies differ between paths")
+
+    report("GET /players/{player_id}/inventory", INVENTORY_ITEMS, inventory_paths(inventory))
+    report("GET /items", CATALOG_ITEMS, catalog_paths(catalog))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,8 @@
 
 
 
-CREATE INDEX IF NOT EXISTS idx_player_inventory_player_item 
-ON player_inventory_item(player_id, item_id);
+-- Player/item lookups use the index behind the
+-- uq_player_inventory_item_player_item constraint (see migration 885b148a1eda)
 
 -- Index for player existence checks
 CREATE INDEX IF NOT EXISTS idx_player_id 
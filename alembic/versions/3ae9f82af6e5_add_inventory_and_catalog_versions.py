@@ -0,0 +1,41 @@
+"""Add inventory and catalog versions
+
+Revision ID: 3ae9f82af6e5
+Revises: bfd6fb436f2e
+Create Date: 2026-10-18 09:12:40.118204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3ae9f82af6e5'
+down_revision: Union[str, None] = 'bfd6fb436f2e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Bumped by every write to a player's inventory, used as the inventory ETag
+    op.add_column(
+        "player",
+        sa.Column("inventory_version", sa.BigInteger, server_default="0", nullable=False)
+    )
+
+    # One row per global catalog, bumped by every write to it
+    catalog_version = op.create_table(
+        "catalog_version",
+        sa.Column("name", sa.String, primary_key=True),
+        sa.Column("version", sa.BigInteger, server_default="0", nullable=False)
+    )
+    op.bulk_insert(catalog_version, [{"name": "item"}, {"name": "enchantment"}])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("catalog_version")
+    op.drop_column("player", "inventory_version")
@@ -0,0 +1,513 @@
+"""Hash-partition player_inventory_item and item_enchantment by player_id
+
+Revision ID: 5b2d8e61f0a4
+Revises: c4e9a7d2b813
+Create Date: 2026-10-18 21:04:55.318270
+
+Runs online. Partitioned copies of both tables are created next to the
+originals, and triggers on the originals mirror every write into them. A
+backfill then copies the existing rows, a batch of players per transaction,
+while the API keeps serving. Finally one short transaction locks the
+originals, drops them and renames the copies into place.
+
+    alembic -x partitions=32 -x backfill_players=1000 upgrade head
+
+partitions is fixed once the tables exist. Changing it later means running
+this kind of migration again.
+
+Deploy order: run this migration while the previous release is still
+serving, then roll out the release that ships it right after the cutover.
+The new code writes item_enchantment.player_id, which only exists from the
+cutover on, and the old code inserts enchantments without it, which fails
+against the NOT NULL partition key. Between the cutover and the end of the
+rollout, enchanting on old instances returns errors; every other endpoint
+keeps working on both. The column can't stay nullable in between, since
+it is part of the primary key.
+"""
+import logging
+import time
+from typing import Sequence, Union
+
+from alembic import context, op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5b2d8e61f0a4'
+down_revision: Union[str, None] = 'c4e9a7d2b813'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Under alembic's logger, so progress shows at the INFO level alembic.ini sets
+logger = logging.getLogger("alembic.partition_inventory")
+
+DEFAULT_PARTITIONS = 32
+DEFAULT_BACKFILL_PLAYERS = 1000
+
+# The cutover waits this long for its locks before letting queued requests
+# through and trying again
+CUTOVER_LOCK_TIMEOUT = "2s"
+CUTOVER_ATTEMPTS = 30
+
+
+def x_argument(name: str, default: int) -> int:
+    return int(context.get_x_argument(as_dictionary=True).get(name, default))
+
+
+def inventory_sequence() -> str:
+    return op.get_bind().execute(
+        sa.text("SELECT pg_get_serial_sequence('player_inventory_item', 'player_inventory_item_id')")
+    ).scalar()
+
+
+def create_partitioned_tables(partitions: int, sequence: str, suffix: str) -> None:
+    """Creates both tables partitioned by HASH (player_id), named with suffix.
+
+    Foreign keys and check constraints get their final names right away.
+    Primary keys, unique constraints and indexes need schema-wide unique
+    names, so they carry the suffix until the originals are gone.
+    """
+    op.execute(
+        f"""
+        CREATE TABLE player_inventory_item{suffix} (
+            player_inventory_item_id integer NOT NULL DEFAULT nextval('{sequence}'),
+            player_id integer NOT NULL
+                CONSTRAINT player_inventory_item_player_id_fkey REFERENCES player (player_id),
+            item_id integer
+                CONSTRAINT player_inventory_item_item_id_fkey REFERENCES item (item_id),
+            quantity integer NOT NULL CONSTRAINT check_quantity_non_negative CHECK (quantity >= 0),
+            enchantments varchar[] NOT NULL DEFAULT '{{}}',
+            CONSTRAINT player_inventory_item{suffix}_pkey PRIMARY KEY (player_id, player_inventory_item_id),
+            CONSTRAINT uq_player_inventory_item{suffix}_player_item UNIQUE (player_id, item_id)
+        ) PARTITION BY HASH (player_id)
+        """
+    )
+    op.execute(
+        f"""
+        CREATE TABLE item_enchantment{suffix} (
+            player_id integer NOT NULL,
+            player_inventory_item_id integer NOT NULL,
+            enchantment_id integer NOT NULL
+                CONSTRAINT item_enchantment_enchantment_id_fkey REFERENCES enchantment (enchantment_id),
+            CONSTRAINT item_enchantment{suffix}_pkey PRIMARY KEY (player_id, player_inventory_item_id, enchantment_id),
+            CONSTRAINT item_enchantment_player_inventory_item_fkey FOREIGN KEY (player_id, player_inventory_item_id)
+                REFERENCES player_inventory_item{suffix} (player_id, player_inventory_item_id) ON DELETE CASCADE
+        ) PARTITION BY HASH (player_id)
+        """
+    )
+    # Same modulus on both, so an inventory row and its enchantments always
+    # sit in partitions with the same number
+    for remainder in range(partitions):
+        for table in ("player_inventory_item", "item_enchantment"):
+            op.execute(
+                f"""
+                CREATE TABLE {table}_p{remainder} PARTITION OF {table}{suffix}
+                FOR VALUES WITH (MODULUS {partitions}, REMAINDER {remainder})
+                """
+            )
+    # Created on the empty parents, so each partition gets its own copy for free
+    op.execute(f"CREATE INDEX idx_player_inventory_quantity{suffix} ON player_inventory_item{suffix} (player_id, quantity DESC)")
+    op.execute(f"CREATE INDEX ix_player_inventory_item{suffix}_item_id ON player_inventory_item{suffix} (item_id)")
+    op.execute(f"CREATE INDEX ix_item_enchantment{suffix}_enchantment_id ON item_enchantment{suffix} (enchantment_id)")
+
+
+def rename_into_place(suffix: str) -> None:
+    op.execute(f"ALTER TABLE player_inventory_item{suffix} RENAME TO player_inventory_item")
+    op.execute(f"ALTER TABLE item_enchantment{suffix} RENAME TO item_enchantment")
+    op.execute(f"ALTER TABLE player_inventory_item RENAME CONSTRAINT player_inventory_item{suffix}_pkey TO player_inventory_item_pkey")
+    op.execute(
+        f"ALTER TABLE player_inventory_item RENAME CONSTRAINT uq_player_inventory_item{suffix}_player_item "
+        "TO uq_player_inventory_item_player_item"
+    )
+    op.execute(f"ALTER TABLE item_enchantment RENAME CONSTRAINT item_enchantment{suffix}_pkey TO item_enchantment_pkey")
+    op.execute(f"ALTER INDEX idx_player_inventory_quantity{suffix} RENAME TO idx_player_inventory_quantity")
+    op.execute(f"ALTER INDEX ix_player_inventory_item{suffix}_item_id RENAME TO ix_player_inventory_item_item_id")
+    op.execute(f"ALTER INDEX ix_item_enchantment{suffix}_enchantment_id RENAME TO ix_item_enchantment_enchantment_id")
+
+
+def create_enchantment_triggers() -> None:
+    # Same triggers as migration 81f865a7420d; they are attached to the table,
+    # so the new one needs its own
+    op.execute(
+        """
+        CREATE TRIGGER item_enchantment_inserted
+        AFTER INSERT ON item_enchantment
+        REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION refresh_changed_enchantments()
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER item_enchantment_updated
+        AFTER UPDATE ON item_enchantment
+        REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION refresh_changed_enchantments()
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER item_enchantment_deleted
+        AFTER DELETE ON item_enchantment
+        REFERENCING OLD TABLE AS old_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION refresh_changed_enchantments()
+        """
+    )
+
+
+def drop_enchantment_triggers() -> None:
+    op.execute("DROP TRIGGER item_enchantment_deleted ON item_enchantment")
+    op.execute("DROP TRIGGER item_enchantment_updated ON item_enchantment")
+    op.execute("DROP TRIGGER item_enchantment_inserted ON item_enchantment")
+
+
+def lock_for_cutover() -> None:
+    """Takes ACCESS EXCLUSIVE on both tables without stalling traffic for long.
+
+    A waiting ACCESS EXCLUSIVE request queues every later query on the table
+    behind it, so each attempt gives up after CUTOVER_LOCK_TIMEOUT. Dropping
+    the old foreign keys also locks player and item against writes, so those
+    are taken first, in the order the write endpoints lock them.
+    """
+    bind = op.get_bind()
+    for attempt in range(CUTOVER_ATTEMPTS):
+        try:
+            with bind.begin_nested():
+                bind.execute(sa.text(f"SET LOCAL lock_timeout = '{CUTOVER_LOCK_TIMEOUT}'"))
+                bind.execute(sa.text("LOCK TABLE player, item IN SHARE ROW EXCLUSIVE MODE"))
+                bind.execute(sa.text("LOCK TABLE player_inventory_item, item_enchantment IN ACCESS EXCLUSIVE MODE"))
+            return
+        except sa.exc.OperationalError:
+            time.sleep(1 + attempt)
+    raise RuntimeError("Couldn't lock the inventory tables for the cutover; rerun when traffic is lower")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    partitions = x_argument("partitions", DEFAULT_PARTITIONS)
+    batch = x_argument("backfill_players", DEFAULT_BACKFILL_PLAYERS)
+    suffix = "_partitioned"
+
+    create_partitioned_tables(partitions, inventory_sequence(), suffix)
+
+    # Mirror every write to the originals into the copies. Rows of players
+    # the backfill hasn't reached yet are mirrored too; it skips them later.
+    op.execute(
+        """
+        CREATE FUNCTION mirror_player_inventory_item() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'DELETE' THEN
+                DELETE FROM player_inventory_item_partitioned
+                WHERE player_id = OLD.player_id AND player_inventory_item_id = OLD.player_inventory_item_id;
+            ELSIF NEW.player_id IS NOT NULL THEN
+                INSERT INTO player_inventory_item_partitioned
+                    (player_inventory_item_id, player_id, item_id, quantity, enchantments)
+                VALUES (NEW.player_inventory_item_id, NEW.player_id, NEW.item_id, NEW.quantity, NEW.enchantments)
+                ON CONFLICT (player_id, player_inventory_item_id) DO UPDATE
+                SET item_id = EXCLUDED.item_id, quantity = EXCLUDED.quantity, enchantments = EXCLUDED.enchantments;
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """
+    )
+    # The original item_enchantment has no player_id, so it's looked up
+    # through the original inventory row. If that row has already been
+    # deleted, the copy's enchantments went with it by cascade.
+    op.execute(
+        """
+        CREATE FUNCTION mirror_item_enchantment() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP IN ('DELETE', 'UPDATE') THEN
+                DELETE FROM item_enchantment_partitioned
+                WHERE player_id = (
+                    SELECT player_id FROM player_inventory_item
+                    WHERE player_inventory_item_id = OLD.player_inventory_item_id
+                )
+                AND player_inventory_item_id = OLD.player_inventory_item_id
+                AND enchantment_id = OLD.enchantment_id;
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                -- Nothing to attach to until the inventory row has been
+                -- copied; the backfill copies this row along with it
+                INSERT INTO item_enchantment_partitioned (player_id, player_inventory_item_id, enchantment_id)
+                SELECT player_id, player_inventory_item_id, NEW.enchantment_id
+                FROM player_inventory_item_partitioned
+                WHERE player_id = (
+                    SELECT player_id FROM player_inventory_item
+                    WHERE player_inventory_item_id = NEW.player_inventory_item_id
+                )
+                AND player_inventory_item_id = NEW.player_inventory_item_id
+                ON CONFLICT DO NOTHING;
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER player_inventory_item_mirrored
+        AFTER INSERT OR UPDATE OR DELETE ON player_inventory_item
+        FOR EACH ROW EXECUTE FUNCTION mirror_player_inventory_item()
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER item_enchantment_mirrored
+        AFTER INSERT OR UPDATE OR DELETE ON item_enchantment
+        FOR EACH ROW EXECUTE FUNCTION mirror_item_enchantment()
+        """
+    )
+
+    # Copies one batch of players. Every inventory write updates the player
+    # row before touching inventory rows, so share-locking the players holds
+    # their writes off until the batch commits. Writes either finished before
+    # the batch and get copied, or run after it and get mirrored onto the rows
+    # it copied. Rows mirrored earlier are newer than the originals' snapshot
+    # and are kept.
+    op.execute(
+        """
+        CREATE FUNCTION backfill_partitioned_inventory(first_player integer, last_player integer)
+        RETURNS bigint AS $$
+        DECLARE
+            copied bigint;
+        BEGIN
+            PERFORM 1 FROM player
+            WHERE player_id BETWEEN first_player AND last_player
+            ORDER BY player_id
+            FOR SHARE;
+
+            INSERT INTO player_inventory_item_partitioned
+                (player_inventory_item_id, player_id, item_id, quantity, enchantments)
+            SELECT player_inventory_item_id, player_id, item_id, quantity, enchantments
+            FROM player_inventory_item
+            WHERE player_id BETWEEN first_player AND last_player
+            ON CONFLICT (player_id, player_inventory_item_id) DO NOTHING;
+            GET DIAGNOSTICS copied = ROW_COUNT;
+
+            INSERT INTO item_enchantment_partitioned (player_id, player_inventory_item_id, enchantment_id)
+            SELECT pii.player_id, ie.player_inventory_item_id, ie.enchantment_id
+            FROM item_enchantment ie
+            JOIN player_inventory_item pii ON pii.player_inventory_item_id = ie.player_inventory_item_id
+            WHERE pii.player_id BETWEEN first_player AND last_player
+            ON CONFLICT DO NOTHING;
+
+            RETURN copied;
+        END;
+        $$ LANGUAGE plpgsql
+        """
+    )
+
+    # One transaction per batch, committed as it goes, so the API keeps
+    # running and a batch only ever holds up writes to its own players.
+    # Players created after this point only have mirrored rows.
+    with op.get_context().autocommit_block():
+        bind = op.get_bind()
+        last_player = bind.execute(sa.text("SELECT COALESCE(max(player_id), 0) FROM player")).scalar()
+        copied = 0
+        started = time.monotonic()
+        for first_player in range(1, last_player + 1, batch):
+            copied += bind.execute(
+                sa.text("SELECT backfill_partitioned_inventory(:first_player, :last_player)"),
+                {"first_player": first_player, "last_player": first_player + batch - 1},
+            ).scalar()
+            if (first_player // batch) % 100 == 0:
+                logger.info(
+                    "Backfilled players up to %d of %d, %d inventory rows, %.0fs",
+                    first_player + batch - 1, last_player, copied, time.monotonic() - started
+                )
+        bind.execute(sa.text("ANALYZE player_inventory_item_partitioned, item_enchantment_partitioned"))
+
+    # Cutover: everything below commits together with the revision bump
+    lock_for_cutover()
+    op.execute("DROP TRIGGER player_inventory_item_mirrored ON player_inventory_item")
+    op.execute("DROP TRIGGER item_enchantment_mirrored ON item_enchantment")
+    op.execute("DROP FUNCTION mirror_player_inventory_item()")
+    op.execute("DROP FUNCTION mirror_item_enchantment()")
+    op.execute("DROP FUNCTION backfill_partitioned_inventory(integer, integer)")
+    drop_enchantment_triggers()
+
+    # The id sequence belongs to the old column and would be dropped with it
+    op.execute(f"ALTER SEQUENCE {inventory_sequence()} OWNED BY player_inventory_item_partitioned.player_inventory_item_id")
+    op.execute("DROP TABLE item_enchantment")
+    op.execute("DROP TABLE player_inventory_item")
+    rename_into_place(suffix)
+
+    # Every lookup now carries player_id, so each one prunes to a single partition
+    op.execute(
+        """
+        CREATE FUNCTION refresh_enchantments(player_ids integer[], ids integer[]) RETURNS void AS $$
+        BEGIN
+            PERFORM 1 FROM player_inventory_item
+            WHERE player_id = ANY(player_ids) AND player_inventory_item_id = ANY(ids)
+            ORDER BY player_inventory_item_id
+            FOR UPDATE;
+
+            UPDATE player_inventory_item pii
+            SET enchantments = COALESCE((
+                SELECT array_agg(e.name ORDER BY e.name)
+                FROM item_enchantment ie
+                JOIN enchantment e ON e.enchantment_id = ie.enchantment_id
+                WHERE ie.player_id = pii.player_id
+                AND ie.player_inventory_item_id = pii.player_inventory_item_id
+            ), '{}')
+            WHERE pii.player_id = ANY(player_ids) AND pii.player_inventory_item_id = ANY(ids);
+        END;
+        $$ LANGUAGE plpgsql
+        """
+    )
+    op.execute("DROP FUNCTION refresh_enchantments(integer[])")
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION refresh_changed_enchantments() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                PERFORM refresh_enchantments(
+                    ARRAY(SELECT DISTINCT player_id FROM new_rows),
+                    ARRAY(SELECT DISTINCT player_inventory_item_id FROM new_rows)
+                );
+            END IF;
+            IF TG_OP IN ('DELETE', 'UPDATE') THEN
+                PERFORM refresh_enchantments(
+                    ARRAY(SELECT DISTINCT player_id FROM old_rows),
+                    ARRAY(SELECT DISTINCT player_inventory_item_id FROM old_rows)
+                );
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """
+    )
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION refresh_renamed_enchantments() RETURNS trigger AS $$
+        DECLARE
+            player_ids integer[];
+            ids integer[];
+        BEGIN
+            SELECT array_agg(DISTINCT ie.player_id), array_agg(DISTINCT ie.player_inventory_item_id)
+            INTO player_ids, ids
+            FROM item_enchantment ie
+            JOIN new_rows n ON n.enchantment_id = ie.enchantment_id
+            JOIN old_rows o ON o.enchantment_id = n.enchantment_id
+            WHERE n.name IS DISTINCT FROM o.name;
+            -- NULL when nothing was renamed, which matches no rows
+            PERFORM refresh_enchantments(player_ids, ids);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """
+    )
+    create_enchantment_triggers()
+
+
+def downgrade() -> None:
+    """Downgrade schema.
+
+    Copies everything back into unpartitioned tables in one transaction,
+    which blocks inventory traffic for the whole copy.
+    """
+    suffix = "_unpartitioned"
+    sequence = inventory_sequence()
+    op.execute(
+        f"""
+        CREATE TABLE player_inventory_item{suffix} (
+            player_inventory_item_id integer NOT NULL DEFAULT nextval('{sequence}')
+                CONSTRAINT player_inventory_item{suffix}_pkey PRIMARY KEY,
+            player_id integer CONSTRAINT player_inventory_item_player_id_fkey REFERENCES player (player_id),
+            item_id integer CONSTRAINT player_inventory_item_item_id_fkey REFERENCES item (item_id),
+            quantity integer NOT NULL CONSTRAINT check_quantity_non_negative CHECK (quantity >= 0),
+            enchantments varchar[] NOT NULL DEFAULT '{{}}',
+            CONSTRAINT uq_player_inventory_item{suffix}_player_item UNIQUE (player_id, item_id)
+        )
+        """
+    )
+    op.execute(
+        f"""
+        CREATE TABLE item_enchantment{suffix} (
+            player_inventory_item_id integer NOT NULL
+                CONSTRAINT item_enchantment_player_inventory_item_id_fkey
+                REFERENCES player_inventory_item{suffix} (player_inventory_item_id),
+            enchantment_id integer NOT NULL
+                CONSTRAINT item_enchantment_enchantment_id_fkey REFERENCES enchantment (enchantment_id),
+            CONSTRAINT item_enchantment{suffix}_pkey PRIMARY KEY (player_inventory_item_id, enchantment_id)
+        )
+        """
+    )
+    op.execute(
+        f"""
+        INSERT INTO player_inventory_item{suffix} (player_inventory_item_id, player_id, item_id, quantity, enchantments)
+        SELECT player_inventory_item_id, player_id, item_id, quantity, enchantments FROM player_inventory_item
+        """
+    )
+    op.execute(
+        f"""
+        INSERT INTO item_enchantment{suffix} (player_inventory_item_id, enchantment_id)
+        SELECT player_inventory_item_id, enchantment_id FROM item_enchantment
+        """
+    )
+    op.execute(f"CREATE INDEX idx_player_inventory_quantity{suffix} ON player_inventory_item{suffix} (player_id, quantity DESC)")
+    op.execute(f"CREATE INDEX ix_player_inventory_item{suffix}_item_id ON player_inventory_item{suffix} (item_id)")
+    op.execute(f"CREATE INDEX ix_item_enchantment{suffix}_enchantment_id ON item_enchantment{suffix} (enchantment_id)")
+
+    drop_enchantment_triggers()
+    op.execute(f"ALTER SEQUENCE {sequence} OWNED BY player_inventory_item{suffix}.player_inventory_item_id")
+    op.execute("DROP TABLE item_enchantment")
+    op.execute("DROP TABLE player_inventory_item")
+    rename_into_place(suffix)
+
+    # Back to the functions of migration 81f865a7420d
+    op.execute(
+        """
+        CREATE FUNCTION refresh_enchantments(ids integer[]) RETURNS void AS $$
+        BEGIN
+            PERFORM 1 FROM player_inventory_item
+            WHERE player_inventory_item_id = ANY(ids)
+            ORDER BY player_inventory_item_id
+            FOR UPDATE;
+
+            UPDATE player_inventory_item pii
+            SET enchantments = COALESCE((
+                SELECT array_agg(e.name ORDER BY e.name)
+                FROM item_enchantment ie
+                JOIN enchantment e ON e.enchantment_id = ie.enchantment_id
+                WHERE ie.player_inventory_item_id = pii.player_inventory_item_id
+            ), '{}')
+            WHERE pii.player_inventory_item_id = ANY(ids);
+        END;
+        $$ LANGUAGE plpgsql
+        """
+    )
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION refresh_changed_enchantments() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                PERFORM refresh_enchantments(ARRAY(SELECT DISTINCT player_inventory_item_id FROM new_rows));
+            END IF;
+            IF TG_OP IN ('DELETE', 'UPDATE') THEN
+                PERFORM refresh_enchantments(ARRAY(SELECT DISTINCT player_inventory_item_id FROM old_rows));
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """
+    )
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION refresh_renamed_enchantments() RETURNS trigger AS $$
+        BEGIN
+            PERFORM refresh_enchantments(ARRAY(
+                SELECT DISTINCT ie.player_inventory_item_id
+                FROM item_enchantment ie
+                JOIN new_rows n ON n.enchantment_id = ie.enchantment_id
+                JOIN old_rows o ON o.enchantment_id = n.enchantment_id
+                WHERE n.name IS DISTINCT FROM o.name
+            ));
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """
+    )
+    op.execute("DROP FUNCTION refresh_enchantments(integer[], integer[])")
+    create_enchantment_triggers()
@@ -0,0 +1,156 @@
+"""Denormalize enchantment names onto player inventory items
+
+Revision ID: 81f865a7420d
+Revises: 885b148a1eda
+Create Date: 2026-10-18 15:47:03.218664
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '81f865a7420d'
+down_revision: Union[str, None] = '885b148a1eda'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Inventory reads return these names directly instead of aggregating
+    # item_enchantment and enchantment for every row they return
+    op.add_column(
+        "player_inventory_item",
+        sa.Column("enchantments", postgresql.ARRAY(sa.String), server_default="{}", nullable=False)
+    )
+
+    # Recomputes the sorted enchantment names of the given inventory rows.
+    # The rows are locked first, so under READ COMMITTED the UPDATE's fresh
+    # snapshot includes any concurrent enchantment change to the same rows;
+    # under SERIALIZABLE the lock raises a retryable serialization failure.
+    op.execute(
+        """
+        CREATE FUNCTION refresh_enchantments(ids integer[]) RETURNS void AS $$
+        BEGIN
+            PERFORM 1 FROM player_inventory_item
+            WHERE player_inventory_item_id = ANY(ids)
+            ORDER BY player_inventory_item_id
+            FOR UPDATE;
+
+            UPDATE player_inventory_item pii
+            SET enchantments = COALESCE((
+                SELECT array_agg(e.name ORDER BY e.name)
+                FROM item_enchantment ie
+                JOIN enchantment e ON e.enchantment_id = ie.enchantment_id
+                WHERE ie.player_inventory_item_id = pii.player_inventory_item_id
+            ), '{}')
+            WHERE pii.player_inventory_item_id = ANY(ids);
+        END;
+        $$ LANGUAGE plpgsql
+        """
+    )
+
+    # Statement-level triggers see every changed row at once through their
+    # transition tables, so a bulk write refreshes each inventory row once.
+    # Postgres only allows transition tables on single-event triggers, hence
+    # one trigger per event sharing a function.
+    op.execute(
+        """
+        CREATE FUNCTION refresh_changed_enchantments() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                PERFORM refresh_enchantments(ARRAY(SELECT DISTINCT player_inventory_item_id FROM new_rows));
+            END IF;
+            IF TG_OP IN ('DELETE', 'UPDATE') THEN
+                PERFORM refresh_enchantments(ARRAY(SELECT DISTINCT player_inventory_item_id FROM old_rows));
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER item_enchantment_inserted
+        AFTER INSERT ON item_enchantment
+        REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION refresh_changed_enchantments()
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER item_enchantment_updated
+        AFTER UPDATE ON item_enchantment
+        REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION refresh_changed_enchantments()
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER item_enchantment_deleted
+        AFTER DELETE ON item_enchantment
+        REFERENCING OLD TABLE AS old_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION refresh_changed_enchantments()
+        """
+    )
+
+    # Renaming an enchantment refreshes every row that carries it. Postgres
+    # doesn't allow a column list alongside transition tables, so the function
+    # skips updates that left the name alone, e.g. description edits. Deletes
+    # need no trigger: the foreign key only lets an enchantment go once its
+    # item_enchantment rows are gone, and deleting those refreshed the rows.
+    op.execute(
+        """
+        CREATE FUNCTION refresh_renamed_enchantments() RETURNS trigger AS $$
+        BEGIN
+            PERFORM refresh_enchantments(ARRAY(
+                SELECT DISTINCT ie.player_inventory_item_id
+                FROM item_enchantment ie
+                JOIN new_rows n ON n.enchantment_id = ie.enchantment_id
+                JOIN old_rows o ON o.enchantment_id = n.enchantment_id
+                WHERE n.name IS DISTINCT FROM o.name
+            ));
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER enchantment_renamed
+        AFTER UPDATE ON enchantment
+        REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION refresh_renamed_enchantments()
+        """
+    )
+
+    # Backfill in one pass over item_enchantment instead of one subquery per row
+    op.execute(
+        """
+        UPDATE player_inventory_item pii
+        SET enchantments = agg.names
+        FROM (
+            SELECT ie.player_inventory_item_id, array_agg(e.name ORDER BY e.name) AS names
+            FROM item_enchantment ie
+            JOIN enchantment e ON e.enchantment_id = ie.enchantment_id
+            GROUP BY ie.player_inventory_item_id
+        ) agg
+        WHERE pii.player_inventory_item_id = agg.player_inventory_item_id
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP TRIGGER enchantment_renamed ON enchantment")
+    op.execute("DROP FUNCTION refresh_renamed_enchantments()")
+    op.execute("DROP TRIGGER item_enchantment_deleted ON item_enchantment")
+    op.execute("DROP TRIGGER item_enchantment_updated ON item_enchantment")
+    op.execute("DROP TRIGGER item_enchantment_inserted ON item_enchantment")
+    op.execute("DROP FUNCTION refresh_changed_enchantments()")
+    op.execute("DROP FUNCTION refresh_enchantments(integer[])")
+    op.drop_column("player_inventory_item", "enchantments")
@@ -0,0 +1,93 @@
+"""Unique player inventory item per player and item
+
+Revision ID: 885b148a1eda
+Revises: 3ae9f82af6e5
+Create Date: 2026-10-18 11:02:17.540931
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '885b148a1eda'
+down_revision: Union[str, None] = '3ae9f82af6e5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Merge duplicate (player_id, item_id) rows into the oldest one, summing
+    # quantities and moving their enchantments over, before adding the constraint
+    op.execute(
+        """
+        CREATE TEMPORARY TABLE duplicate_inventory_item ON COMMIT DROP AS
+        SELECT player_inventory_item_id AS duplicate_id, keep_id
+        FROM (
+            SELECT player_inventory_item_id,
+            min(player_inventory_item_id) OVER (PARTITION BY player_id, item_id) AS keep_id
+            FROM player_inventory_item
+        ) ranked
+        WHERE player_inventory_item_id <> keep_id
+        """
+    )
+    op.execute(
+        """
+        UPDATE player_inventory_item pii
+        SET quantity = totals.quantity
+        FROM (
+            SELECT d.keep_id, sum(pii.quantity) AS quantity
+            FROM player_inventory_item pii
+            JOIN (
+                SELECT keep_id, duplicate_id AS member_id FROM duplicate_inventory_item
+                UNION SELECT keep_id, keep_id FROM duplicate_inventory_item
+            ) d ON d.member_id = pii.player_inventory_item_id
+            GROUP BY d.keep_id
+        ) totals
+        WHERE pii.player_inventory_item_id = totals.keep_id
+        """
+    )
+    op.execute(
+        """
+        INSERT INTO item_enchantment (player_inventory_item_id, enchantment_id)
+        SELECT d.keep_id, ie.enchantment_id
+        FROM item_enchantment ie
+        JOIN duplicate_inventory_item d ON d.duplicate_id = ie.player_inventory_item_id
+        ON CONFLICT DO NOTHING
+        """
+    )
+    op.execute(
+        """
+        DELETE FROM item_enchantment
+        WHERE player_inventory_item_id IN (SELECT duplicate_id FROM duplicate_inventory_item)
+        """
+    )
+    op.execute(
+        """
+        DELETE FROM player_inventory_item
+        WHERE player_inventory_item_id IN (SELECT duplicate_id FROM duplicate_inventory_item)
+        """
+    )
+
+    op.create_unique_constraint(
+        "uq_player_inventory_item_player_item", "player_inventory_item", ["player_id", "item_id"]
+    )
+    # The constraint's index serves the same lookups
+    op.execute("DROP INDEX IF EXISTS idx_player_inventory_player_item")
+
+    # A guarded decrement may reach zero before the row is deleted in the same transaction
+    op.drop_constraint("check_quantity_positive", "player_inventory_item", type_="check")
+    op.create_check_constraint("check_quantity_non_negative", "player_inventory_item", "quantity >= 0")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint("check_quantity_non_negative", "player_inventory_item", type_="check")
+    op.create_check_constraint("check_quantity_positive", "player_inventory_item", "quantity > 0")
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS idx_player_inventory_player_item ON player_inventory_item(player_id, item_id)"
+    )
+    op.drop_constraint("uq_player_inventory_item_player_item", "player_inventory_item", type_="unique")
@@ -0,0 +1,67 @@
+"""Retire items and enchantments, removing their dependent rows in the background
+
+Revision ID: c4e9a7d2b813
+Revises: 81f865a7420d
+Create Date: 2026-10-18 18:21:40.902117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4e9a7d2b813'
+down_revision: Union[str, None] = '81f865a7420d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Retired rows are hidden from every read and write straight away and
+    # deleted once nothing references them any more
+    op.add_column("item", sa.Column("retired_at", sa.TIMESTAMP(timezone=True), nullable=True))
+    op.add_column("enchantment", sa.Column("retired_at", sa.TIMESTAMP(timezone=True), nullable=True))
+
+    # One row per retirement. Workers claim a running one with a lease they
+    # renew after every chunk, so a crashed worker's job is picked up again.
+    op.create_table(
+        "retirement",
+        sa.Column("retirement_id", sa.Integer, primary_key=True, autoincrement=True),
+        sa.Column("kind", sa.String, nullable=False),
+        sa.Column("target_id", sa.Integer, nullable=False),
+        sa.Column("name", sa.String, nullable=False),
+        sa.Column("status", sa.String, server_default="running", nullable=False),
+        sa.Column("rows_removed", sa.BigInteger, server_default="0", nullable=False),
+        sa.Column("created_at", sa.TIMESTAMP(timezone=True), server_default=sa.func.now(), nullable=False),
+        sa.Column("finished_at", sa.TIMESTAMP(timezone=True), nullable=True),
+        sa.Column("claimed_by", sa.String, nullable=True),
+        sa.Column("claimed_until", sa.TIMESTAMP(timezone=True), nullable=True),
+        sa.Column("last_error", sa.String, nullable=True),
+        sa.CheckConstraint("kind IN ('item', 'enchantment')", name="check_retirement_kind_valid"),
+        sa.CheckConstraint("status IN ('running', 'done')", name="check_retirement_status_valid"),
+    )
+
+    # Each chunk finds the next rows by item or enchantment. Neither has an
+    # index yet, and both tables are large, so build them without blocking writes.
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_player_inventory_item_item_id", "player_inventory_item", ["item_id"],
+            postgresql_concurrently=True, if_not_exists=True
+        )
+        op.create_index(
+            "ix_item_enchantment_enchantment_id", "item_enchantment", ["enchantment_id"],
+            postgresql_concurrently=True, if_not_exists=True
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index("ix_item_enchantment_enchantment_id", "item_enchantment", postgresql_concurrently=True)
+        op.drop_index("ix_player_inventory_item_item_id", "player_inventory_item", postgresql_concurrently=True)
+    op.drop_table("retirement")
+    op.drop_column("enchantment", "retired_at")
+    op.drop_column("item", "retired_at")
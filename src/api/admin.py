@@ -0,0 +1,97 @@
+from enum import Enum
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+
+from src import cache
+from src import database as db
+from src import profiling
+from src import ratelimit
+from src import replication
+from src import retirement
+from src import statements
+from src import retry
+from src.api import auth
+
+class StatementOrder(str, Enum):
+    total_ms = "total_ms"
+    mean_ms = "mean_ms"
+    max_ms = "max_ms"
+    count = "count"
+    rows = "rows"
+
+router = APIRouter(
+    prefix="/admin",
+    tags=["admin"],
+    dependencies=[Depends(auth.get_admin_api_key)],
+)
+
+# Returns hit/miss counters for the in-process caches of this worker
+@router.get("/cache")
+async def get_cache_stats():
+    return {"inventory": cache.inventory_cache.stats()}
+
+# Returns connection pool occupancy and checkout wait times for this worker.
+# Size pools so workers * max_connections_per_engine stays under Postgres'
+# max_connections.
+@router.get("/pool")
+async def get_pool_stats():
+    return db.pool_stats()
+
+# Returns how many reads went to replicas or the primary, and how often a
+# replica was too far behind the client's last write
+@router.get("/replication")
+async def get_replication_stats():
+    return {
+        "replicas": len(db.replica_uris),
+        "wait_seconds": replication.settings.REPLICA_WAIT_SECONDS,
+        **replication.stats.snapshot(),
+    }
+
+# Returns per-route transaction retry and give-up counters for this worker
+@router.get("/transactions")
+async def get_transaction_stats():
+    return retry.stats.snapshot()
+
+# Returns per-client rate limit state and how many requests were limited or shed
+@router.get("/rate-limits")
+async def get_rate_limits():
+    return {client.name: client.stats() for client in ratelimit.clients.values()}
+
+# Lists the latest item and enchantment retirements, newest first, and what
+# this worker's retirement job has done
+@router.get("/retirements")
+async def get_retirements(limit: int = Query(20, ge=1, le=500)):
+    async with db.begin() as connection:
+        rows = (await connection.execute(statements.RECENT_RETIREMENTS, {"limit": limit})).fetchall()
+    return {
+        "retirements": [retirement.retirement_json(row) for row in rows],
+        "worker": retirement.retirer.stats(),
+    }
+
+# Returns one retirement's progress, including how many rows are left
+@router.get("/retirements/{retirement_id}")
+async def get_retirement(retirement_id: int):
+    async with db.begin() as connection:
+        row = (await connection.execute(
+            statements.RETIREMENT_STATUS,
+            {"retirement_id": retirement_id}
+        )).first()
+    if row is None:
+        raise HTTPException(status_code=404, detail=f"Retirement with ID {retirement_id} not found")
+    return retirement.retirement_json(row)
+
+# Returns the most expensive SQL statements this worker has run, per route
+@router.get("/statements")
+async def get_top_statements(
+    limit: int = Query(20, ge=1, le=500),
+    order_by: StatementOrder = StatementOrder.total_ms,
+):
+    return {
+        "statements": profiling.stats.top(limit, order_by.value),
+        "dropped": profiling.stats.dropped,
+    }
+
+# Starts statement profiling over, e.g. before a load test
+@router.delete("/statements", status_code=status.HTTP_204_NO_CONTENT)
+async def reset_statements():
+    profiling.stats.reset()
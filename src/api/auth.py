@@ -1,16 +1,64 @@
 from src import config
+from src import database as db
+from src import ratelimit
 from fastapi import Security, HTTPException, status, Request
 from fastapi.security.api_key import APIKeyHeader
+import logging
+import math
+
+logger = logging.getLogger(__name__)
 
-api_key = config.get_settings().API_KEY
 api_key_header = APIKeyHeader(name="access_token", auto_error=False)
 
+settings = config.get_settings()
 
-async def get_api_key(request: Request, api_key_header: str = Security(api_key_header)):
-    print(f"api_key_header: {api_key_header}, api_key: {api_key}")
-    if api_key_header == api_key:
-        return api_key_header
-    else:
+admin_keys = {key.strip() for key in settings.ADMIN_API_KEYS.split(",") if key.strip()}
+
+
+def authenticate(request: Request, api_key_header: str | None) -> ratelimit.ApiClient:
+    client = ratelimit.lookup(api_key_header)
+    if client is None:
+        logger.warning("Rejected request with a missing or invalid API key", extra={"path": request.url.path})
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="Forbidden"
         )
+    return client
+
+
+# Authenticates the caller, applies its rate limit, then sheds load when the
+# database pool is already backed up, so overload fails fast instead of
+# queueing until the pool times out
+async def get_api_key(request: Request, api_key_header: str = Security(api_key_header)):
+    client = authenticate(request, api_key_header)
+
+    wait = client.bucket.take()
+    if wait > 0:
+        client.rate_limited += 1
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Rate limit exceeded",
+            headers={"Retry-After": str(math.ceil(wait))},
+        )
+
+    if settings.SHED_CHECKOUT_WAITERS and db.checkout_stats.waiting >= settings.SHED_CHECKOUT_WAITERS:
+        client.shed += 1
+        logger.warning("Shedding request while the connection pool is backed up", extra={"client": client.name})
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Server is overloaded, please retry",
+            headers={"Retry-After": "1"},
+        )
+
+    client.allowed += 1
+    return api_key_header
+
+# Only ADMIN_API_KEYS may read or reset a worker's stats. Neither rate limited
+# nor shed, so operators can still inspect a worker that is shedding load.
+async def get_admin_api_key(request: Request, api_key_header: str = Security(api_key_header)):
+    if api_key_header is not None and api_key_header in admin_keys:
+        return api_key_header
+    client = authenticate(request, api_key_header)
+    logger.warning("Rejected a non-admin key on an admin endpoint", extra={"client": client.name, "path": request.url.path})
+    raise HTTPException(
+        status_code=status.HTTP_403_FORBIDDEN, detail="Admin API key required"
+    )
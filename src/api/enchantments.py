@@ -1,11 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Request
 from pydantic import BaseModel, Field
+from contextlib import AsyncExitStack
 from typing import Optional
 from enum import Enum
 
-import sqlalchemy
-
+from src import cache
+from src import catalog
 from src import database as db
+from src import etag
+from src import responses
+from src import retirement
+from src import statements
+from src import streaming
 from src.api import auth
 
 router = APIRouter(
@@ -22,50 +28,62 @@ class EnchantmentResponse(BaseModel):
     message: str
     enchantment: Enchantment
 
+class RetirementResponse(BaseModel):
+    message: str
+    retirement_id: int
+
 class UpdateEnchantmentDescription(BaseModel):
     effect_description: str = Field(..., min_length=1, max_length=250)
 
 
 @router.get("/enchantments", response_model=list[Enchantment])
-def get_enchantments():
-    with db.engine.begin() as connection:
-        results = connection.execute(
-            sqlalchemy.text(
-                """
-                SELECT enchantment_id, name, effect_description
-                FROM enchantment
-                ORDER BY enchantment_id
-                """
+async def get_enchantments(request: Request):
+    stream = streaming.wants_ndjson(request)
+    if catalog.catalog.ready:
+        catalog_etag = etag.make_etag("enchantments", catalog.catalog.enchantment_version, ndjson=stream)
+        if etag.matches(request, catalog_etag):
+            return etag.not_modified(catalog_etag)
+        results = catalog.catalog.enchantments
+        if stream:
+            return streaming.ndjson_response(
+                streaming.in_memory(results), enchantment_json, headers=etag.headers(catalog_etag)
             )
-        ).fetchall()
-
-    return [
-        Enchantment(
-            enchantment_id=row.enchantment_id,
-            name=row.name,
-            effect_description=row.effect_description
-        )
-        for row in results
-    ]
+    else:
+        # REPEATABLE READ so the version and the rows come from the same snapshot
+        async with AsyncExitStack() as transaction:
+            connection = await transaction.enter_async_context(db.begin_read(isolation_level="REPEATABLE READ"))
+            catalog_etag = etag.make_etag("enchantments", await catalog.get_version(connection, "enchantment"), ndjson=stream)
+            if etag.matches(request, catalog_etag):
+                return etag.not_modified(catalog_etag)
+
+            if stream:
+                return streaming.ndjson_response(
+                    db.stream_partitions(connection, statements.ENCHANTMENTS),
+                    enchantment_json,
+                    headers=etag.headers(catalog_etag),
+                    transaction=transaction.pop_all(),
+                )
+
+            results = (await connection.execute(statements.ENCHANTMENTS)).fetchall()
+
+    return responses.json_response([enchantment_json(row) for row in results], headers=etag.headers(catalog_etag))
+
+# Catalog rows go out as plain dicts in Enchantment's shape, without Pydantic validation
+def enchantment_json(row) -> dict:
+    return {"name": row.name, "effect_description": row.effect_description}
 
 @router.post("/enchantments", status_code=status.HTTP_201_CREATED, response_model=EnchantmentResponse)
-def create_enchantment(enchantment: Enchantment):
-    with db.engine.begin() as connection:
-        result = connection.execute(
-            sqlalchemy.text(
-                """
-                INSERT INTO enchantment (name, effect_description, created_at)
-                VALUES (:name, :effect_description, CURRENT_TIMESTAMP)
-                ON CONFLICT (name) DO NOTHING
-                RETURNING enchantment_id
-                """
-            ),
+async def create_enchantment(enchantment: Enchantment):
+    async with db.begin() as connection:
+        result = await connection.execute(
+            statements.CREATE_ENCHANTMENT,
             {
                 "name": enchantment.name,
                 "effect_description": enchantment.effect_description
             }
         )
         new_enchantment_id = result.scalar()
+        await catalog.bump_version(connection, "enchantment")
         return {
             "message": f"Enchantment '{enchantment.name}' with ID {new_enchantment_id} created successfully",
             "enchantment": {
@@ -75,76 +93,49 @@ def create_enchantment(enchantment: Enchantment):
         }
     }
 
-@router.delete("/enchantments/{enchantment_id}", response_model=dict[str, str])
-def delete_enchantment(enchantment_id: int):
-    with db.engine.begin() as connection:
-        existing = connection.execute(
-            sqlalchemy.text(
-                """
-                SELECT enchantment_id FROM enchantment
-                WHERE enchantment_id = :enchantment_id
-                """
-            ),
+# Retires the specified enchantment. Its name disappears from every inventory
+# at once; a background job then strips it from items a chunk at a time.
+@router.delete("/enchantments/{enchantment_id}", status_code=status.HTTP_202_ACCEPTED, response_model=RetirementResponse)
+async def delete_enchantment(enchantment_id: int):
+    async with db.begin() as connection:
+        retirement_id = (await connection.execute(
+            statements.RETIRE_ENCHANTMENT,
             {"enchantment_id": enchantment_id}
-        ).first()
+        )).scalar()
 
-        if not existing:
+        if retirement_id is None:
             raise HTTPException(status_code=404, detail=f"Enchantment with ID {enchantment_id} not found")
 
-        connection.execute(
-            sqlalchemy.text(
-                """
-                DELETE FROM item_enchantment
-                WHERE enchantment_id = :enchantment_id
-                """
-            ),
-            {"enchantment_id": enchantment_id}
-        )
+        await catalog.bump_version(connection, "enchantment")
 
-        connection.execute(
-            sqlalchemy.text(
-                """
-                DELETE FROM enchantment
-                WHERE enchantment_id = :enchantment_id
-                """
-            ),
-            {"enchantment_id": enchantment_id}
-        )
-        return {
-            "message": f"Enchantment with ID {enchantment_id} deleted successfully"
-        }
+    # Any cached inventory may show the enchantment
+    cache.inventory_cache.clear()
+    retirement.retirer.wake()
+    return {
+        "message": f"Enchantment with ID {enchantment_id} deleted; removing it from items",
+        "retirement_id": retirement_id
+    }
 
 @router.put("/enchantments/{enchantment_id}/effect_description",  response_model=dict[str, str])
-def update_enchantment_effect_description(enchantment_id: int, update: UpdateEnchantmentDescription):
-    with db.engine.begin() as connection:
-        existing = connection.execute(
-            sqlalchemy.text(
-                """
-                SELECT enchantment_id FROM enchantment
-                WHERE enchantment_id = :enchantment_id
-                """
-            ),
+async def update_enchantment_effect_description(enchantment_id: int, update: UpdateEnchantmentDescription):
+    async with db.begin() as connection:
+        existing = (await connection.execute(
+            statements.ENCHANTMENT_EXISTS,
             {"enchantment_id": enchantment_id}
-        ).first()
+        )).first()
 
         if not existing:
             if not existing:
                 raise HTTPException(status_code=404, detail=f"Enchantment with ID {enchantment_id} not found")
 
-        connection.execute(
-            sqlalchemy.text(
-                """
-                UPDATE enchantment
-                SET effect_description = :effect_description,
-                    created_at = CURRENT_TIMESTAMP
-                WHERE enchantment_id = :enchantment_id
-                """
-            ),
+        await connection.execute(
+            statements.UPDATE_ENCHANTMENT_DESCRIPTION,
             {
                 "enchantment_id": enchantment_id,
                 "effect_description": update.effect_description
             }
         )
+        await catalog.bump_version(connection, "enchantment")
 
     return {
         "message": f"Successfully updated enchantment {enchantment_id}'s effect description",
@@ -1,11 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request
 from pydantic import BaseModel, Field
+from contextlib import AsyncExitStack
 from typing import Optional
 from enum import Enum
 
-import sqlalchemy
-
+from src import cache
+from src import catalog
 from src import database as db
+from src import etag
+from src import responses
+from src import retirement
+from src import statements
+from src import streaming
 from src.api import auth
 
 router = APIRouter(
@@ -42,61 +48,72 @@ class ItemResponse(BaseModel):
     message: str
     item: Item
 
-# Returns all items in the database
+class RetirementResponse(BaseModel):
+    message: str
+    retirement_id: int
+
+# Returns all items in the database, as NDJSON when the client asks for it
 @router.get("/items", response_model=list[Item])
-def get_items(
+async def get_items(
+    request: Request,
     item_type: Optional[ItemType] = Query(None, description="Filter by item type"),
     rarity: Optional[str] = Query(None, description="Filter by item rarity"),
 ):
-    base_query = """
-        SELECT item_id, name, item_type, rarity
-        FROM item
-    """
-    
-    filters = []
-    params = {}
-
-    # Allows for filtering by item_type and rarity
-    if item_type is not None:
-        filters.append("item_type = :item_type")
-        params["item_type"] = item_type.value
-
-    if rarity is not None:
-        filters.append("rarity = :rarity")
-        params["rarity"] = rarity
+    stream = streaming.wants_ndjson(request)
+    if catalog.catalog.ready:
+        # Served from the in-memory catalog, which is indexed by (item_type, rarity)
+        catalog_etag = etag.make_etag("items", catalog.catalog.item_version, ndjson=stream)
+        if etag.matches(request, catalog_etag):
+            return etag.not_modified(catalog_etag)
+        results = catalog.catalog.filter_items(item_type.value if item_type else None, rarity)
+        if stream:
+            return streaming.ndjson_response(
+                streaming.in_memory(results), item_json, headers=etag.headers(catalog_etag)
+            )
+    else:
+        # Allows for filtering by item_type and rarity
+        query = statements.ITEMS[(item_type is not None, rarity is not None)]
+        params = {}
+        if item_type is not None:
+            params["item_type"] = item_type.value
+        if rarity is not None:
+            params["rarity"] = rarity
+
+        # REPEATABLE READ so the version and the rows come from the same snapshot
+        async with AsyncExitStack() as transaction:
+            connection = await transaction.enter_async_context(db.begin_read(isolation_level="REPEATABLE READ"))
+            catalog_etag = etag.make_etag("items", await catalog.get_version(connection, "item"), ndjson=stream)
+            if etag.matches(request, catalog_etag):
+                return etag.not_modified(catalog_etag)
+
+            if stream:
+                return streaming.ndjson_response(
+                    db.stream_partitions(connection, query, params),
+                    item_json,
+                    headers=etag.headers(catalog_etag),
+                    transaction=transaction.pop_all(),
+                )
 
-    if filters:
-        base_query += " WHERE " + " AND ".join(filters)
-    
-    base_query += " ORDER BY item_id"
+            results = (await connection.execute(query, params)).fetchall()
 
-    with db.engine.begin() as connection:
-        results = connection.execute(sqlalchemy.text(base_query), params).fetchall()
+    return responses.json_response([item_json(row) for row in results], headers=etag.headers(catalog_etag))
 
-    return [
-        Item(
-            item_id=row.item_id,
-            name=row.name,
-            item_type=row.item_type,
-            rarity=row.rarity
-        )
-        for row in results
-    ]
+# Catalog rows go out as plain dicts in Item's shape, without Pydantic validation
+def item_json(row) -> dict:
+    return {"item_id": row.item_id, "name": row.name, "item_type": row.item_type, "rarity": row.rarity}
 
 # Returns a specific item's information such as item_id, name, item_type and rarity
 @router.get("/items/{item_id}", response_model=Item)
-def get_item(item_id: int):
-    with db.engine.begin() as connection:
-        item = connection.execute(
-            sqlalchemy.text(
-                """
-                SELECT item_id, name, item_type, rarity
-                FROM item
-                WHERE item_id = :item_id
-                """
-            ),
-            {"item_id": item_id}
-        ).first()
+async def get_item(item_id: int):
+    # Items created moments ago may not have reached the catalog yet, so a
+    # catalog miss still falls through to the database
+    item = catalog.catalog.items_by_id.get(item_id)
+    if item is None:
+        async with db.begin_read() as connection:
+            item = (await connection.execute(
+                statements.ITEM_BY_ID,
+                {"item_id": item_id}
+            )).first()
 
         if not item:
             raise HTTPException(status_code=404, detail=f"Item with ID {item_id} not found")
@@ -111,37 +128,31 @@ def get_item(item_id: int):
 
 # Creates a new item
 @router.post("/items", status_code=status.HTTP_201_CREATED, response_model=ItemResponse)
-def create_item(item: ItemWithoutID):
-    with db.engine.begin() as connection:
+async def create_item(item: ItemWithoutID):
+    async with db.begin() as connection:
         # Checks if the item is already in the database
-        existing = connection.execute(
-            sqlalchemy.text(
-                """
-                SELECT name, item_type, rarity FROM item
-                WHERE name = :name AND item_type = :item_type AND rarity = :rarity
-                """
-            ),
+        existing = (await connection.execute(
+            statements.FIND_ITEM,
             {
                 "name": item.name,
                 "item_type": item.item_type,
                 "rarity": item.rarity
             }
-        ).first()
+        )).first()
 
+        if existing and existing.retired:
+            raise HTTPException(
+                status_code=409,
+                detail=f"Item with name {item.name} is still being removed; create it again once that finishes"
+            )
         if existing:
             raise HTTPException(
                 status_code=409,
                 detail=f"Item with name {item.name}, type {item.item_type.value}, and rarity {item.rarity} already exists"
             )
             
-        result = connection.execute(
-            sqlalchemy.text(
-                """
-                INSERT INTO item (name, item_type, rarity, created_at)
-                VALUES (:name, :item_type, :rarity, CURRENT_TIMESTAMP)
-                RETURNING item_id
-                """
-            ),
+        result = await connection.execute(
+            statements.CREATE_ITEM,
             {
                 "name": item.name,
                 "item_type": item.item_type.value,
@@ -149,6 +160,7 @@ def create_item(item: ItemWithoutID):
             }
         )
         new_item_id = result.scalar()
+        await catalog.bump_version(connection, "item")
 
     return {
         "message": f"Item '{item.name}' with ID {new_item_id} created successfully",
@@ -160,57 +172,28 @@ def create_item(item: ItemWithoutID):
         }
     }
 
-# Deletes the specified item
-@router.delete("/items/{item_id}", response_model=dict[str, str])
-def delete_item(item_id: int):
-    with db.engine.begin() as connection:
-        # Checks if the item is in the database
-        existing = connection.execute(
-            sqlalchemy.text(
-                """
-                SELECT item_id FROM item
-                WHERE item_id = :item_id
-                """
-            ),
+# Retires the specified item. It disappears from the catalog and from every
+# inventory at once; the inventory rows holding it are removed afterwards by a
+# background job, a chunk at a time, whose progress GET /admin/retirements/{id}
+# reports.
+@router.delete("/items/{item_id}", status_code=status.HTTP_202_ACCEPTED, response_model=RetirementResponse)
+async def delete_item(item_id: int):
+    async with db.begin() as connection:
+        retirement_id = (await connection.execute(
+            statements.RETIRE_ITEM,
             {"item_id": item_id}
-        ).first()
+        )).scalar()
 
-        if not existing:
+        if retirement_id is None:
             raise HTTPException(status_code=404, detail=f"Item with ID {item_id} not found")
 
-        connection.execute(
-            sqlalchemy.text(
-                """
-                DELETE FROM player_inventory_item
-                WHERE item_id = :item_id
-                """
-            ),
-            {"item_id": item_id}
-        )
-        
-        connection.execute(
-            sqlalchemy.text(
-                """
-                DELETE FROM item_enchantment
-                WHERE player_inventory_item_id IN (
-                    SELECT player_inventory_item_id
-                    FROM player_inventory_item
-                    WHERE item_id = :item_id
-                )
-                """
-            ),
-            {"item_id": item_id}
-        )
+        await catalog.bump_version(connection, "item")
 
-        connection.execute(
-            sqlalchemy.text(
-                """
-                DELETE FROM item
-                WHERE item_id = :item_id
-                """
-            ),
-            {"item_id": item_id}
-        )
-        return {
-            "message": f"Item with ID {item_id} deleted successfully"
-        }
+    # Any cached inventory may hold the item, and finding out which would take
+    # the scan this avoids
+    cache.inventory_cache.clear()
+    retirement.retirer.wake()
+    return {
+        "message": f"Item with ID {item_id} deleted; removing it from inventories",
+        "retirement_id": retirement_id
+    }
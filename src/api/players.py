@@ -1,11 +1,21 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Body, Depends, HTTPException, status, Query, Request
 from pydantic import BaseModel, Field
-from typing import List
+from contextlib import AsyncExitStack
+from typing import Annotated, Dict, List, Optional, Union
 
-import sqlalchemy
+import base64
+import json
 from enum import Enum
 
+from src import cache
+from src import catalog
 from src import database as db
+from src import etag
+from src import replication
+from src import responses
+from src import retry
+from src import statements
+from src import streaming
 from src.api import auth
 
 router = APIRouter(
@@ -43,6 +53,11 @@ class CreatePlayerRequest(BaseModel):
 class InventoryResponse(BaseModel):
     items: List[InventoryItem]
     message: str
+    next_cursor: Optional[str] = None
+
+class BatchInventoryResponse(BaseModel):
+    inventories: Dict[int, List[InventoryItem]]
+    missing: List[int]
 
 class RemoveItemResponse(BaseModel):
     message: str
@@ -57,6 +72,16 @@ class AddItemResponse(BaseModel):
     quantity_added: int
     total_quantity: int
 
+class AddedItem(BaseModel):
+    item_id: int
+    name: str
+    quantity_added: int
+    total_quantity: int
+
+class BulkAddItemResponse(BaseModel):
+    message: str
+    items: List[AddedItem]
+
 class EnchantItemResponse(BaseModel):
     message: str
     item_id: int
@@ -77,342 +102,444 @@ class RemoveEnchantmentsResponse(BaseModel):
     item_id: int
     player_id: int
 
-# Helper function to check if a player exists in the database
-def check_player_exists(connection, player_id: int):
-    player = connection.execute(
-        sqlalchemy.text("SELECT player_id FROM player WHERE player_id = :player_id"),
+# Returns the player's inventory version, raising 404 if the player doesn't exist
+async def get_inventory_version(connection, player_id: int) -> int:
+    version = (await connection.execute(
+        statements.INVENTORY_VERSION,
         {"player_id": player_id}
-    ).first()
-    if not player:
+    )).scalar()
+    if version is None:
+        raise player_not_found(player_id)
+    return version
+
+def player_not_found(player_id: int) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_404_NOT_FOUND,
+        detail=f"Player with ID {player_id} not found"
+    )
+
+def item_not_in_inventory(player_id: int, item_id: int) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_404_NOT_FOUND,
+        detail=f"Item with ID {item_id} not found in player {player_id}'s inventory"
+    )
+
+# Encodes the sort key of the last row on a page into an opaque cursor
+def encode_cursor(quantity: int, name: str, player_inventory_item_id: int) -> str:
+    raw = json.dumps([quantity, name, player_inventory_item_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+# Decodes a cursor produced by encode_cursor back into its sort key
+def decode_cursor(cursor: str) -> tuple[int, str, int]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        quantity, name, player_inventory_item_id = json.loads(base64.urlsafe_b64decode(padded))
+        if not (isinstance(quantity, int) and isinstance(name, str) and isinstance(player_inventory_item_id, int)):
+            raise ValueError
+    except (ValueError, TypeError):
         raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"Player with ID {player_id} not found"
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+    return quantity, name, player_inventory_item_id
+
+MAX_BATCH_PLAYERS = 200
+
+# Returns the inventories of many players at once, e.g. everyone in a match.
+# Players already cached are served from memory; the rest are loaded with one
+# set-based statement. Unknown player IDs are listed in 'missing'.
+@router.get("/inventory", response_model=BatchInventoryResponse)
+async def get_inventories(ids: str = Query(..., description="Comma-separated player IDs")):
+    try:
+        player_ids = list(dict.fromkeys(int(part) for part in ids.split(",") if part.strip()))
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="ids must be a comma-separated list of integers"
+        )
+    if not player_ids or len(player_ids) > MAX_BATCH_PLAYERS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Between 1 and {MAX_BATCH_PLAYERS} player IDs are allowed per request"
         )
-    return player
 
-# Returns a player's inventory
+    inventories: Dict[int, List[dict]] = {}
+    uncached = []
+    min_lsns = []
+    for player_id in player_ids:
+        min_lsn = replication.inventory_writes.min_lsn(player_id)
+        cached = cache.inventory_cache.get(player_id)
+        if cached is not None and not replication.is_stale(cached[4], min_lsn):
+            inventories[player_id] = cached[0]["items"]
+        else:
+            uncached.append(player_id)
+            if min_lsn is not None:
+                min_lsns.append(min_lsn)
+
+    if uncached:
+        token = cache.inventory_cache.token()
+        async with db.begin_read(min_lsn=max(min_lsns, default=None)) as connection:
+            # Players without items still come back as one row with NULL item columns
+            result = (await connection.execute(
+                statements.BATCH_INVENTORY,
+                {"player_ids": uncached}
+            )).fetchall()
+
+        rows_by_player: Dict[int, list] = {}
+        versions: Dict[int, int] = {}
+        for row in result:
+            versions[row.player_id] = row.inventory_version
+            player_rows = rows_by_player.setdefault(row.player_id, [])
+            if row.player_inventory_item_id is not None:
+                player_rows.append(row)
+
+        for player_id, rows in rows_by_player.items():
+            items = [inventory_row_json(row) for row in rows]
+            inventories[player_id] = items
+            entry = cache_entry(player_id, items, rows, versions[player_id], replication.read_lsn())
+            cache.inventory_cache.put(player_id, entry, token)
+
+    missing = [player_id for player_id in player_ids if player_id not in inventories]
+    return responses.json_response({"inventories": inventories, "missing": missing})
+
+# Returns a player's inventory, optionally one page at a time.
+# Pages follow the (quantity DESC, name ASC) ordering, so the cursor is the
+# sort key of the last row returned and the next page seeks past it. Each row
+# carries its enchantment names, kept up to date by triggers, so there is
+# nothing to join or aggregate.
+# With Accept: application/x-ndjson the whole inventory is streamed instead,
+# one item per line.
 @router.get("/{player_id}/inventory", response_model=InventoryResponse)
-def get_inventory(player_id: int):
-    with db.engine.begin() as connection:
-        # First check if player exists
-        check_player_exists(connection, player_id)
-            
-        result = connection.execute(
-            sqlalchemy.text(
-                """
-                SELECT pii.player_id,
-                i.item_id AS item_id,
-                i.name,
-                i.item_type,
-                i.rarity,
-                pii.quantity,
-                COALESCE(array_agg(e.name) FILTER (WHERE e.name IS NOT NULL), '{}') AS enchantments
-                FROM player_inventory_item pii
-                JOIN item i ON pii.item_id = i.item_id
-                LEFT JOIN item_enchantment ie ON ie.player_inventory_item_id = pii.player_inventory_item_id
-                LEFT JOIN enchantment e ON e.enchantment_id = ie.enchantment_id
-                WHERE pii.player_id = :player_id
-                GROUP BY pii.player_id, i.item_id, i.name, i.item_type, i.rarity, pii.quantity
-                ORDER BY pii.quantity DESC, i.name ASC
-
-                """
-            ), 
-            {"player_id": player_id}
-        ).fetchall()
-
-    items = [
-        InventoryItem(
-            item_id=row.item_id,
-            name=row.name,
-            item_type=row.item_type,
-            rarity=row.rarity,
-            quantity=row.quantity,
-            enchantments=row.enchantments
+async def get_inventory(
+    player_id: int,
+    request: Request,
+    limit: Optional[int] = Query(None, ge=1, le=500, description="Maximum number of items to return"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+):
+    after = decode_cursor(cursor) if cursor is not None else None
+    stream = streaming.wants_ndjson(request)
+    if stream and (limit is not None or after is not None):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="limit and cursor can't be used with application/x-ndjson; the stream returns the whole inventory"
         )
-        for row in result
-    ]
-    
-    msg = f"Player {player_id} has {len(items)} item(s) in their inventory."
-    return InventoryResponse(items=items, message=msg)
+
+    # Whole inventories are cached; pages of a cached inventory are sliced from
+    # it. A copy older than the client's last write is skipped.
+    min_lsn = replication.inventory_writes.min_lsn(player_id)
+    cached = cache.inventory_cache.get(player_id)
+    if cached is not None and not replication.is_stale(cached[4], min_lsn):
+        inventory_etag = etag.make_etag("inventory", player_id, cached[3], ndjson=stream)
+        if etag.matches(request, inventory_etag):
+            return etag.not_modified(inventory_etag)
+        if stream:
+            return streaming.ndjson_response(
+                streaming.in_memory(cached[0]["items"]),
+                lambda item: item,
+                headers=etag.headers(inventory_etag),
+            )
+        page = page_cached_inventory(player_id, cached, limit, after)
+        if page is not None:
+            return responses.json_response(page, headers=etag.headers(inventory_etag))
+    token = cache.inventory_cache.token()
+
+    params = {"player_id": player_id}
+    if after is not None:
+        after_quantity, after_name, after_id = after
+        params.update(after_quantity=after_quantity, after_name=after_name, after_id=after_id)
+    if limit is not None:
+        # Fetch one extra row to know whether another page exists
+        params["limit"] = limit + 1
+    query = statements.INVENTORY_PAGES[(after is not None, limit is not None)]
+
+    # REPEATABLE READ so the version and the rows come from the same snapshot
+    async with AsyncExitStack() as transaction:
+        connection = await transaction.enter_async_context(
+            db.begin_read(isolation_level="REPEATABLE READ", min_lsn=min_lsn)
+        )
+        # Also checks that the player exists
+        version = await get_inventory_version(connection, player_id)
+        inventory_etag = etag.make_etag("inventory", player_id, version, ndjson=stream)
+        if etag.matches(request, inventory_etag):
+            return etag.not_modified(inventory_etag)
+
+        if stream:
+            return streaming.ndjson_response(
+                db.stream_partitions(connection, query, params),
+                inventory_row_json,
+                headers=etag.headers(inventory_etag),
+                transaction=transaction.pop_all(),
+            )
+
+        result = (await connection.execute(query, params)).fetchall()
+
+    next_cursor = None
+    if limit is not None and len(result) > limit:
+        result = result[:limit]
+        last = result[-1]
+        next_cursor = encode_cursor(last.quantity, last.name, last.player_inventory_item_id)
+
+    items = [inventory_row_json(row) for row in result]
+
+    if limit is None and after is None:
+        cached = cache_entry(player_id, items, result, version, replication.read_lsn())
+        cache.inventory_cache.put(player_id, cached, token)
+        inventory = cached[0]
+    else:
+        inventory = inventory_response(player_id, items, next_cursor, paged=True)
+    return responses.json_response(inventory, headers=etag.headers(inventory_etag))
+
+# Builds the cached form of a whole inventory from its rows in page order.
+# read_lsn is the WAL position the rows were read at, if replicas are in use.
+def cache_entry(player_id: int, items: List[dict], rows, version: int, read_lsn: Optional[int]):
+    inventory = inventory_response(player_id, items, None, paged=False)
+    sort_keys = [(row.quantity, row.name, row.player_inventory_item_id) for row in rows]
+    positions = {key[2]: index for index, key in enumerate(sort_keys)}
+    return inventory, sort_keys, positions, version, read_lsn
+
+# Inventory items go out as plain dicts in InventoryItem's shape. The rows come
+# straight from our own schema, so they skip Pydantic validation.
+def inventory_row_json(row) -> dict:
+    return {
+        "item_id": row.item_id,
+        "name": row.name,
+        "item_type": row.item_type,
+        "rarity": row.rarity,
+        "quantity": row.quantity,
+        "enchantments": row.enchantments,
+    }
+
+def inventory_response(player_id: int, items: List[dict], next_cursor: Optional[str], paged: bool) -> dict:
+    if paged:
+        msg = f"Returning {len(items)} item(s) from player {player_id}'s inventory."
+    else:
+        msg = f"Player {player_id} has {len(items)} item(s) in their inventory."
+    return {"items": items, "message": msg, "next_cursor": next_cursor}
+
+# Serves a request from a cached whole inventory, or returns None if the
+# cursor points at a row the cached copy doesn't have. Rows are located by
+# player_inventory_item_id rather than by comparing names in Python, since the
+# database collation decides the name order.
+def page_cached_inventory(player_id: int, cached, limit: Optional[int], after: Optional[tuple[int, str, int]]):
+    inventory, sort_keys, positions, _, _ = cached
+    if limit is None and after is None:
+        return inventory
+
+    start = 0
+    if after is not None:
+        position = positions.get(after[2])
+        if position is None or sort_keys[position] != after:
+            return None
+        start = position + 1
+    end = len(sort_keys) if limit is None else start + limit
+
+    next_cursor = None
+    if end < len(sort_keys):
+        next_cursor = encode_cursor(*sort_keys[end - 1])
+    return inventory_response(player_id, inventory["items"][start:end], next_cursor, paged=True)
+
+# The write endpoints below each run as a single statement. Their first CTE
+# bumps the player's inventory version, which doubles as the existence check,
+# and the remaining CTEs validate and mutate together. The final SELECT reports
+# what was found so the handler can still raise the right 404/400; raising
+# rolls back the whole transaction, so a rejected request changes nothing.
+# Quantity changes are guarded by the rows they modify (ON CONFLICT upserts
+# and conditional UPDATEs), so they are race-free at READ COMMITTED.
 
 # Allows the player to remove items from their inventory
 @router.patch("/{player_id}/inventory/{item_id}", status_code=status.HTTP_200_OK, response_model=RemoveItemResponse)
-def remove_item_quantity(player_id: int, item_id: int, request: ItemRequest):
-    with db.engine.connect().execution_options(isolation_level="REPEATABLE READ") as connection:
-        with connection.begin():
-            # Check if player exists
-            check_player_exists(connection, player_id)
-                
-            # Check if item exists in inventory
-            result = connection.execute(
-                sqlalchemy.text(
-                    """
-                    SELECT player_id, item_id, quantity
-                    FROM player_inventory_item
-                    WHERE player_id = :player_id AND item_id = :item_id
-                    """
-                ), 
+async def remove_item_quantity(player_id: int, item_id: int, request: ItemRequest):
+    async def remove(connection):
+        # The decrement only applies while enough is left, re-checked against
+        # the latest row version if a concurrent write got there first
+        result = (await connection.execute(
+            statements.REMOVE_ITEM_QUANTITY,
+            {
+                "player_id": player_id,
+                "channel": catalog.CHANNEL,
+                "item_id": item_id,
+                "quantity": request.quantity
+            }
+        )).one()
+
+        if not result.player_exists:
+            raise player_not_found(player_id)
+
+        if result.remaining is None:
+            # Decide between 404 and 400 on the row as it is now, not as the
+            # statement's snapshot saw it before a concurrent write
+            available = (await connection.execute(
+                statements.LOCK_INVENTORY_QUANTITY,
                 {"player_id": player_id, "item_id": item_id}
-            ).first()
-                
-            if not result:
-                raise HTTPException(
-                    status_code=status.HTTP_404_NOT_FOUND, 
-                    detail=f"Item with ID {item_id} not found in player {player_id}'s inventory"
-                )
-                
-            if result.quantity < request.quantity:
-                raise HTTPException( 
-                    status_code=status.HTTP_400_BAD_REQUEST, 
-                    detail=f"Not enough quantity available. Requested: {request.quantity}, Available: {result.quantity}"
-                )
+            )).scalar()
+            if available is None:
+                raise item_not_in_inventory(player_id, item_id)
+            if available >= request.quantity:
+                # Enough arrived after the snapshot; the locked row can't change again
+                return await remove(connection)
+            raise HTTPException( 
+                status_code=status.HTTP_400_BAD_REQUEST, 
+                detail=f"Not enough quantity available. Requested: {request.quantity}, Available: {available}"
+            )
 
-            # Get item name for the response message
-            item_name = connection.execute(
-                sqlalchemy.text(
-                    """
-                    SELECT name FROM item WHERE item_id = :item_id
-                    """
-                ),
-                {"item_id": item_id}
-            ).scalar()
-
-            # Removes the items from the player's inventory
-            if result.quantity == request.quantity:
-                connection.execute(
-                    sqlalchemy.text(
-                        """
-                        DELETE FROM player_inventory_item
-                        WHERE player_id = :player_id AND item_id = :item_id
-                        """
-                    ), 
-                    {"player_id": player_id, "item_id": item_id}
-                )
-                return RemoveItemResponse(
-                    message=f"Removed all {request.quantity} '{item_name}' from player {player_id}'s inventory",
-                    item_id=item_id,
-                    quantity_removed=request.quantity,
-                    remaining=0
-                )
-            else:
-                # Update the item's quantity in the player's inventory
-                new_quantity = result.quantity - request.quantity
-                connection.execute(
-                    sqlalchemy.text(
-                        """
-                        UPDATE player_inventory_item 
-                        SET quantity = quantity - :quantity
-                        WHERE player_id = :player_id AND item_id = :item_id
-                        """
-                    ), 
-                    {
-                        "player_id": player_id,
-                        "item_id": item_id,
-                        "quantity": request.quantity
-                    }
-                )
-                return RemoveItemResponse(
-                    message=f"Removed {request.quantity} '{item_name}' from player {player_id}'s inventory",
-                    item_id=item_id,
-                    quantity_removed=request.quantity,
-                    remaining=new_quantity
-                )
+        if result.remaining == 0:
+            # Everything was removed, so drop the row and its enchantments
+            await connection.execute(
+                statements.DELETE_EMPTY_INVENTORY_ITEM,
+                {"player_id": player_id, "pii_id": result.player_inventory_item_id}
+            )
+
+        item_name = await catalog.catalog.item_name(connection, item_id)
+        return result.remaining, item_name
+
+    remaining, item_name = await retry.run_transaction("remove_item_quantity", remove)
+    if remaining == 0:
+        message = f"Removed all {request.quantity} '{item_name}' from player {player_id}'s inventory"
+    else:
+        message = f"Removed {request.quantity} '{item_name}' from player {player_id}'s inventory"
+
+    # Invalidate only after commit so a concurrent read can't re-cache the old rows
+    cache.inventory_cache.invalidate(player_id)
+    replication.inventory_writes.record([player_id])
+    return RemoveItemResponse(
+        message=message,
+        item_id=item_id,
+        quantity_removed=request.quantity,
+        remaining=remaining
+    )
+
+MAX_BULK_ADD_ITEMS = 100
+
+# Allow the player to add an item, or a list of items, to their inventory.
+# A list is applied as one set-based upsert: duplicate item_ids are merged,
+# and if any item_id is unknown nothing is added at all.
+@router.post("/{player_id}/inventory", status_code=status.HTTP_201_CREATED, response_model=Union[AddItemResponse, BulkAddItemResponse])
+async def add_item(
+    player_id: int,
+    request: Union[
+        AddItemRequest,
+        Annotated[List[AddItemRequest], Field(min_length=1, max_length=MAX_BULK_ADD_ITEMS)]
+    ] = Body(...),
+):
+    requests = request if isinstance(request, list) else [request]
+    quantities: Dict[int, int] = {}
+    for entry in requests:
+        quantities[entry.item_id] = quantities.get(entry.item_id, 0) + entry.quantity
+
+    async with db.begin() as connection:
+        # Upserts every requested item, adding to the rows the player already has
+        result = (await connection.execute(
+            statements.ADD_ITEMS,
+            {
+                "player_id": player_id,
+                "channel": catalog.CHANNEL,
+                "item_ids": list(quantities),
+                "quantities": list(quantities.values())
+            }
+        )).one()
 
-# Allow the player to add an item to their inventory
-@router.post("/{player_id}/inventory", status_code=status.HTTP_201_CREATED, response_model=AddItemResponse)
-def add_item(player_id: int, request: AddItemRequest):
-    with db.engine.begin() as connection:
-        # Check if player exists
-        check_player_exists(connection, player_id)
-            
-        # Check if item exists
-        item = connection.execute(
-            sqlalchemy.text(
-                """
-                SELECT item_id, name FROM item WHERE item_id = :item_id
-                """
-            ),
-            {"item_id": request.item_id}
-        ).first()
-        
-        if not item:
+        if not result.player_exists:
+            raise player_not_found(player_id)
+
+        if result.unknown_item_ids:
+            if not isinstance(request, list):
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail=f"Item with ID {request.item_id} not found"
+                )
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
-                detail=f"Item with ID {request.item_id} not found"
+                detail={
+                    "message": "Some items were not found; nothing was added",
+                    "unknown_item_ids": result.unknown_item_ids
+                }
             )
 
-        existing = connection.execute(
-            sqlalchemy.text(
-                """
-                SELECT player_id, item_id, quantity
-                FROM player_inventory_item
-                WHERE player_id = :player_id AND item_id = :item_id
-                """
-            ), 
-            {"player_id": player_id, "item_id": request.item_id}
-        ).first()
+        # Each total carries the item's name, so no lookups follow the upsert
+        totals = {total["item_id"]: total for total in result.totals}
 
-        if existing:
-            # If the item is already in the player's inventory
-            new_quantity = existing.quantity + request.quantity
-            connection.execute(
-                sqlalchemy.text(
-                    """
-                    UPDATE player_inventory_item
-                    SET quantity = quantity + :quantity
-                    WHERE player_id = :player_id AND item_id = :item_id
-                    """
-                ), 
-                {
-                    "quantity": request.quantity,
-                    "player_id": player_id,
-                    "item_id": request.item_id
-                }
-            )
-            return AddItemResponse(
-                message=f"Added {request.quantity} more '{item.name}' to player {player_id}'s inventory",
-                item_id=request.item_id,
-                name=item.name,
-                quantity_added=request.quantity,
-                total_quantity=new_quantity
-            )
+    cache.inventory_cache.invalidate(player_id)
+    replication.inventory_writes.record([player_id])
+
+    if not isinstance(request, list):
+        item_name = totals[request.item_id]["name"]
+        if totals[request.item_id]["existed"]:
+            message = f"Added {request.quantity} more '{item_name}' to player {player_id}'s inventory"
         else:
-            # If the item isn't already in the player's inventory
-            connection.execute(
-                sqlalchemy.text(
-                    """
-                    INSERT INTO player_inventory_item (player_id, item_id, quantity)
-                    VALUES (:player_id, :item_id, :quantity)
-                    """
-                ), 
-                {
-                "player_id": player_id,
-                "item_id": request.item_id,
-                "quantity": request.quantity
-                }
-            )
-            return AddItemResponse(
-                message=f"Added {request.quantity} '{item.name}' to player {player_id}'s inventory",
-                item_id=request.item_id,
-                name=item.name,
-                quantity_added=request.quantity,
-                total_quantity=request.quantity
+            message = f"Added {request.quantity} '{item_name}' to player {player_id}'s inventory"
+        return AddItemResponse(
+            message=message,
+            item_id=request.item_id,
+            name=item_name,
+            quantity_added=request.quantity,
+            total_quantity=totals[request.item_id]["total_quantity"]
+        )
+
+    return BulkAddItemResponse(
+        message=f"Added {sum(quantities.values())} item(s) of {len(quantities)} kind(s) to player {player_id}'s inventory",
+        items=[
+            AddedItem(
+                item_id=item_id,
+                name=totals[item_id]["name"],
+                quantity_added=quantity,
+                total_quantity=totals[item_id]["total_quantity"]
             )
+            for item_id, quantity in quantities.items()
+        ]
+    )
 
 # Allows the player to enchant an item
 @router.post("/{player_id}/inventory/{item_id}/enchant", status_code=status.HTTP_201_CREATED, response_model=EnchantItemResponse)
-def enchant_item(player_id: str, item_id: int, request: EnchantRequest):
-    with db.engine.connect().execution_options(isolation_level="SERIALIZABLE") as connection:
-        with connection.begin():
-            # Check if player exists
-            check_player_exists(connection, player_id)
-                
-            inventory_row = connection.execute(
-                sqlalchemy.text(
-                    """
-                    SELECT pii.player_id, pii.item_id, i.name
-                    FROM player_inventory_item pii
-                    JOIN item i ON pii.item_id = i.item_id
-                    WHERE pii.player_id = :player_id AND pii.item_id = :item_id
-                    """
-                ),
-                {
-                    "player_id": player_id,
-                    "item_id": item_id
-                }
-            ).first()
+async def enchant_item(player_id: int, item_id: int, request: EnchantRequest):
+    async def apply(connection):
+        # Applies the enchantment only if both the inventory row and the enchantment exist
+        result = (await connection.execute(
+            statements.ENCHANT_ITEM,
+            {
+                "player_id": player_id,
+                "channel": catalog.CHANNEL,
+                "item_id": item_id,
+                "enchantment_id": request.enchantment_id
+            }
+        )).one()
 
-            if not inventory_row:
-                raise HTTPException(
-                    status_code=status.HTTP_404_NOT_FOUND, 
-                    detail=f"Item with ID {item_id} not found in player {player_id}'s inventory"
-                )
+        if not result.player_exists:
+            raise player_not_found(player_id)
 
-            enchant = connection.execute(
-                sqlalchemy.text(
-                    """
-                    SELECT enchantment_id, name
-                    FROM enchantment 
-                    WHERE enchantment_id = :enchantment_id
-                    """
-                ),
-                {"enchantment_id": request.enchantment_id}
-            ).first()
-
-            if not enchant:
-                raise HTTPException(
-                    status_code=status.HTTP_404_NOT_FOUND, 
-                    detail=f"Enchantment with ID {request.enchantment_id} not found"
-                )
+        if not result.in_inventory:
+            raise item_not_in_inventory(player_id, item_id)
 
-            # Check if enchantment already exists
-            inventory_row = connection.execute(
-                sqlalchemy.text(
-                    """
-                    SELECT pii.player_inventory_item_id, i.name
-                    FROM player_inventory_item pii
-                    JOIN item i ON pii.item_id = i.item_id
-                    WHERE pii.player_id = :player_id AND pii.item_id = :item_id
-                    """
-                ),
-                {"player_id": player_id, "item_id": item_id}
-            ).first()
-
-            if not inventory_row:
-                raise HTTPException(status_code=404, detail="Item not found in inventory")
-
-            player_inventory_item_id = inventory_row.player_inventory_item_id
-            item_name = inventory_row.name
-
-            existing_enchant = connection.execute(
-                sqlalchemy.text(
-                    """
-                    SELECT 1 FROM item_enchantment
-                    WHERE player_inventory_item_id = :pii_id AND enchantment_id = :enchantment_id
-                    """
-                ),
-                {
-                    "pii_id": player_inventory_item_id,
-                    "enchantment_id": request.enchantment_id
-                }
-            ).first()
-
-            connection.execute(
-                sqlalchemy.text(
-                    """
-                    INSERT INTO item_enchantment (player_inventory_item_id, enchantment_id)
-                    VALUES (:pii_id, :enchantment_id)
-                    ON CONFLICT DO NOTHING
-                    """
-                ),
-                {
-                    "pii_id": player_inventory_item_id,
-                    "enchantment_id": request.enchantment_id
-                }
-            )
-            return EnchantItemResponse(
-                message=f"Successfully applied enchantment '{enchant.name}' to '{inventory_row.name}'",
-                item_id=item_id,
-                item_name=inventory_row.name,
-                enchantment_id=request.enchantment_id,
-                enchantment_name=enchant.name
+        if not result.enchantment_exists:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND, 
+                detail=f"Enchantment with ID {request.enchantment_id} not found"
             )
 
+        item_name = await catalog.catalog.item_name(connection, item_id)
+        enchantment_name = await catalog.catalog.enchantment_name(connection, request.enchantment_id)
+        return item_name, enchantment_name
+
+    item_name, enchantment_name = await retry.run_transaction("enchant_item", apply, isolation_level="SERIALIZABLE")
+    cache.inventory_cache.invalidate(player_id)
+    replication.inventory_writes.record([player_id])
+    return EnchantItemResponse(
+        message=f"Successfully applied enchantment '{enchantment_name}' to '{item_name}'",
+        item_id=item_id,
+        item_name=item_name,
+        enchantment_id=request.enchantment_id,
+        enchantment_name=enchantment_name
+    )
+
 # Allows for the creation of new players
 @router.post("", status_code=status.HTTP_201_CREATED, response_model=CreatePlayerResponse)
-def create_player(request: CreatePlayerRequest):
+async def create_player(request: CreatePlayerRequest):
     """Create a new player."""
-    with db.engine.begin() as connection:
+    async with db.begin() as connection:
         # Check if username exists
-        existing = connection.execute(
-            sqlalchemy.text(
-                """
-                SELECT username FROM player
-                WHERE username = :username
-                """
-            ),
+        existing = (await connection.execute(
+            statements.PLAYER_BY_USERNAME,
             {"username": request.username}
-        ).first()
+        )).first()
 
         if existing:
             raise HTTPException(
@@ -421,14 +548,8 @@ def create_player(request: CreatePlayerRequest):
             )
 
         # Create the player
-        result = connection.execute(
-            sqlalchemy.text(
-                """
-                INSERT INTO player (username, created_at)
-                VALUES (:username, CURRENT_TIMESTAMP)
-                RETURNING player_id
-                """
-            ),
+        result = await connection.execute(
+            statements.CREATE_PLAYER,
             {
                 "username": request.username
             }
@@ -442,43 +563,24 @@ def create_player(request: CreatePlayerRequest):
 
 # Allows the player to delete an item's enchantment
 @router.delete("/{player_id}/inventory/{item_id}/enchantments", status_code=status.HTTP_200_OK, response_model=RemoveEnchantmentsResponse)
-def remove_enchantments(player_id: str, item_id: int):
-    with db.engine.connect().execution_options(isolation_level="SERIALIZABLE") as connection:
-        with connection.begin():
-            check_player_exists(connection, player_id)
-
-            # Get player_inventory_item_id
-            inventory_row = connection.execute(
-                sqlalchemy.text(
-                    """
-                    SELECT player_inventory_item_id, item_id FROM player_inventory_item
-                    WHERE player_id = :player_id AND item_id = :item_id
-                    """
-                ),
-                {"player_id": player_id, "item_id": item_id}
-            ).first()
-
-            if not inventory_row:
-                raise HTTPException(
-                    status_code=status.HTTP_404_NOT_FOUND,
-                    detail=f"Item with ID {item_id} not found in player {player_id}'s inventory"
-                )
-
-            pii_id = inventory_row.player_inventory_item_id
-
-            # Delete enchantment for this item
-            deleted = connection.execute(
-                sqlalchemy.text(
-                    """
-                    DELETE FROM item_enchantment
-                    WHERE player_inventory_item_id = :pii_id
-                    """
-                ),
-                {"pii_id": pii_id}
-            )
-
-            return RemoveEnchantmentsResponse(
-                message=f"Successfully removed enchantment from item ID {item_id} for player {player_id}.",
-                item_id=item_id,
-                player_id=player_id
-            )
\ No newline at end of file
+async def remove_enchantments(player_id: int, item_id: int):
+    async def remove(connection):
+        result = (await connection.execute(
+            statements.REMOVE_ENCHANTMENTS,
+            {"player_id": player_id, "item_id": item_id, "channel": catalog.CHANNEL}
+        )).one()
+
+        if not result.player_exists:
+            raise player_not_found(player_id)
+
+        if not result.in_inventory:
+            raise item_not_in_inventory(player_id, item_id)
+
+    await retry.run_transaction("remove_enchantments", remove, isolation_level="SERIALIZABLE")
+    cache.inventory_cache.invalidate(player_id)
+    replication.inventory_writes.record([player_id])
+    return RemoveEnchantmentsResponse(
+        message=f"Successfully removed enchantment from item ID {item_id} for player {player_id}.",
+        item_id=item_id,
+        player_id=player_id
+    )
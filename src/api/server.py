@@ -1,5 +1,11 @@
+from contextlib import asynccontextmanager
+import asyncio
+
 from fastapi import FastAPI
-from src.api import players, items, enchantments
+from fastapi.responses import PlainTextResponse
+from src import catalog, config, log, metrics, profiling, replication, responses, retirement
+from src import database as db
+from src.api import players, items, enchantments, admin
 from starlette.middleware.cors import CORSMiddleware
 
 description = """
@@ -8,9 +14,35 @@ Item Management API helps with managing items in multiplayer games.
 tags_metadata = [
     {"name": "players", "description": "Data associated with a player."},
     {"name": "items", "description": "Global item management."},
-    {"name": "enchantments", "description": "Global enchantment management."}
+    {"name": "enchantments", "description": "Global enchantment management."},
+    {"name": "admin", "description": "Operational statistics for this worker."}
 ]
 
+# Replicas too, or routed reads would vanish from /admin/statements
+if config.get_settings().SQL_PROFILING:
+    profiling.install(
+        db.engine,
+        *([db.async_engine.sync_engine] if db.async_engine is not None else []),
+        *db.replica_engines,
+        *(replica.sync_engine for replica in db.async_replica_engines),
+    )
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    log.configure()
+    # Load the item/enchantment catalog and keep it fresh via LISTEN/NOTIFY;
+    # with CATALOG_CACHE off it never becomes ready and reads go to Postgres,
+    # but the listener still clears the inventory cache on catalog changes
+    if config.get_settings().CATALOG_CACHE:
+        await catalog.catalog.load()
+    listener = asyncio.create_task(catalog.catalog.listen())
+    # Removes the rows of retired items and enchantments in the background
+    retirer = asyncio.create_task(retirement.retirer.run())
+    yield
+    retirer.cancel()
+    listener.cancel()
+    log.shutdown()
+
 app = FastAPI(
     title="Item Management API",
     description=description,
@@ -20,6 +52,8 @@ app = FastAPI(
         "name": "Item Management API",
     },
     openapi_tags=tags_metadata,
+    lifespan=lifespan,
+    default_response_class=responses.JSON,
 )
 
 origins = ["https://item-management-api-dl6u.onrender.com"]
@@ -30,12 +64,25 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["GET", "OPTIONS", "POST", "DELETE"],
     allow_headers=["*"],
+    expose_headers=[replication.COMMIT_LSN_HEADER],
 )
 
+app.add_middleware(replication.ReplicationMiddleware)
+
+app.add_middleware(log.RequestLogMiddleware)
+# Outermost, so the latency includes every other middleware
+app.add_middleware(metrics.MetricsMiddleware, metrics=metrics.request_metrics)
+
 app.include_router(players.router)
 app.include_router(items.router)
 app.include_router(enchantments.router)
+app.include_router(admin.router)
 
 @app.get("/")
 async def root():
-    return {"message": "Ready for database collection!"}
\ No newline at end of file
+    return {"message": "Ready for database collection!"}
+
+# Prometheus scrape endpoint for this worker's request metrics
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    return PlainTextResponse(metrics.request_metrics.render(), media_type=metrics.CONTENT_TYPE)
@@ -0,0 +1,118 @@
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Hashable, Iterable, Optional
+import time
+
+from src import config
+
+
+class LRUCache:
+    """Bounded in-process cache with LRU eviction and a per-entry TTL.
+
+    Readers call token() before querying the database and pass it to put().
+    A put is dropped if the key was invalidated after the token was taken, so
+    a slow read can never overwrite the cache with data older than a write.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        # Tick of the most recent invalidation per key, bounded like the entries
+        self._invalidations: OrderedDict[Hashable, int] = OrderedDict()
+        self._tick = 0
+        # Puts holding a token older than this are rejected outright
+        self._floor = 0
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def token(self) -> int:
+        return self._tick
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value: Any, token: int) -> bool:
+        with self._lock:
+            if token < self._floor or self._invalidations.get(key, 0) > token:
+                return False
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+            return True
+
+    def invalidate(self, key: Hashable) -> None:
+        with self._lock:
+            self._invalidate(key)
+
+    def invalidate_many(self, keys: Iterable[Hashable]) -> None:
+        keys = set(keys)
+        if len(keys) > self.max_entries:
+            # Cheaper to start over than to track every key individually
+            self.clear()
+            return
+        with self._lock:
+            for key in keys:
+                self._invalidate(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._tick += 1
+            self._floor = self._tick
+            self._entries.clear()
+            self._invalidations.clear()
+            self.invalidations += 1
+
+    def _invalidate(self, key: Hashable) -> None:
+        self._tick += 1
+        self._entries.pop(key, None)
+        self._invalidations[key] = self._tick
+        self._invalidations.move_to_end(key)
+        self.invalidations += 1
+        if len(self._invalidations) > self.max_entries:
+            # Forgetting an invalidation raises the floor past it instead
+            _, tick = self._invalidations.popitem(last=False)
+            self._floor = max(self._floor, tick)
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
+
+
+settings = config.get_settings()
+
+# Built inventories keyed by player_id
+inventory_cache = LRUCache(
+    max_entries=settings.INVENTORY_CACHE_SIZE,
+    ttl_seconds=settings.INVENTORY_CACHE_TTL_SECONDS,
+)
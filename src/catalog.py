@@ -0,0 +1,152 @@
+import asyncio
+import logging
+from typing import Optional
+
+import psycopg
+import sqlalchemy
+
+from src import cache
+from src import config
+from src import database as db
+from src import statements
+
+logger = logging.getLogger(__name__)
+
+# Catalog writes notify this channel with '<name>:<version>' on commit, and
+# inventory writes with 'inventory:<player_id>'
+CHANNEL = "catalog_changed"
+
+
+# Returns the current version of a global catalog ('item' or 'enchantment')
+async def get_version(connection, name: str) -> Optional[int]:
+    return (await connection.execute(statements.CATALOG_VERSION, {"name": name})).scalar()
+
+# Bumps a global catalog's version and notifies every worker's listener.
+# Call inside the transaction that changes the catalog; Postgres only delivers
+# the notification if that transaction commits.
+async def bump_version(connection, name: str) -> None:
+    await connection.execute(
+        statements.BUMP_CATALOG_VERSION,
+        {"name": name, "channel": CHANNEL}
+    )
+
+
+class Catalog:
+    """Process-wide snapshot of the item and enchantment tables.
+
+    Each table is replaced wholesale on reload, so readers always see one
+    consistent version of it. Reloads happen at startup and whenever another
+    connection commits a catalog change.
+    """
+
+    def __init__(self):
+        self.items: list = []
+        self.items_by_id: dict = {}
+        self.items_by_type_rarity: dict = {}
+        self.item_version: Optional[int] = None
+        self.enchantments: list = []
+        self.enchantments_by_id: dict = {}
+        self.enchantment_version: Optional[int] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.item_version is not None and self.enchantment_version is not None
+
+    async def load(self, name: Optional[str] = None) -> None:
+        """Reloads one catalog ('item' or 'enchantment'), or both if name is None."""
+        # REPEATABLE READ so the version and the rows come from the same snapshot
+        async with db.begin(isolation_level="REPEATABLE READ") as connection:
+            if name in (None, "item"):
+                version = await get_version(connection, "item")
+                rows = (await connection.execute(statements.ITEMS[(False, False)])).fetchall()
+                self._set_items(rows, version)
+            if name in (None, "enchantment"):
+                version = await get_version(connection, "enchantment")
+                rows = (await connection.execute(statements.ENCHANTMENTS)).fetchall()
+                self._set_enchantments(rows, version)
+
+    def _set_items(self, rows, version: int) -> None:
+        by_type_rarity: dict = {}
+        for row in rows:
+            by_type_rarity.setdefault((row.item_type, row.rarity), []).append(row)
+        self.items_by_id = {row.item_id: row for row in rows}
+        self.items_by_type_rarity = by_type_rarity
+        self.items = rows
+        self.item_version = version
+
+    def _set_enchantments(self, rows, version: int) -> None:
+        self.enchantments_by_id = {row.enchantment_id: row for row in rows}
+        self.enchantments = rows
+        self.enchantment_version = version
+
+    def filter_items(self, item_type: Optional[str], rarity: Optional[str]) -> list:
+        """Items matching the filters, ordered by item_id like the SQL query."""
+        if item_type is not None and rarity is not None:
+            return self.items_by_type_rarity.get((item_type, rarity), [])
+        if item_type is None and rarity is None:
+            return self.items
+        matching = [
+            rows for (row_type, row_rarity), rows in self.items_by_type_rarity.items()
+            if row_type == item_type or row_rarity == rarity
+        ]
+        return sorted((row for rows in matching for row in rows), key=lambda row: row.item_id)
+
+    async def item_name(self, connection, item_id: int) -> Optional[str]:
+        """Looks the name up in the snapshot, or in the database if it isn't there yet."""
+        item = self.items_by_id.get(item_id)
+        if item is not None:
+            return item.name
+        return (await connection.execute(statements.ITEM_NAME, {"item_id": item_id})).scalar()
+
+    async def enchantment_name(self, connection, enchantment_id: int) -> Optional[str]:
+        """Looks the name up in the snapshot, or in the database if it isn't there yet."""
+        enchantment = self.enchantments_by_id.get(enchantment_id)
+        if enchantment is not None:
+            return enchantment.name
+        return (await connection.execute(statements.ENCHANTMENT_NAME, {"enchantment_id": enchantment_id})).scalar()
+
+    async def listen(self) -> None:
+        """Reloads the catalog on every notification until cancelled.
+
+        Uses its own autocommit psycopg connection, since LISTEN has to stay
+        open outside any pooled transaction. After a reconnect everything is
+        reloaded, as notifications sent while disconnected are lost.
+
+        Inventory writes on any worker drop that player's cached inventory
+        here, and every catalog change clears the whole inventory cache, since
+        retiring or renaming changes inventories the writing worker can't
+        reach. That runs even with CATALOG_CACHE off, which only skips the reloads.
+        """
+        url = sqlalchemy.engine.make_url(settings.POSTGRES_URI).set(drivername="postgresql")
+        conninfo = url.render_as_string(hide_password=False)
+        delay = 1.0
+        while True:
+            try:
+                async with await psycopg.AsyncConnection.connect(conninfo, autocommit=True) as connection:
+                    await connection.execute(f"LISTEN {CHANNEL}")
+                    cache.inventory_cache.clear()
+                    if settings.CATALOG_CACHE:
+                        await self.load()
+                    delay = 1.0
+                    async for notify in connection.notifies():
+                        name, _, value = notify.payload.partition(":")
+                        if name == "inventory":
+                            cache.inventory_cache.invalidate(int(value))
+                            continue
+                        cache.inventory_cache.clear()
+                        if not settings.CATALOG_CACHE:
+                            continue
+                        current = self.item_version if name == "item" else self.enchantment_version
+                        if current is None or int(value) > current:
+                            await self.load(name)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Catalog listener failed; reconnecting in %.0fs", delay)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 30.0)
+
+
+settings = config.get_settings()
+
+catalog = Catalog()
@@ -2,8 +2,6 @@ from dotenv import load_dotenv, find_dotenv
 import os
 from functools import lru_cache
 
-print("DEBUG: POSTGRES_URI =", os.getenv("POSTGRES_URI"))
-
 # Load default first
 load_dotenv(dotenv_path="default.env", override=False)
 
@@ -13,13 +11,60 @@ load_dotenv(dotenv_path=find_dotenv(".env"), override=True)
 
 class Settings:
     API_KEY: str | None = os.getenv("API_KEY")
+    # Extra keys as "name:key[:rate[:burst]]", comma-separated; API_KEY is named "default"
+    API_KEYS: str = os.getenv("API_KEYS", "")
+    # Comma-separated keys for /admin/*, which other keys get 403 from
+    ADMIN_API_KEYS: str = os.getenv("ADMIN_API_KEYS", "")
+    # 0 leaves keys unthrottled, for load tests
+    RATE_LIMIT_PER_SECOND: float = float(os.getenv("RATE_LIMIT_PER_SECOND", "100"))
+    RATE_LIMIT_BURST: float = float(os.getenv("RATE_LIMIT_BURST", "200"))
+    # Shed requests with 503 once this many are waiting for a pooled connection; 0 disables
+    SHED_CHECKOUT_WAITERS: int = int(os.getenv("SHED_CHECKOUT_WAITERS", "50"))
     POSTGRES_URI: str | None = os.getenv("POSTGRES_URI")
+    # Each worker opens at most DB_POOL_SIZE + DB_MAX_OVERFLOW connections per engine
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", "5"))
+    DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+    DB_POOL_TIMEOUT_SECONDS: float = float(os.getenv("DB_POOL_TIMEOUT_SECONDS", "30"))
+    DB_POOL_RECYCLE_SECONDS: int = int(os.getenv("DB_POOL_RECYCLE_SECONDS", "-1"))
+    DB_POOL_PRE_PING: bool = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+    # psycopg prepares a statement server-side after it has run this many times on a connection
+    DB_PREPARED_STATEMENTS: bool = os.getenv("DB_PREPARED_STATEMENTS", "true").lower() in ("1", "true", "yes")
+    DB_PREPARE_THRESHOLD: int = int(os.getenv("DB_PREPARE_THRESHOLD", "2"))
+    DB_PREPARED_MAX: int = int(os.getenv("DB_PREPARED_MAX", "100"))
+    # Comma-separated replica URIs; read-only handlers use them when set
+    REPLICA_URIS: str = os.getenv("REPLICA_URIS", "")
+    # How long a read waits for a replica to replay the client's last write before using the primary
+    REPLICA_WAIT_SECONDS: float = float(os.getenv("REPLICA_WAIT_SECONDS", "0.2"))
+    DB_ASYNC: bool = os.getenv("DB_ASYNC", "true").lower() in ("1", "true", "yes")
+    CATALOG_CACHE: bool = os.getenv("CATALOG_CACHE", "true").lower() in ("1", "true", "yes")
+    INVENTORY_CACHE_SIZE: int = int(os.getenv("INVENTORY_CACHE_SIZE", "10000"))
+    INVENTORY_CACHE_TTL_SECONDS: float = float(os.getenv("INVENTORY_CACHE_TTL_SECONDS", "30"))
+    # "orjson" (C-accelerated) or "json" (standard library) for JSON responses
+    JSON_RESPONSE_CLASS: str = os.getenv("JSON_RESPONSE_CLASS", "orjson").lower()
+    # Retired items and enchantments lose their inventory rows this many players per transaction
+    RETIREMENT_CHUNK_SIZE: int = int(os.getenv("RETIREMENT_CHUNK_SIZE", "500"))
+    RETIREMENT_PAUSE_SECONDS: float = float(os.getenv("RETIREMENT_PAUSE_SECONDS", "0.05"))
+    # A worker that stops renewing its claim for this long hands the retirement to another
+    RETIREMENT_LEASE_SECONDS: float = float(os.getenv("RETIREMENT_LEASE_SECONDS", "60"))
+    RETIREMENT_POLL_SECONDS: float = float(os.getenv("RETIREMENT_POLL_SECONDS", "10"))
+    LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")
+    # Fraction of records kept per level, e.g. "DEBUG=0.01,INFO=0.1"; unlisted levels are all kept
+    LOG_SAMPLE_RATES: str = os.getenv("LOG_SAMPLE_RATES", "DEBUG=0.01")
+    LOG_QUEUE_SIZE: int = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+    SQL_PROFILING: bool = os.getenv("SQL_PROFILING", "true").lower() in ("1", "true", "yes")
+    SLOW_QUERY_MS: float = float(os.getenv("SLOW_QUERY_MS", "200"))
+    SLOW_QUERY_EXPLAIN_RATE: float = float(os.getenv("SLOW_QUERY_EXPLAIN_RATE", "0.01"))
+    TX_MAX_RETRIES: int = int(os.getenv("TX_MAX_RETRIES", "5"))
+    TX_RETRY_BASE_DELAY_SECONDS: float = float(os.getenv("TX_RETRY_BASE_DELAY_SECONDS", "0.01"))
+    TX_RETRY_MAX_DELAY_SECONDS: float = float(os.getenv("TX_RETRY_MAX_DELAY_SECONDS", "0.5"))
 
     def __init__(self):
-        if not self.API_KEY:
+        if not self.API_KEY and not self.API_KEYS:
             raise ValueError("API_KEY is missing in the environment variables.")
         if not self.POSTGRES_URI:
             raise ValueError("POSTGRES_URI is missing in the environment variables.")
+        if self.JSON_RESPONSE_CLASS not in ("json", "orjson"):
+            raise ValueError("JSON_RESPONSE_CLASS must be 'json' or 'orjson'.")
 
 
 @lru_cache()
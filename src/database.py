@@ -1,5 +1,337 @@
+from contextlib import AsyncExitStack, asynccontextmanager, contextmanager
+from threading import Lock
+from typing import Any, AsyncIterator, Iterator, Optional
+import asyncio
+import itertools
+import logging
+import time
+
 from src import config
-from sqlalchemy import create_engine
+from src import replication
+from src import statements
+from sqlalchemy import create_engine, event, exc
+from sqlalchemy.ext.asyncio import create_async_engine
+from starlette.concurrency import run_in_threadpool
+
+settings = config.get_settings()
+connection_url = settings.POSTGRES_URI
+
+# Pre-ping costs a round trip on every checkout; with it off, set
+# DB_POOL_RECYCLE_SECONDS below the server's idle timeout instead.
+pool_options = {
+    "pool_size": settings.DB_POOL_SIZE,
+    "max_overflow": settings.DB_MAX_OVERFLOW,
+    "pool_timeout": settings.DB_POOL_TIMEOUT_SECONDS,
+    "pool_recycle": settings.DB_POOL_RECYCLE_SECONDS,
+    "pool_pre_ping": settings.DB_POOL_PRE_PING,
+}
+
+# Statements that have run DB_PREPARE_THRESHOLD times on a connection are
+# prepared server-side, so Postgres skips parsing and planning them from then
+# on; each connection keeps the DB_PREPARED_MAX most recently used. Turn
+# DB_PREPARED_STATEMENTS off behind a transaction-pooling PgBouncer, which may
+# send an EXECUTE to a server connection that never saw the PREPARE.
+connect_args = {
+    "prepare_threshold": settings.DB_PREPARE_THRESHOLD if settings.DB_PREPARED_STATEMENTS else None,
+}
+engine = create_engine(connection_url, connect_args=connect_args, **pool_options)
+
+# With DB_ASYNC on, handlers talk to Postgres through psycopg's async driver on
+# the event loop; otherwise every statement runs on the sync engine in the
+# threadpool, which caps in-flight requests at the threadpool size.
+async_engine = (
+    create_async_engine(connection_url, connect_args=connect_args, **pool_options) if settings.DB_ASYNC else None
+)
+
+
+def _set_prepared_max(dbapi_connection, connection_record) -> None:
+    connection_record.driver_connection.prepared_max = settings.DB_PREPARED_MAX
+
+
+# Optional streaming replicas for read-only handlers, each with the same pool
+# settings as the primary. See begin_read().
+replica_uris = [uri.strip() for uri in settings.REPLICA_URIS.split(",") if uri.strip()]
+replica_engines = [create_engine(uri, connect_args=connect_args, **pool_options) for uri in replica_uris]
+async_replica_engines = [
+    create_async_engine(uri, connect_args=connect_args, **pool_options) for uri in replica_uris
+] if settings.DB_ASYNC else []
+
+for async_wrapper in [async_engine, *async_replica_engines]:
+    if async_wrapper is not None:
+        event.listen(async_wrapper.sync_engine, "connect", _set_prepared_max)
+for sync_engine in [engine, *replica_engines]:
+    event.listen(sync_engine, "connect", _set_prepared_max)
+
+logger = logging.getLogger(__name__)
+
+
+class CheckoutStats:
+    """How long begin() waited to get a connection from the pool.
+
+    With DB_ASYNC=false checkouts happen on threadpool threads, so every
+    update takes the lock; a lost decrement of waiting would shed load for good.
+    """
+
+    def __init__(self):
+        # Callers currently waiting for a connection, used for admission control
+        self.waiting = 0
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self._lock = Lock()
+
+    def start_wait(self) -> None:
+        with self._lock:
+            self.waiting += 1
+
+    def end_wait(self, wait_seconds: Optional[float], timed_out: bool = False) -> None:
+        """Ends a wait; wait_seconds is None if the checkout failed."""
+        with self._lock:
+            self.waiting -= 1
+            if timed_out:
+                self.timeouts += 1
+            if wait_seconds is not None:
+                self.checkouts += 1
+                self.wait_seconds_total += wait_seconds
+                self.wait_seconds_max = max(self.wait_seconds_max, wait_seconds)
+
+    def snapshot(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "waiting": self.waiting,
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "wait_seconds_total": self.wait_seconds_total,
+                "wait_seconds_avg": self.wait_seconds_total / self.checkouts if self.checkouts else 0.0,
+                "wait_seconds_max": self.wait_seconds_max,
+            }
+
+
+checkout_stats = CheckoutStats()
+
+
+def pool_status(pool) -> dict[str, Any]:
+    return {
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "idle": pool.checkedin(),
+        # Negative while the pool has not yet opened pool_size connections
+        "overflow": pool.overflow(),
+    }
+
+
+def pool_stats() -> dict[str, Any]:
+    """Occupancy of this worker's pools and the time spent waiting on them."""
+    pools = {"sync": pool_status(engine.pool)}
+    if async_engine is not None:
+        pools["async"] = pool_status(async_engine.sync_engine.pool)
+    for index, replica in enumerate(replica_engines):
+        pools[f"replica_{index}_sync"] = pool_status(replica.pool)
+    for index, replica in enumerate(async_replica_engines):
+        pools[f"replica_{index}_async"] = pool_status(replica.sync_engine.pool)
+    return {
+        "settings": {
+            "pool_size": settings.DB_POOL_SIZE,
+            "max_overflow": settings.DB_MAX_OVERFLOW,
+            "timeout_seconds": settings.DB_POOL_TIMEOUT_SECONDS,
+            "recycle_seconds": settings.DB_POOL_RECYCLE_SECONDS,
+            "pre_ping": settings.DB_POOL_PRE_PING,
+            "max_connections_per_engine": settings.DB_POOL_SIZE + settings.DB_MAX_OVERFLOW,
+            "prepare_threshold": connect_args["prepare_threshold"],
+            "prepared_max": settings.DB_PREPARED_MAX,
+        },
+        "pools": pools,
+        "checkout": checkout_stats.snapshot(),
+    }
+
+
+class ThreadedConnection:
+    """Gives a sync Connection the awaitable execute() of an AsyncConnection."""
+
+    def __init__(self, sync_connection):
+        self.sync_connection = sync_connection
+
+    async def execute(self, statement, parameters=None):
+        return await run_in_threadpool(self._execute, statement, parameters)
+
+    def _execute(self, statement, parameters):
+        result = self.sync_connection.execute(statement, parameters)
+        # Fetch rows in the worker thread too, like AsyncConnection buffers them
+        return result.freeze()() if result.returns_rows else result
+
+    async def stream_partitions(self, statement, parameters, batch_size: int) -> AsyncIterator[list]:
+        result = await run_in_threadpool(
+            self.sync_connection.execute, statement.execution_options(yield_per=batch_size), parameters
+        )
+        try:
+            while rows := await run_in_threadpool(result.fetchmany, batch_size):
+                yield rows
+        finally:
+            await run_in_threadpool(result.close)
+
+
+async def stream_partitions(connection, statement, parameters=None, batch_size: int = 1000) -> AsyncIterator[list]:
+    """Yields a query's rows in batches read from a server-side cursor.
+
+    Only one batch is held in memory at a time; the cursor lives as long as
+    the surrounding transaction.
+    """
+    if isinstance(connection, ThreadedConnection):
+        async for rows in connection.stream_partitions(statement, parameters, batch_size):
+            yield rows
+        return
+    result = await connection.stream(statement.execution_options(yield_per=batch_size), parameters)
+    try:
+        async for rows in result.partitions():
+            yield rows
+    finally:
+        await result.close()
+
+
+@contextmanager
+def _timed_checkout() -> Iterator[None]:
+    started = time.perf_counter()
+    checkout_stats.start_wait()
+    try:
+        yield
+    except exc.TimeoutError:
+        checkout_stats.end_wait(None, timed_out=True)
+        raise
+    except BaseException:
+        checkout_stats.end_wait(None)
+        raise
+    checkout_stats.end_wait(time.perf_counter() - started)
+
+
+def _begin_sync(sync_engine, isolation_level: Optional[str]):
+    with _timed_checkout():
+        connection = sync_engine.connect()
+    if isolation_level is not None:
+        connection.execution_options(isolation_level=isolation_level)
+    connection.begin()
+    return connection
+
+
+def _current_lsn_sync(connection) -> Optional[int]:
+    return replication.parse_lsn(connection.execute(statements.CURRENT_WAL_LSN).scalar())
+
+
+async def _current_lsn(connection) -> Optional[int]:
+    return replication.parse_lsn((await connection.execute(statements.CURRENT_WAL_LSN)).scalar())
+
+
+async def _wal_lsn(sync_engine, asyncio_engine, statement) -> Optional[int]:
+    # In a transaction of its own: a snapshot is taken by the first statement
+    # and could include WAL written while that statement ran, so reading the
+    # position inside the transaction being read from would overstate it
+    async with _begin_on(sync_engine, asyncio_engine, None) as connection:
+        return replication.parse_lsn((await connection.execute(statement)).scalar())
+
+
+@asynccontextmanager
+async def _begin_on(sync_engine, asyncio_engine, isolation_level: Optional[str], track_commit: bool = False) -> AsyncIterator:
+    if asyncio_engine is not None:
+        with _timed_checkout():
+            connection = await asyncio_engine.connect()
+        async with connection:
+            if isolation_level is not None:
+                await connection.execution_options(isolation_level=isolation_level)
+            async with connection.begin():
+                yield connection
+            if track_commit:
+                replication.record_commit(await _current_lsn(connection))
+        return
+
+    connection = await run_in_threadpool(_begin_sync, sync_engine, isolation_level)
+    try:
+        yield ThreadedConnection(connection)
+    except BaseException:
+        await run_in_threadpool(connection.rollback)
+        raise
+    else:
+        await run_in_threadpool(connection.commit)
+        if track_commit:
+            replication.record_commit(await run_in_threadpool(_current_lsn_sync, connection))
+    finally:
+        await run_in_threadpool(connection.close)
+
+
+@asynccontextmanager
+async def begin(isolation_level: Optional[str] = None) -> AsyncIterator:
+    """Opens a transaction on the primary that commits on exit and rolls back on error.
+
+    Handlers use this instead of touching an engine so the same code runs on
+    either the async engine or the sync fallback. With replicas configured,
+    the commit's WAL position is recorded for the X-Commit-LSN header.
+    """
+    async with _begin_on(engine, async_engine, isolation_level, track_commit=bool(replica_uris)) as connection:
+        yield connection
+
+
+_replicas = itertools.cycle(range(len(replica_uris)))
+
+# Replicas are polled this often while a read waits for them to catch up
+REPLICA_POLL_SECONDS = 0.01
+
+
+@asynccontextmanager
+async def begin_read(isolation_level: Optional[str] = None, min_lsn: Optional[int] = None) -> AsyncIterator:
+    """Opens a transaction for a read-only handler, on a replica if any are configured.
+
+    The replica must have replayed min_lsn (by default the client's
+    X-Min-LSN); reads wait up to REPLICA_WAIT_SECONDS for it and otherwise
+    run on the primary, as they do when a replica is unreachable.
+    """
+    if not replica_uris:
+        async with begin(isolation_level) as connection:
+            yield connection
+        return
+
+    if min_lsn is None:
+        lsns = replication.current.get()
+        min_lsn = lsns.min_lsn if lsns is not None else None
+    async with AsyncExitStack() as transaction:
+        connection = await _replica_transaction(transaction, isolation_level, min_lsn)
+        if connection is None:
+            replication.stats.primary_reads += 1
+            read_at = await _wal_lsn(engine, async_engine, statements.CURRENT_WAL_LSN)
+            connection = await transaction.enter_async_context(_begin_on(engine, async_engine, isolation_level))
+            replication.record_read(read_at)
+        yield connection
+
+
+async def _replica_transaction(transaction: AsyncExitStack, isolation_level: Optional[str], min_lsn: Optional[int]):
+    """Enters a transaction on a replica that has replayed min_lsn onto transaction, or returns None."""
+    index = next(_replicas)
+    sync_engine = replica_engines[index]
+    asyncio_engine = async_replica_engines[index] if async_replica_engines else None
+    deadline = time.monotonic() + settings.REPLICA_WAIT_SECONDS
+    waited = False
+    try:
+        while True:
+            replayed = await _wal_lsn(sync_engine, asyncio_engine, statements.REPLAY_WAL_LSN)
+            if replayed is None:
+                logger.warning("Replica %d is not in recovery; reading from the primary", index)
+                replication.stats.error_fallbacks += 1
+                return None
+            if min_lsn is None or replayed >= min_lsn:
+                break
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                replication.stats.lag_fallbacks += 1
+                return None
+            if not waited:
+                waited = True
+                replication.stats.waits += 1
+            await asyncio.sleep(min(REPLICA_POLL_SECONDS, remaining))
 
-connection_url = config.get_settings().POSTGRES_URI
-engine = create_engine(connection_url, pool_pre_ping=True)
+        connection = await transaction.enter_async_context(_begin_on(sync_engine, asyncio_engine, isolation_level))
+    except (exc.DBAPIError, exc.TimeoutError):
+        logger.warning("Replica %d is unavailable; reading from the primary", index, exc_info=True)
+        replication.stats.error_fallbacks += 1
+        return None
+    # The transaction's snapshot is taken after replayed, so it sees at least that much
+    replication.record_read(replayed)
+    replication.stats.replica_reads += 1
+    return connection
@@ -0,0 +1,27 @@
+from fastapi import Request, Response, status
+
+
+# The JSON and NDJSON representations of a resource share its URL, so the
+# NDJSON one gets its own ETag and both vary on Accept
+def make_etag(*parts, ndjson: bool = False) -> str:
+    if ndjson:
+        parts = (*parts, "ndjson")
+    return '"' + "-".join(str(part) for part in parts) + '"'
+
+def headers(etag: str) -> dict:
+    return {"ETag": etag, "Vary": "Accept"}
+
+# True if the If-None-Match header lists the given ETag (or "*"). If-None-Match
+# uses weak comparison, so a W/ prefix, which proxies often add, is ignored.
+def matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = [opaque(candidate.strip()) for candidate in header.split(",")]
+    return "*" in candidates or opaque(etag) in candidates
+
+def opaque(etag: str) -> str:
+    return etag[2:] if etag.startswith("W/") else etag
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers(etag))
@@ -0,0 +1,137 @@
+from bisect import bisect_left
+from collections import defaultdict
+from contextvars import ContextVar
+from typing import Optional
+import time
+
+from starlette.routing import Match
+
+# Upper bounds of the latency histogram buckets, in seconds
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# ASGI scope of the request being handled, for code that labels work by route
+current_scope: ContextVar[Optional[dict]] = ContextVar("current_scope", default=None)
+
+
+def route_template(scope: Optional[dict]) -> str:
+    """Path template of the route a request matched, e.g. /players/{player_id}/inventory."""
+    if scope is None:
+        return "background"
+    route = scope.get("route") or matched_route(scope)
+    # Unmatched paths share one label instead of one series per URL
+    return route.path if route is not None else "unmatched"
+
+# FastAPI only records APIRoute matches in the scope, so plain Starlette
+# routes such as /openapi.json and /docs are matched again here
+def matched_route(scope: dict):
+    router = getattr(scope.get("app"), "router", None)
+    for route in getattr(router, "routes", []):
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route
+    return None
+
+
+def current_route() -> str:
+    return route_template(current_scope.get())
+
+
+class RequestMetrics:
+    """Per-route request counters and latency histograms for this process.
+
+    Recording is a couple of dict lookups and a bisect, so it can stay on for
+    every request; rendering to the Prometheus text format only happens when
+    /metrics is scraped. With several uvicorn workers each one reports its own
+    numbers, so scrape them individually or aggregate in Prometheus.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.in_progress = 0
+        # (method, route, status) -> count
+        self.requests: dict = defaultdict(int)
+        # (method, route) -> [bucket counts..., +Inf count], sum of seconds
+        self.latency_counts: dict = {}
+        self.latency_sums: dict = defaultdict(float)
+
+    def observe(self, method: str, route: str, status: int, seconds: float) -> None:
+        self.requests[(method, route, status)] += 1
+        key = (method, route)
+        counts = self.latency_counts.get(key)
+        if counts is None:
+            counts = self.latency_counts[key] = [0] * (len(self.buckets) + 1)
+        counts[bisect_left(self.buckets, seconds)] += 1
+        self.latency_sums[key] += seconds
+
+    def render(self) -> str:
+        lines = [
+            "# HELP http_requests_in_progress Requests currently being handled.",
+            "# TYPE http_requests_in_progress gauge",
+            f"http_requests_in_progress {self.in_progress}",
+            "# HELP http_requests_total Requests handled, by route template and status code.",
+            "# TYPE http_requests_total counter",
+        ]
+        for (method, route, status), count in list(self.requests.items()):
+            lines.append(
+                f'http_requests_total{{method="{method}",route="{_escape(route)}",status="{status}"}} {count}'
+            )
+        lines += [
+            "# HELP http_request_duration_seconds Request latency, by route template.",
+            "# TYPE http_request_duration_seconds histogram",
+        ]
+        for (method, route), counts in list(self.latency_counts.items()):
+            labels = f'method="{method}",route="{_escape(route)}"'
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                lines.append(f'http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            cumulative += counts[-1]
+            lines.append(f'http_request_duration_seconds_bucket{{{labels},le="+Inf"}} {cumulative}')
+            lines.append(f"http_request_duration_seconds_sum{{{labels}}} {self.latency_sums[(method, route)]}")
+            lines.append(f"http_request_duration_seconds_count{{{labels}}} {cumulative}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware that records every HTTP request.
+
+    Requests are labelled with the matched route's path template, e.g.
+    /players/{player_id}/inventory, so the number of series stays bounded no
+    matter how many IDs are requested.
+    """
+
+    def __init__(self, app, metrics: RequestMetrics):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        current_scope.set(scope)
+        self.metrics.in_progress += 1
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.metrics.in_progress -= 1
+            self.metrics.observe(scope["method"], route_template(scope), status, elapsed)
+
+
+request_metrics = RequestMetrics()
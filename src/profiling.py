@@ -0,0 +1,145 @@
+from threading import Lock
+from typing import Any
+import logging
+import random
+import re
+import time
+
+from sqlalchemy import event
+
+from src import config
+from src import metrics
+
+logger = logging.getLogger(__name__)
+
+# Only queries that read nothing but rows are safe to re-run under EXPLAIN
+# ANALYZE. Comments and whitespace may come before the keyword. Anything that
+# writes, locks rows, notifies or advances a sequence anywhere in the text,
+# comments and literals included, rules the statement out.
+QUERY_PATTERN = re.compile(r"^(?:\s+|--[^\n]*(?:\n|$)|/\*.*?\*/)*(SELECT|WITH)\b", re.IGNORECASE | re.DOTALL)
+WRITE_PATTERN = re.compile(
+    r"\b(INSERT|UPDATE|DELETE|MERGE|INTO|SHARE|pg_notify|nextval|setval|set_config|pg_advisory_\w+)\b",
+    re.IGNORECASE,
+)
+
+# Distinct (route, statement) pairs tracked before new ones are only counted as dropped
+MAX_STATEMENTS = 5000
+
+
+def normalize(statement: str) -> str:
+    """Collapses whitespace so the same SQL text aggregates as one statement.
+
+    Values are already bound parameters, so the text itself is the shape.
+    """
+    return " ".join(statement.split())
+
+
+class StatementStats:
+    """Count, total/max time and rows per statement per route, for this process."""
+
+    def __init__(self):
+        # (route, statement) -> [count, total_seconds, max_seconds, rows]
+        self._statements: dict = {}
+        self._lock = Lock()
+        self.dropped = 0
+
+    def record(self, route: str, statement: str, seconds: float, rows: int) -> None:
+        key = (route, statement)
+        with self._lock:
+            entry = self._statements.get(key)
+            if entry is None:
+                if len(self._statements) >= MAX_STATEMENTS:
+                    self.dropped += 1
+                    return
+                entry = self._statements[key] = [0, 0.0, 0.0, 0]
+            entry[0] += 1
+            entry[1] += seconds
+            entry[2] = max(entry[2], seconds)
+            entry[3] += max(rows, 0)
+
+    def top(self, limit: int, order_by: str) -> list[dict[str, Any]]:
+        with self._lock:
+            entries = [
+                {
+                    "route": route,
+                    "statement": statement,
+                    "count": count,
+                    "total_ms": total * 1000,
+                    "mean_ms": total / count * 1000,
+                    "max_ms": longest * 1000,
+                    "rows": rows,
+                }
+                for (route, statement), (count, total, longest, rows) in self._statements.items()
+            ]
+        entries.sort(key=lambda entry: entry[order_by], reverse=True)
+        return entries[:limit]
+
+    def reset(self) -> None:
+        with self._lock:
+            self._statements.clear()
+            self.dropped = 0
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("statement_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["statement_started"].pop()
+    if conn.info.get("explaining"):
+        return
+    route = metrics.current_route()
+    stats.record(route, normalize(statement), elapsed, cursor.rowcount)
+
+    if elapsed * 1000 < settings.SLOW_QUERY_MS:
+        return
+    plan = None
+    if random.random() < settings.SLOW_QUERY_EXPLAIN_RATE and read_only(statement):
+        plan = explain(conn, statement, parameters)
+    logger.warning(
+        "Slow query on %s took %.1fms: %s params=%r%s",
+        route, elapsed * 1000, normalize(statement), parameters,
+        f"\n{plan}" if plan else "",
+    )
+
+
+def read_only(statement: str) -> bool:
+    return QUERY_PATTERN.match(statement) is not None and WRITE_PATTERN.search(statement) is None
+
+
+def explain(conn, statement: str, parameters) -> str | None:
+    """Re-runs a read-only statement under EXPLAIN in the same transaction."""
+    conn.info["explaining"] = True
+    # A savepoint keeps a failed EXPLAIN from aborting the request's transaction
+    conn.exec_driver_sql("SAVEPOINT explain_slow_query")
+    try:
+        rows = conn.exec_driver_sql(f"EXPLAIN (ANALYZE, BUFFERS) {statement}", parameters).fetchall()
+        conn.exec_driver_sql("RELEASE SAVEPOINT explain_slow_query")
+        return "\n".join(row[0] for row in rows)
+    except Exception:
+        conn.exec_driver_sql("ROLLBACK TO SAVEPOINT explain_slow_query")
+        logger.exception("Could not capture a plan for a slow query")
+        return None
+    finally:
+        conn.info["explaining"] = False
+
+
+def _handle_error(context):
+    # A failed statement never reaches after_cursor_execute
+    if context.connection is not None:
+        started = context.connection.info.get("statement_started")
+        if started:
+            started.pop()
+
+
+def install(*engines) -> None:
+    """Times every statement on the given engines (sync Engine objects)."""
+    for engine in engines:
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(engine, "handle_error", _handle_error)
+
+
+settings = config.get_settings()
+
+stats = StatementStats()
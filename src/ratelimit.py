@@ -0,0 +1,77 @@
+from dataclasses import dataclass
+from typing import Optional
+import time
+
+from src import config
+
+
+class TokenBucket:
+    """Allows `rate` requests per second on average, with bursts up to `burst`.
+
+    A rate of 0 allows everything. Only touched from the event loop, so it
+    needs no lock.
+    """
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def take(self) -> float:
+        """Spends one token; returns 0 if it was available, else seconds until it will be."""
+        if self.rate <= 0:
+            return 0.0
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+@dataclass
+class ApiClient:
+    name: str
+    bucket: TokenBucket
+    allowed: int = 0
+    rate_limited: int = 0
+    shed: int = 0
+
+    def stats(self) -> dict:
+        return {
+            "rate_per_second": self.bucket.rate,
+            "burst": self.bucket.burst,
+            "tokens": self.bucket.tokens,
+            "allowed": self.allowed,
+            "rate_limited": self.rate_limited,
+            "shed": self.shed,
+        }
+
+
+def parse_api_keys(settings) -> dict[str, ApiClient]:
+    """Maps each configured key to its client; the key itself is never logged."""
+    clients = {}
+    if settings.API_KEY:
+        clients[settings.API_KEY] = ApiClient(
+            "default", TokenBucket(settings.RATE_LIMIT_PER_SECOND, settings.RATE_LIMIT_BURST)
+        )
+    for entry in filter(None, (entry.strip() for entry in settings.API_KEYS.split(","))):
+        name, key, *limits = entry.split(":")
+        if limits:
+            rate = float(limits[0])
+            burst = float(limits[1]) if len(limits) > 1 else 2 * rate
+        else:
+            rate, burst = settings.RATE_LIMIT_PER_SECOND, settings.RATE_LIMIT_BURST
+        clients[key] = ApiClient(name, TokenBucket(rate, burst))
+    return clients
+
+
+def lookup(api_key: Optional[str]) -> Optional[ApiClient]:
+    return clients.get(api_key) if api_key is not None else None
+
+
+settings = config.get_settings()
+
+clients = parse_api_keys(settings)
@@ -0,0 +1,149 @@
+from collections import OrderedDict
+from contextvars import ContextVar
+from threading import Lock
+from typing import Any, Iterable, Optional
+import re
+
+from src import config
+
+# Read-your-writes across replicas. Every response to a request that committed
+# on the primary carries the commit's WAL position (LSN) in X-Commit-LSN.
+# Clients echo the latest one they saw in X-Min-LSN, and reads routed to a
+# replica wait until it has replayed that far, or go to the primary instead.
+# Within one worker, reads of an inventory this worker just changed wait for
+# that change too, so the inventory cache is never refilled from a replica
+# that is still behind it.
+
+COMMIT_LSN_HEADER = "X-Commit-LSN"
+MIN_LSN_HEADER = "X-Min-LSN"
+
+LSN_PATTERN = re.compile(r"^([0-9A-Fa-f]{1,8})/([0-9A-Fa-f]{1,8})$")
+
+
+def parse_lsn(text: Optional[str]) -> Optional[int]:
+    """Postgres' 'XXXXXXXX/XXXXXXXX' notation as an integer, or None if malformed."""
+    match = LSN_PATTERN.match(text or "")
+    if match is None:
+        return None
+    return (int(match.group(1), 16) << 32) | int(match.group(2), 16)
+
+def format_lsn(lsn: int) -> str:
+    return f"{lsn >> 32:X}/{lsn & 0xFFFFFFFF:X}"
+
+
+class RequestLsns:
+    """WAL positions one request depends on and produced."""
+
+    def __init__(self, min_lsn: Optional[int] = None):
+        # Reads must see at least this position, from the client's X-Min-LSN
+        self.min_lsn = min_lsn
+        # Latest commit this request made on the primary
+        self.commit_lsn: Optional[int] = None
+        # Position the latest begin_read() snapshot was taken at
+        self.read_lsn: Optional[int] = None
+
+
+current: ContextVar[Optional[RequestLsns]] = ContextVar("replication_lsns", default=None)
+
+
+def record_commit(lsn: Optional[int]) -> None:
+    lsns = current.get()
+    if lsns is not None and lsn is not None:
+        lsns.commit_lsn = max(lsns.commit_lsn or 0, lsn)
+
+def record_read(lsn: Optional[int]) -> None:
+    lsns = current.get()
+    if lsns is not None:
+        lsns.read_lsn = lsn
+
+def read_lsn() -> Optional[int]:
+    lsns = current.get()
+    return lsns.read_lsn if lsns is not None else None
+
+
+class RecentWrites:
+    """Commit LSN of this worker's latest write per key, bounded like a cache."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._lsns: OrderedDict[Any, int] = OrderedDict()
+        self._lock = Lock()
+
+    def record(self, keys: Iterable[Any]) -> None:
+        lsns = current.get()
+        if lsns is None or lsns.commit_lsn is None:
+            return
+        with self._lock:
+            for key in keys:
+                self._lsns[key] = lsns.commit_lsn
+                self._lsns.move_to_end(key)
+            while len(self._lsns) > self.max_entries:
+                self._lsns.popitem(last=False)
+
+    def min_lsn(self, key: Any) -> Optional[int]:
+        """The position a read of key has to see: the client's, or this worker's last write to it."""
+        lsns = current.get()
+        client = lsns.min_lsn if lsns is not None else None
+        with self._lock:
+            written = self._lsns.get(key)
+        known = [lsn for lsn in (client, written) if lsn is not None]
+        return max(known) if known else None
+
+
+# True if a copy read at read_at may predate min_lsn. Copies read without
+# replicas configured carry no LSN and are always fresh enough.
+def is_stale(read_at: Optional[int], min_lsn: Optional[int]) -> bool:
+    return min_lsn is not None and read_at is not None and read_at < min_lsn
+
+
+class ReplicationMiddleware:
+    """Reads X-Min-LSN into the request's context and adds X-Commit-LSN to the response."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        incoming = dict(scope["headers"]).get(MIN_LSN_HEADER.lower().encode())
+        lsns = RequestLsns(parse_lsn(incoming.decode("latin-1")) if incoming else None)
+        current.set(lsns)
+
+        async def send_with_commit_lsn(message):
+            if message["type"] == "http.response.start" and lsns.commit_lsn is not None:
+                message["headers"] = list(message.get("headers", [])) + [
+                    (COMMIT_LSN_HEADER.lower().encode(), format_lsn(lsns.commit_lsn).encode())
+                ]
+            await send(message)
+
+        await self.app(scope, receive, send_with_commit_lsn)
+
+
+class ReplicaStats:
+    """Where reads went and how often a replica was too far behind."""
+
+    def __init__(self):
+        self.replica_reads = 0
+        self.primary_reads = 0
+        self.waits = 0
+        self.lag_fallbacks = 0
+        self.error_fallbacks = 0
+
+    def snapshot(self) -> dict[str, Any]:
+        return {
+            "replica_reads": self.replica_reads,
+            "primary_reads": self.primary_reads,
+            "waits": self.waits,
+            "lag_fallbacks": self.lag_fallbacks,
+            "error_fallbacks": self.error_fallbacks,
+        }
+
+
+settings = config.get_settings()
+
+stats = ReplicaStats()
+
+# Players whose inventory this worker changed, keyed by player_id
+inventory_writes = RecentWrites(max_entries=settings.INVENTORY_CACHE_SIZE)
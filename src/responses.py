@@ -0,0 +1,47 @@
+from typing import Any, Optional
+import json
+import logging
+
+from fastapi.responses import JSONResponse, ORJSONResponse
+
+from src import config
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+# JSON_RESPONSE_CLASS picks the encoder for every JSON response. orjson is a C
+# extension several times faster than the json module on row-shaped data;
+# "json" keeps the standard library encoder.
+RESPONSE_CLASSES = {"json": JSONResponse, "orjson": ORJSONResponse}
+
+
+def response_class() -> type[JSONResponse]:
+    name = settings.JSON_RESPONSE_CLASS
+    if name == "orjson" and orjson is None:
+        logger.warning("orjson is not installed; falling back to the json module")
+        return JSONResponse
+    return RESPONSE_CLASSES[name]
+
+
+settings = config.get_settings()
+
+JSON = response_class()
+
+
+# Hot read handlers build plain dicts from database rows and return them
+# through this, which skips FastAPI's response_model validation and
+# serialization. The rows come from our own schema, so validating them again
+# only costs time; response_model stays on the route for the OpenAPI docs.
+def json_response(content: Any, headers: Optional[dict] = None) -> JSONResponse:
+    return JSON(content, headers=headers)
+
+
+def dumps(content: Any) -> bytes:
+    """Encodes with the configured encoder, matching what json_response sends."""
+    if JSON is ORJSONResponse:
+        return orjson.dumps(content)
+    return json.dumps(content, separators=(",", ":")).encode()
@@ -0,0 +1,179 @@
+import asyncio
+import logging
+import uuid
+from contextlib import suppress
+from typing import Any, Optional
+
+from sqlalchemy import exc
+
+from src import cache
+from src import config
+from src import database as db
+from src import retry
+from src import statements
+
+logger = logging.getLogger(__name__)
+
+# Per kind of retirement: the statement removing one chunk of dependent rows,
+# and the one deleting the retired row once none are left
+CHUNKS = {
+    "item": statements.RETIRE_ITEM_CHUNK,
+    "enchantment": statements.RETIRE_ENCHANTMENT_CHUNK,
+}
+FINISHES = {
+    "item": statements.FINISH_ITEM_RETIREMENT,
+    "enchantment": statements.FINISH_ENCHANTMENT_RETIREMENT,
+}
+
+# While requests are waiting for a pooled connection, check again this often
+BUSY_POLL_SECONDS = 0.5
+
+
+class LostClaim(Exception):
+    """Another worker took the retirement over after this one's lease ran out."""
+
+
+class Retirer:
+    """Removes the rows that reference retired items and enchantments.
+
+    DELETE /items/{id} and DELETE /enchantments/{id} only mark the row
+    retired, which hides it from every read, and queue a retirement. Each
+    worker runs one retirement at a time, a chunk of players per short
+    transaction, pausing between chunks and while live requests are waiting
+    for a pooled connection. Retirements live in the database, so one left
+    behind by a stopped worker is picked up by another once its lease expires.
+    """
+
+    def __init__(self):
+        self.worker = uuid.uuid4().hex
+        self.current: Optional[int] = None
+        self.chunks = 0
+        self.rows_removed = 0
+        self.busy_pauses = 0
+        self.errors = 0
+        self._wake: Optional[asyncio.Event] = None
+
+    def wake(self) -> None:
+        """Starts on newly queued work now instead of at the next poll."""
+        if self._wake is not None:
+            self._wake.set()
+
+    async def run(self) -> None:
+        """Claims and runs retirements until cancelled."""
+        # Created here so it belongs to the running event loop
+        self._wake = asyncio.Event()
+        while True:
+            self._wake.clear()
+            try:
+                job = await self._claim()
+                if job is not None:
+                    await self._retire(job)
+                    continue
+            except asyncio.CancelledError:
+                raise
+            except LostClaim:
+                logger.warning("Retirement %d was claimed by another worker", self.current)
+            except Exception as error:
+                self.errors += 1
+                logger.exception("Retirement %s failed; it will be retried", self.current)
+                await self._record_error(error)
+            finally:
+                self.current = None
+            with suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self._wake.wait(), settings.RETIREMENT_POLL_SECONDS)
+
+    async def _claim(self):
+        async with db.begin() as connection:
+            job = (await connection.execute(
+                statements.CLAIM_RETIREMENT,
+                {"worker": self.worker, "lease_seconds": settings.RETIREMENT_LEASE_SECONDS}
+            )).first()
+        if job is not None:
+            self.current = job.retirement_id
+        return job
+
+    async def _retire(self, job) -> None:
+        params = {"retirement_id": job.retirement_id, "target_id": job.target_id, "worker": self.worker}
+        while True:
+            await self._throttle()
+
+            async def remove_chunk(connection):
+                player_ids = (await connection.execute(
+                    CHUNKS[job.kind],
+                    {"target_id": job.target_id, "chunk_size": settings.RETIREMENT_CHUNK_SIZE}
+                )).scalars().all()
+                renewed = (await connection.execute(
+                    statements.RECORD_RETIREMENT_PROGRESS,
+                    {**params, "removed": len(player_ids), "lease_seconds": settings.RETIREMENT_LEASE_SECONDS}
+                )).first()
+                if renewed is None:
+                    raise LostClaim()
+                return player_ids
+
+            player_ids = await retry.run_transaction(f"retire_{job.kind}_chunk", remove_chunk)
+            self.chunks += 1
+            self.rows_removed += len(player_ids)
+            cache.inventory_cache.invalidate_many(player_ids)
+            if player_ids:
+                continue
+
+            try:
+                async with db.begin() as connection:
+                    finished = (await connection.execute(FINISHES[job.kind], params)).first()
+            except exc.IntegrityError:
+                # A write that started before the retirement added a reference
+                # after the last chunk; remove it too
+                continue
+            if finished is not None:
+                logger.info("Retired %s %d", job.kind, job.target_id)
+                return
+
+    async def _throttle(self) -> None:
+        await asyncio.sleep(settings.RETIREMENT_PAUSE_SECONDS)
+        # Live requests come first
+        while db.checkout_stats.waiting > 0:
+            self.busy_pauses += 1
+            await asyncio.sleep(BUSY_POLL_SECONDS)
+
+    async def _record_error(self, error: Exception) -> None:
+        if self.current is None:
+            return
+        with suppress(Exception):
+            async with db.begin() as connection:
+                await connection.execute(
+                    statements.RECORD_RETIREMENT_ERROR,
+                    {"retirement_id": self.current, "worker": self.worker, "error": repr(error)[:500]}
+                )
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "current": self.current,
+            "chunks": self.chunks,
+            "rows_removed": self.rows_removed,
+            "busy_pauses": self.busy_pauses,
+            "errors": self.errors,
+        }
+
+
+# A retirement row as the admin endpoints return it
+def retirement_json(row) -> dict:
+    result = {
+        "retirement_id": row.retirement_id,
+        "kind": row.kind,
+        "target_id": row.target_id,
+        "name": row.name,
+        "status": row.status,
+        "rows_removed": row.rows_removed,
+        "created_at": row.created_at,
+        "finished_at": row.finished_at,
+        "claimed_until": row.claimed_until,
+        "last_error": row.last_error,
+    }
+    if "rows_remaining" in row._fields:
+        result["rows_remaining"] = row.rows_remaining
+    return result
+
+
+settings = config.get_settings()
+
+retirer = Retirer()
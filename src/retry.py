@@ -0,0 +1,85 @@
+import asyncio
+import logging
+import random
+from collections import defaultdict
+from typing import Any, Awaitable, Callable, Optional, TypeVar
+
+from fastapi import HTTPException, status
+from sqlalchemy.exc import DBAPIError
+
+from src import config
+from src import database as db
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# SQLSTATEs after which re-running the whole transaction can succeed
+RETRYABLE_SQLSTATES = {
+    "40001": "serialization_failure",
+    "40P01": "deadlock_detected",
+}
+
+
+class TransactionStats:
+    """Per-route counters of transactions, retries and give-ups."""
+
+    def __init__(self):
+        self._routes: dict = defaultdict(lambda: defaultdict(int))
+
+    def record(self, route: str, event: str) -> None:
+        self._routes[route][event] += 1
+
+    def snapshot(self) -> dict[str, Any]:
+        return {route: dict(counters) for route, counters in self._routes.items()}
+
+
+def retryable_sqlstate(error: DBAPIError) -> Optional[str]:
+    sqlstate = getattr(error.orig, "sqlstate", None)
+    return sqlstate if sqlstate in RETRYABLE_SQLSTATES else None
+
+
+async def run_transaction(
+    route: str,
+    work: Callable[[Any], Awaitable[T]],
+    isolation_level: Optional[str] = None,
+) -> T:
+    """Runs work(connection) in a transaction, re-running it on contention.
+
+    Serialization failures and deadlocks roll the whole transaction back, so
+    work is called again from the start on a fresh transaction, after a
+    jittered exponential backoff. Once the retry budget is spent the client
+    gets a 503 instead of a 500. Anything else, including HTTPExceptions
+    raised by work, propagates unchanged.
+    """
+    retries = 0
+    while True:
+        try:
+            async with db.begin(isolation_level=isolation_level) as connection:
+                result = await work(connection)
+            stats.record(route, "committed")
+            return result
+        except DBAPIError as error:
+            sqlstate = retryable_sqlstate(error)
+            if sqlstate is None:
+                raise
+            reason = RETRYABLE_SQLSTATES[sqlstate]
+            if retries >= settings.TX_MAX_RETRIES:
+                stats.record(route, "gave_up")
+                logger.warning("%s gave up after %d retries (%s)", route, retries, reason)
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Too much contention on this resource, please retry",
+                    headers={"Retry-After": "1"},
+                ) from error
+            retries += 1
+            stats.record(route, "retries")
+            stats.record(route, reason)
+            # Full jitter keeps the conflicting transactions from retrying in lockstep
+            ceiling = min(settings.TX_RETRY_MAX_DELAY_SECONDS, settings.TX_RETRY_BASE_DELAY_SECONDS * 2 ** retries)
+            await asyncio.sleep(random.uniform(0, ceiling))
+
+
+settings = config.get_settings()
+
+stats = TransactionStats()
@@ -0,0 +1,576 @@
+from typing import Dict, Tuple
+
+import sqlalchemy
+
+# Every statement the API runs, compiled once at import. Handlers pass these
+# objects straight to execute(), so each one always sends byte-identical SQL.
+# SQLAlchemy then reuses its compiled form, and psycopg, once a statement has
+# run DB_PREPARE_THRESHOLD times on a connection, prepares it server-side so
+# Postgres stops parsing and planning it on every call.
+#
+# Statements with optional clauses are enumerated up front, one per
+# combination, rather than assembled per request.
+
+
+# Replication
+
+# Cast to text, since psycopg has no adapter for pg_lsn
+CURRENT_WAL_LSN = sqlalchemy.text("SELECT CAST(pg_current_wal_lsn() AS TEXT)")
+
+# NULL unless the server is a standby
+REPLAY_WAL_LSN = sqlalchemy.text("SELECT CAST(pg_last_wal_replay_lsn() AS TEXT)")
+
+
+# Catalog
+
+CATALOG_VERSION = sqlalchemy.text("SELECT version FROM catalog_version WHERE name = :name")
+
+BUMP_CATALOG_VERSION = sqlalchemy.text(
+    """
+    WITH bumped AS (
+        UPDATE catalog_version SET version = version + 1
+        WHERE name = :name
+        RETURNING version
+    )
+    SELECT pg_notify(:channel, CAST(:name AS TEXT) || ':' || version) FROM bumped
+    """
+)
+
+ITEM_NAME = sqlalchemy.text("SELECT name FROM item WHERE item_id = :item_id AND retired_at IS NULL")
+
+ENCHANTMENT_NAME = sqlalchemy.text(
+    "SELECT name FROM enchantment WHERE enchantment_id = :enchantment_id AND retired_at IS NULL"
+)
+
+
+# Players
+
+# player_inventory_item and item_enchantment are hash-partitioned by
+# player_id, so every statement below filters both on :player_id (or
+# :player_ids) directly. A parameter, unlike a value from a CTE, lets Postgres
+# prune to the player's partition when the statement starts, prepared or not.
+#
+# Every inventory write bumps the player's version and notifies :channel with
+# 'inventory:<player_id>', so other workers drop their cached copy on commit.
+#
+# Inventory reads hide retired items and enchantments before the background
+# retirement has removed their rows. Retiring changes every inventory at once
+# without bumping each player's version, so the version an inventory's ETag
+# is built from adds the latest retirement_id. Both only ever grow, so their
+# sum changes whenever either does.
+INVENTORY_VERSION_COLUMN = (
+    "p.inventory_version + COALESCE((SELECT max(retirement_id) FROM retirement), 0) AS inventory_version"
+)
+
+RETIRED_ENCHANTMENT_NAMES = (
+    "(SELECT COALESCE(array_agg(name), '{}') AS names FROM enchantment WHERE retired_at IS NOT NULL) retired"
+)
+
+# Rows carrying none of the retired names, nearly all of them, skip the unnest
+VISIBLE_ENCHANTMENTS_COLUMN = """
+    CASE WHEN pii.enchantments && retired.names
+    THEN ARRAY(
+        SELECT e.name FROM unnest(pii.enchantments) WITH ORDINALITY AS e(name, position)
+        WHERE e.name <> ALL(retired.names)
+        ORDER BY e.position
+    )
+    ELSE pii.enchantments END AS enchantments
+"""
+
+INVENTORY_VERSION = sqlalchemy.text(
+    f"SELECT {INVENTORY_VERSION_COLUMN} FROM player p WHERE p.player_id = :player_id"
+)
+
+BATCH_INVENTORY = sqlalchemy.text(
+    f"""
+    SELECT p.player_id,
+    {INVENTORY_VERSION_COLUMN},
+    pii.player_inventory_item_id,
+    i.item_id,
+    i.name,
+    i.item_type,
+    i.rarity,
+    pii.quantity,
+    {VISIBLE_ENCHANTMENTS_COLUMN}
+    FROM player p
+    CROSS JOIN {RETIRED_ENCHANTMENT_NAMES}
+    LEFT JOIN (
+        player_inventory_item pii
+        JOIN item i ON pii.item_id = i.item_id AND i.retired_at IS NULL
+    ) ON pii.player_id = p.player_id AND pii.player_id = ANY(:player_ids)
+    WHERE p.player_id = ANY(:player_ids)
+    ORDER BY p.player_id, pii.quantity DESC, i.name ASC, pii.player_inventory_item_id ASC
+    """
+)
+
+def inventory_page(keyset: bool, limited: bool) -> sqlalchemy.TextClause:
+    keyset_filter = """
+        AND (pii.quantity < :after_quantity
+             OR (pii.quantity = :after_quantity AND i.name > :after_name)
+             OR (pii.quantity = :after_quantity AND i.name = :after_name
+                 AND pii.player_inventory_item_id > :after_id))
+    """ if keyset else ""
+    page_clause = "LIMIT :limit" if limited else ""
+    return sqlalchemy.text(
+        f"""
+        SELECT pii.player_inventory_item_id,
+        i.item_id,
+        i.name,
+        i.item_type,
+        i.rarity,
+        pii.quantity,
+        {VISIBLE_ENCHANTMENTS_COLUMN}
+        FROM player_inventory_item pii
+        JOIN item i ON pii.item_id = i.item_id AND i.retired_at IS NULL
+        CROSS JOIN {RETIRED_ENCHANTMENT_NAMES}
+        WHERE pii.player_id = :player_id
+        {keyset_filter}
+        ORDER BY pii.quantity DESC, i.name ASC, pii.player_inventory_item_id ASC
+        {page_clause}
+        """
+    )
+
+# Keyed by (after a cursor, with a limit)
+INVENTORY_PAGES: Dict[Tuple[bool, bool], sqlalchemy.TextClause] = {
+    (keyset, limited): inventory_page(keyset, limited) for keyset in (False, True) for limited in (False, True)
+}
+
+REMOVE_ITEM_QUANTITY = sqlalchemy.text(
+    """
+    WITH p AS (
+        UPDATE player SET inventory_version = inventory_version + 1
+        WHERE player_id = :player_id
+        RETURNING player_id, pg_notify(:channel, 'inventory:' || player_id)
+    ),
+    i AS (
+        SELECT item_id FROM item
+        WHERE item_id = :item_id AND retired_at IS NULL
+    ),
+    updated AS (
+        UPDATE player_inventory_item
+        SET quantity = quantity - :quantity
+        WHERE player_id = :player_id AND EXISTS (SELECT 1 FROM p)
+        AND item_id = (SELECT item_id FROM i) AND quantity >= :quantity
+        RETURNING player_inventory_item_id, quantity
+    )
+    SELECT EXISTS (SELECT 1 FROM p) AS player_exists,
+    (SELECT player_inventory_item_id FROM updated) AS player_inventory_item_id,
+    (SELECT quantity FROM updated) AS remaining
+    """
+)
+
+# Run after REMOVE_ITEM_QUANTITY changed nothing. A new statement sees the
+# latest committed row, and the lock keeps it that way until commit, unlike
+# the earlier statement's snapshot.
+LOCK_INVENTORY_QUANTITY = sqlalchemy.text(
+    """
+    SELECT pii.quantity FROM player_inventory_item pii
+    JOIN item i ON i.item_id = pii.item_id AND i.retired_at IS NULL
+    WHERE pii.player_id = :player_id AND pii.item_id = :item_id
+    FOR UPDATE OF pii
+    """
+)
+
+DELETE_EMPTY_INVENTORY_ITEM = sqlalchemy.text(
+    """
+    WITH unenchanted AS (
+        DELETE FROM item_enchantment
+        WHERE player_id = :player_id AND player_inventory_item_id = :pii_id
+    )
+    DELETE FROM player_inventory_item
+    WHERE player_id = :player_id AND player_inventory_item_id = :pii_id AND quantity = 0
+    """
+)
+
+ADD_ITEMS = sqlalchemy.text(
+    """
+    WITH p AS (
+        UPDATE player SET inventory_version = inventory_version + 1
+        WHERE player_id = :player_id
+        RETURNING player_id, pg_notify(:channel, 'inventory:' || player_id)
+    ),
+    req AS (
+        SELECT item_id, quantity
+        FROM unnest(CAST(:item_ids AS INTEGER[]), CAST(:quantities AS INTEGER[])) AS r(item_id, quantity)
+    ),
+    unknown AS (
+        SELECT req.item_id
+        FROM req
+        LEFT JOIN item i ON i.item_id = req.item_id AND i.retired_at IS NULL
+        WHERE i.item_id IS NULL
+    ),
+    upserted AS (
+        INSERT INTO player_inventory_item (player_id, item_id, quantity)
+        SELECT p.player_id, req.item_id, req.quantity
+        FROM p, req
+        WHERE NOT EXISTS (SELECT 1 FROM unknown)
+        ORDER BY req.item_id
+        ON CONFLICT (player_id, item_id)
+        DO UPDATE SET quantity = player_inventory_item.quantity + EXCLUDED.quantity
+        RETURNING item_id, quantity
+    )
+    SELECT EXISTS (SELECT 1 FROM p) AS player_exists,
+    ARRAY(SELECT item_id FROM unknown ORDER BY item_id) AS unknown_item_ids,
+    (
+        SELECT json_agg(json_build_object(
+            'item_id', upserted.item_id,
+            'name', i.name,
+            'total_quantity', upserted.quantity,
+            'existed', upserted.quantity > req.quantity
+        ))
+        FROM upserted
+        JOIN req ON req.item_id = upserted.item_id
+        JOIN item i ON i.item_id = upserted.item_id
+    ) AS totals
+    """
+)
+
+ENCHANT_ITEM = sqlalchemy.text(
+    """
+    WITH p AS (
+        UPDATE player SET inventory_version = inventory_version + 1
+        WHERE player_id = :player_id
+        RETURNING player_id, pg_notify(:channel, 'inventory:' || player_id)
+    ),
+    inv AS (
+        SELECT pii.player_id, pii.player_inventory_item_id
+        FROM player_inventory_item pii
+        JOIN item i ON i.item_id = pii.item_id AND i.retired_at IS NULL
+        WHERE pii.player_id = :player_id AND pii.item_id = :item_id
+        ORDER BY pii.player_inventory_item_id
+        LIMIT 1
+    ),
+    e AS (
+        SELECT enchantment_id
+        FROM enchantment
+        WHERE enchantment_id = :enchantment_id AND retired_at IS NULL
+    ),
+    applied AS (
+        INSERT INTO item_enchantment (player_id, player_inventory_item_id, enchantment_id)
+        SELECT inv.player_id, inv.player_inventory_item_id, e.enchantment_id
+        FROM inv, e
+        ON CONFLICT DO NOTHING
+    )
+    SELECT EXISTS (SELECT 1 FROM p) AS player_exists,
+    EXISTS (SELECT 1 FROM inv) AS in_inventory,
+    EXISTS (SELECT 1 FROM e) AS enchantment_exists
+    """
+)
+
+PLAYER_BY_USERNAME = sqlalchemy.text(
+    """
+    SELECT username FROM player
+    WHERE username = :username
+    """
+)
+
+CREATE_PLAYER = sqlalchemy.text(
+    """
+    INSERT INTO player (username, created_at)
+    VALUES (:username, CURRENT_TIMESTAMP)
+    RETURNING player_id
+    """
+)
+
+REMOVE_ENCHANTMENTS = sqlalchemy.text(
+    """
+    WITH p AS (
+        UPDATE player SET inventory_version = inventory_version + 1
+        WHERE player_id = :player_id
+        RETURNING player_id, pg_notify(:channel, 'inventory:' || player_id)
+    ),
+    inv AS (
+        SELECT pii.player_inventory_item_id
+        FROM player_inventory_item pii
+        JOIN item i ON i.item_id = pii.item_id AND i.retired_at IS NULL
+        WHERE pii.player_id = :player_id AND pii.item_id = :item_id
+    ),
+    removed AS (
+        DELETE FROM item_enchantment
+        WHERE player_id = :player_id
+        AND player_inventory_item_id IN (SELECT player_inventory_item_id FROM inv)
+    )
+    SELECT EXISTS (SELECT 1 FROM p) AS player_exists,
+    EXISTS (SELECT 1 FROM inv) AS in_inventory
+    """
+)
+
+
+# Items
+
+def items_query(by_type: bool, by_rarity: bool) -> sqlalchemy.TextClause:
+    filters = ["retired_at IS NULL"]
+    if by_type:
+        filters.append("item_type = :item_type")
+    if by_rarity:
+        filters.append("rarity = :rarity")
+    where = "WHERE " + " AND ".join(filters)
+    return sqlalchemy.text(
+        f"""
+        SELECT item_id, name, item_type, rarity
+        FROM item
+        {where}
+        ORDER BY item_id
+        """
+    )
+
+# Keyed by (filtered by item_type, filtered by rarity)
+ITEMS: Dict[Tuple[bool, bool], sqlalchemy.TextClause] = {
+    (by_type, by_rarity): items_query(by_type, by_rarity) for by_type in (False, True) for by_rarity in (False, True)
+}
+
+ITEM_BY_ID = sqlalchemy.text(
+    """
+    SELECT item_id, name, item_type, rarity
+    FROM item
+    WHERE item_id = :item_id AND retired_at IS NULL
+    """
+)
+
+# Retired items are included: item names are unique, so one can't be
+# created again until its retirement has deleted the row
+FIND_ITEM = sqlalchemy.text(
+    """
+    SELECT name, item_type, rarity, retired_at IS NOT NULL AS retired FROM item
+    WHERE name = :name AND item_type = :item_type AND rarity = :rarity
+    """
+)
+
+CREATE_ITEM = sqlalchemy.text(
+    """
+    INSERT INTO item (name, item_type, rarity, created_at)
+    VALUES (:name, :item_type, :rarity, CURRENT_TIMESTAMP)
+    RETURNING item_id
+    """
+)
+
+# Enchantments
+
+ENCHANTMENTS = sqlalchemy.text(
+    """
+    SELECT enchantment_id, name, effect_description
+    FROM enchantment
+    WHERE retired_at IS NULL
+    ORDER BY enchantment_id
+    """
+)
+
+CREATE_ENCHANTMENT = sqlalchemy.text(
+    """
+    INSERT INTO enchantment (name, effect_description, created_at)
+    VALUES (:name, :effect_description, CURRENT_TIMESTAMP)
+    ON CONFLICT (name) DO NOTHING
+    RETURNING enchantment_id
+    """
+)
+
+ENCHANTMENT_EXISTS = sqlalchemy.text(
+    """
+    SELECT enchantment_id FROM enchantment
+    WHERE enchantment_id = :enchantment_id AND retired_at IS NULL
+    """
+)
+
+UPDATE_ENCHANTMENT_DESCRIPTION = sqlalchemy.text(
+    """
+    UPDATE enchantment
+    SET effect_description = :effect_description,
+        created_at = CURRENT_TIMESTAMP
+    WHERE enchantment_id = :enchantment_id
+    """
+)
+
+
+# Retirement
+
+# Hides the item or enchantment and queues the removal of its rows. Returns
+# nothing if it doesn't exist or is already retired.
+RETIRE_ITEM = sqlalchemy.text(
+    """
+    WITH retired AS (
+        UPDATE item SET retired_at = CURRENT_TIMESTAMP
+        WHERE item_id = :item_id AND retired_at IS NULL
+        RETURNING item_id, name
+    )
+    INSERT INTO retirement (kind, target_id, name)
+    SELECT 'item', item_id, name FROM retired
+    RETURNING retirement_id
+    """
+)
+
+RETIRE_ENCHANTMENT = sqlalchemy.text(
+    """
+    WITH retired AS (
+        UPDATE enchantment SET retired_at = CURRENT_TIMESTAMP
+        WHERE enchantment_id = :enchantment_id AND retired_at IS NULL
+        RETURNING enchantment_id, name
+    )
+    INSERT INTO retirement (kind, target_id, name)
+    SELECT 'enchantment', enchantment_id, name FROM retired
+    RETURNING retirement_id
+    """
+)
+
+# Takes the oldest running retirement that no live worker holds
+CLAIM_RETIREMENT = sqlalchemy.text(
+    """
+    UPDATE retirement
+    SET claimed_by = :worker, claimed_until = CURRENT_TIMESTAMP + make_interval(secs => :lease_seconds)
+    WHERE retirement_id = (
+        SELECT retirement_id FROM retirement
+        WHERE status = 'running' AND (claimed_until IS NULL OR claimed_until < CURRENT_TIMESTAMP)
+        ORDER BY retirement_id
+        LIMIT 1
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING retirement_id, kind, target_id
+    """
+)
+
+# Counts a chunk and renews the lease. Returns nothing once another worker
+# has claimed the retirement, so the chunk rolls back.
+RECORD_RETIREMENT_PROGRESS = sqlalchemy.text(
+    """
+    UPDATE retirement
+    SET rows_removed = rows_removed + :removed,
+        claimed_until = CURRENT_TIMESTAMP + make_interval(secs => :lease_seconds),
+        last_error = NULL
+    WHERE retirement_id = :retirement_id AND claimed_by = :worker
+    RETURNING retirement_id
+    """
+)
+
+# Releases the claim so the next poll retries the retirement
+RECORD_RETIREMENT_ERROR = sqlalchemy.text(
+    """
+    UPDATE retirement
+    SET last_error = :error, claimed_by = NULL, claimed_until = NULL
+    WHERE retirement_id = :retirement_id AND claimed_by = :worker
+    """
+)
+
+# Each chunk locks its players in player_id order before touching their rows,
+# the same order as the write endpoints (player first, then inventory), and
+# bumps their inventory versions. chunk_size bounds the players per chunk.
+RETIRE_ITEM_CHUNK = sqlalchemy.text(
+    """
+    WITH chunk AS (
+        SELECT player_id FROM player
+        WHERE player_id IN (
+            SELECT player_id FROM player_inventory_item
+            WHERE item_id = :target_id
+            LIMIT :chunk_size
+        )
+        ORDER BY player_id
+        FOR UPDATE
+    ),
+    bumped AS (
+        UPDATE player SET inventory_version = inventory_version + 1
+        WHERE player_id IN (SELECT player_id FROM chunk)
+    ),
+    doomed AS (
+        SELECT player_inventory_item_id FROM player_inventory_item
+        WHERE item_id = :target_id AND player_id IN (SELECT player_id FROM chunk)
+    ),
+    unenchanted AS (
+        DELETE FROM item_enchantment
+        WHERE player_id IN (SELECT player_id FROM chunk)
+        AND player_inventory_item_id IN (SELECT player_inventory_item_id FROM doomed)
+    ),
+    removed AS (
+        DELETE FROM player_inventory_item
+        WHERE player_id IN (SELECT player_id FROM chunk)
+        AND player_inventory_item_id IN (SELECT player_inventory_item_id FROM doomed)
+        RETURNING player_id
+    )
+    SELECT player_id FROM removed
+    """
+)
+
+RETIRE_ENCHANTMENT_CHUNK = sqlalchemy.text(
+    """
+    WITH chunk AS (
+        SELECT player_id FROM player
+        WHERE player_id IN (
+            SELECT player_id FROM item_enchantment
+            WHERE enchantment_id = :target_id
+            LIMIT :chunk_size
+        )
+        ORDER BY player_id
+        FOR UPDATE
+    ),
+    bumped AS (
+        UPDATE player SET inventory_version = inventory_version + 1
+        WHERE player_id IN (SELECT player_id FROM chunk)
+    ),
+    removed AS (
+        DELETE FROM item_enchantment
+        WHERE enchantment_id = :target_id
+        AND player_id IN (SELECT player_id FROM chunk)
+        RETURNING player_id
+    )
+    SELECT player_id FROM removed
+    """
+)
+
+# Deletes the retired row once nothing references it and marks the retirement
+# done. A write that began before the retirement can still add a reference
+# after the last chunk; the foreign key then fails this statement and the
+# retirement goes back to removing chunks.
+FINISH_ITEM_RETIREMENT = sqlalchemy.text(
+    """
+    WITH deleted AS (
+        DELETE FROM item
+        WHERE item_id = :target_id AND retired_at IS NOT NULL
+        AND NOT EXISTS (SELECT 1 FROM player_inventory_item WHERE item_id = :target_id)
+        RETURNING item_id
+    )
+    UPDATE retirement
+    SET status = 'done', finished_at = CURRENT_TIMESTAMP, claimed_by = NULL, claimed_until = NULL
+    WHERE retirement_id = :retirement_id AND claimed_by = :worker AND EXISTS (SELECT 1 FROM deleted)
+    RETURNING retirement_id
+    """
+)
+
+FINISH_ENCHANTMENT_RETIREMENT = sqlalchemy.text(
+    """
+    WITH deleted AS (
+        DELETE FROM enchantment
+        WHERE enchantment_id = :target_id AND retired_at IS NOT NULL
+        AND NOT EXISTS (SELECT 1 FROM item_enchantment WHERE enchantment_id = :target_id)
+        RETURNING enchantment_id
+    )
+    UPDATE retirement
+    SET status = 'done', finished_at = CURRENT_TIMESTAMP, claimed_by = NULL, claimed_until = NULL
+    WHERE retirement_id = :retirement_id AND claimed_by = :worker AND EXISTS (SELECT 1 FROM deleted)
+    RETURNING retirement_id
+    """
+)
+
+RETIREMENT_COLUMNS = """
+    retirement_id, kind, target_id, name, status, rows_removed,
+    created_at, finished_at, claimed_until, last_error
+"""
+
+RECENT_RETIREMENTS = sqlalchemy.text(
+    f"""
+    SELECT {RETIREMENT_COLUMNS}
+    FROM retirement
+    ORDER BY retirement_id DESC
+    LIMIT :limit
+    """
+)
+
+# Counting what is left reads the same index the chunks use
+RETIREMENT_STATUS = sqlalchemy.text(
+    f"""
+    SELECT {RETIREMENT_COLUMNS},
+    CASE
+        WHEN status = 'done' THEN 0
+        WHEN kind = 'item' THEN (SELECT count(*) FROM player_inventory_item WHERE item_id = r.target_id)
+        ELSE (SELECT count(*) FROM item_enchantment WHERE enchantment_id = r.target_id)
+    END AS rows_remaining
+    FROM retirement r
+    WHERE retirement_id = :retirement_id
+    """
+)
@@ -0,0 +1,54 @@
+from contextlib import AsyncExitStack
+from typing import Any, AsyncIterator, Callable, Iterable, Optional
+
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+
+from src import responses
+
+# Handlers answer with one JSON object per line when the client sends this
+# Accept header. Rows are written as they are read, so memory stays flat no
+# matter how large the result is.
+#
+# A streamed response outlives the handler, so its transaction has to as
+# well. Handlers open it on an AsyncExitStack and hand the stack over with
+# pop_all(); the response closes it once the last row is sent.
+
+NDJSON = "application/x-ndjson"
+
+
+def wants_ndjson(request: Request) -> bool:
+    return NDJSON in request.headers.get("accept", "")
+
+
+async def in_memory(rows: Iterable, batch_size: int = 1000) -> AsyncIterator[list]:
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def ndjson_response(
+    batches: AsyncIterator[list],
+    encode: Callable[[Any], dict],
+    headers: Optional[dict] = None,
+    transaction: Optional[AsyncExitStack] = None,
+) -> StreamingResponse:
+    """Streams one JSON object per line, one chunk per batch of rows."""
+
+    async def body():
+        try:
+            async for rows in batches:
+                yield b"".join(responses.dumps(encode(row)) + b"\n" for row in rows)
+        finally:
+            if transaction is not None:
+                await transaction.aclose()
+
+    # Also closes the transaction if the client disconnects mid-stream
+    background = BackgroundTask(transaction.aclose) if transaction is not None else None
+    return StreamingResponse(body(), media_type=NDJSON, headers=headers, background=background)
@@ -0,0 +1,170 @@
+import json
+import os
+import statistics
+import time
+from pathlib import Path
+from typing import Callable, Optional
+
+# Query counts come from the statement profiler; plans would be captured
+# inside the timed requests, so never sample them here
+os.environ["SQL_PROFILING"] = "true"
+os.environ["SLOW_QUERY_EXPLAIN_RATE"] = "0"
+# The benchmark loop is far faster than any client limit; never throttle or shed it
+os.environ["RATE_LIMIT_PER_SECOND"] = "0"
+os.environ["SHED_CHECKOUT_WAITERS"] = "0"
+
+import pytest
+import sqlalchemy
+from fastapi.testclient import TestClient
+
+BASELINES_PATH = Path(__file__).parent / "baselines.json"
+RESULTS_PATH = Path(__file__).parent / "results" / "latest.json"
+
+ITERATIONS = int(os.getenv("BENCH_ITERATIONS", "50"))
+WARMUP = int(os.getenv("BENCH_WARMUP", "5"))
+# Latencies only compare within one machine, so their baselines are stored per
+# environment name, e.g. BENCH_ENV=ci on the CI runner
+ENVIRONMENT = os.getenv("BENCH_ENV", "local")
+# Allowed relative slowdown of each percentile against its baseline
+TOLERANCE = float(os.getenv("BENCH_TOLERANCE", "0.25"))
+PERCENTILES = ("p50_ms", "p95_ms")
+
+
+def pytest_addoption(parser):
+    parser.addoption(
+        "--update-baselines",
+        action="store_true",
+        help="record this run's query counts and BENCH_ENV latencies as the new baselines",
+    )
+
+
+@pytest.fixture(scope="session")
+def client():
+    try:
+        from src import database as db
+        with db.engine.connect() as connection:
+            seeded = connection.execute(sqlalchemy.text("SELECT EXISTS (SELECT 1 FROM player_inventory_item)")).scalar()
+    except Exception as e:
+        pytest.skip(f"Benchmarks need a local Postgres ({e.__class__.__name__})")
+    if not seeded:
+        pytest.skip("Benchmarks need a database seeded by V5 - Performance Tuning/data_generator.py")
+
+    from src import config
+    from src.api.server import app
+    with TestClient(app, headers={"access_token": config.get_settings().API_KEY}) as test_client:
+        yield test_client
+
+
+@pytest.fixture(scope="session")
+def sample(client):
+    """Existing rows the benchmarks act on, picked from the seeded data."""
+    from src import database as db
+    with db.engine.connect() as connection:
+        row = connection.execute(sqlalchemy.text(
+            """
+            SELECT pii.player_id, pii.item_id,
+            (SELECT MIN(enchantment_id) FROM enchantment) AS enchantment_id
+            FROM player_inventory_item pii
+            ORDER BY pii.player_inventory_item_id
+            LIMIT 1
+            """
+        )).one()
+        player_ids = connection.execute(sqlalchemy.text(
+            "SELECT player_id FROM player ORDER BY player_id LIMIT 20"
+        )).scalars().all()
+    return {
+        "player_id": row.player_id,
+        "item_id": row.item_id,
+        "enchantment_id": row.enchantment_id,
+        "player_ids": player_ids,
+    }
+
+
+@pytest.fixture(scope="session")
+def baselines(request):
+    stored = json.loads(BASELINES_PATH.read_text()) if BASELINES_PATH.exists() else {}
+    results: dict = {}
+    yield stored, results
+
+    RESULTS_PATH.parent.mkdir(exist_ok=True)
+    RESULTS_PATH.write_text(json.dumps(results, indent=2, sort_keys=True) + "\n")
+    if request.config.getoption("--update-baselines") and results:
+        updated = dict(stored)
+        for name, result in results.items():
+            latency = dict(stored.get(name, {}).get("latency", {}))
+            latency[ENVIRONMENT] = {key: round(result[key], 3) for key in PERCENTILES}
+            updated[name] = {"max_queries": result["max_queries"], "latency": latency}
+        BASELINES_PATH.write_text(json.dumps(updated, indent=2, sort_keys=True) + "\n")
+
+
+def percentile(sorted_values: list, p: float) -> float:
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * p / 100))]
+
+
+@pytest.fixture
+def benchmark(request, baselines):
+    """Times an endpoint and counts its SQL statements, then checks both against the baseline.
+
+    The statement count must stay within its budget everywhere. p50 and p95
+    must stay within TOLERANCE of the latencies stored for BENCH_ENV, if that
+    environment has any.
+
+    setup() runs untimed before each call and returns the call's argument;
+    teardown(result) runs untimed after it, to undo writes.
+    """
+    from src import cache, profiling
+
+    stored, results = baselines
+    updating = request.config.getoption("--update-baselines")
+
+    def run(name: str, call: Callable, setup: Optional[Callable] = None, teardown: Optional[Callable] = None):
+        latencies = []
+        query_counts = []
+        for iteration in range(WARMUP + ITERATIONS):
+            argument = setup() if setup is not None else None
+            # Measure the database path, not the inventory cache
+            cache.inventory_cache.clear()
+            profiling.stats.reset()
+            started = time.perf_counter()
+            result = call(argument) if setup is not None else call()
+            elapsed = (time.perf_counter() - started) * 1000
+            queries = sum(
+                statement["count"]
+                for statement in profiling.stats.top(profiling.MAX_STATEMENTS, "count")
+                if statement["route"] != "background"
+            )
+            if teardown is not None:
+                teardown(result)
+            if iteration >= WARMUP:
+                latencies.append(elapsed)
+                query_counts.append(queries)
+
+        latencies.sort()
+        result = {
+            "iterations": ITERATIONS,
+            "mean_ms": statistics.fmean(latencies),
+            "p50_ms": percentile(latencies, 50),
+            "p95_ms": percentile(latencies, 95),
+            "p99_ms": percentile(latencies, 99),
+            "max_ms": latencies[-1],
+            "max_queries": max(query_counts),
+        }
+        results[name] = result
+        baseline = stored.get(name)
+        if updating or baseline is None:
+            return result
+
+        assert result["max_queries"] <= baseline["max_queries"], (
+            f"{name} issued {result['max_queries']} SQL statements, budget is {baseline['max_queries']}"
+        )
+        latency = baseline.get("latency", {}).get(ENVIRONMENT)
+        if latency is not None:
+            for key in PERCENTILES:
+                limit = latency[key] * (1 + TOLERANCE)
+                assert result[key] <= limit, (
+                    f"{name} {key[:-3]} {result[key]:.2f}ms exceeds the {ENVIRONMENT} baseline "
+                    f"{latency[key]:.2f}ms + {TOLERANCE:.0%}"
+                )
+        return result
+
+    return run
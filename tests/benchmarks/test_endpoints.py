@@ -0,0 +1,172 @@
+import uuid
+
+import sqlalchemy
+
+# Each benchmark undoes its own writes so the seeded data stays the same
+# from run to run. Run with:
+#
+#   pytest tests/benchmarks
+#   pytest tests/benchmarks --update-baselines
+
+
+def ok(response):
+    assert response.status_code < 400, response.text
+    return response
+
+
+def unique_name(prefix: str) -> str:
+    return f"{prefix} {uuid.uuid4().hex[:12]}"
+
+
+# Players
+
+def test_get_inventory_page(client, sample, benchmark):
+    benchmark(
+        "GET /players/{player_id}/inventory?limit=50",
+        lambda: ok(client.get(f"/players/{sample['player_id']}/inventory", params={"limit": 50})),
+    )
+
+def test_get_inventory_full(client, sample, benchmark):
+    benchmark(
+        "GET /players/{player_id}/inventory",
+        lambda: ok(client.get(f"/players/{sample['player_id']}/inventory")),
+    )
+
+def test_get_inventories(client, sample, benchmark):
+    ids = ",".join(str(player_id) for player_id in sample["player_ids"])
+    benchmark(
+        "GET /players/inventory?ids=20",
+        lambda: ok(client.get("/players/inventory", params={"ids": ids})),
+    )
+
+def test_add_item(client, sample, benchmark):
+    player_id, item_id = sample["player_id"], sample["item_id"]
+    benchmark(
+        "POST /players/{player_id}/inventory",
+        lambda: ok(client.post(f"/players/{player_id}/inventory", json={"item_id": item_id, "quantity": 1})),
+        teardown=lambda _: ok(client.patch(f"/players/{player_id}/inventory/{item_id}", json={"quantity": 1})),
+    )
+
+def test_add_items_bulk(client, sample, benchmark):
+    player_id, item_id = sample["player_id"], sample["item_id"]
+    body = [{"item_id": item_id, "quantity": 1}, {"item_id": item_id, "quantity": 1}]
+    benchmark(
+        "POST /players/{player_id}/inventory (list)",
+        lambda: ok(client.post(f"/players/{player_id}/inventory", json=body)),
+        teardown=lambda _: ok(client.patch(f"/players/{player_id}/inventory/{item_id}", json={"quantity": 2})),
+    )
+
+def test_remove_item_quantity(client, sample, benchmark):
+    player_id, item_id = sample["player_id"], sample["item_id"]
+    benchmark(
+        "PATCH /players/{player_id}/inventory/{item_id}",
+        lambda _: ok(client.patch(f"/players/{player_id}/inventory/{item_id}", json={"quantity": 1})),
+        setup=lambda: ok(client.post(f"/players/{player_id}/inventory", json={"item_id": item_id, "quantity": 1})),
+    )
+
+def test_enchant_item(client, sample, benchmark):
+    player_id, item_id = sample["player_id"], sample["item_id"]
+    benchmark(
+        "POST /players/{player_id}/inventory/{item_id}/enchant",
+        lambda: ok(client.post(
+            f"/players/{player_id}/inventory/{item_id}/enchant",
+            json={"enchantment_id": sample["enchantment_id"]},
+        )),
+    )
+
+def test_remove_enchantments(client, sample, benchmark):
+    player_id, item_id = sample["player_id"], sample["item_id"]
+    benchmark(
+        "DELETE /players/{player_id}/inventory/{item_id}/enchantments",
+        lambda _: ok(client.delete(f"/players/{player_id}/inventory/{item_id}/enchantments")),
+        setup=lambda: ok(client.post(
+            f"/players/{player_id}/inventory/{item_id}/enchant",
+            json={"enchantment_id": sample["enchantment_id"]},
+        )),
+    )
+
+def test_create_player(client, benchmark):
+    benchmark(
+        "POST /players",
+        lambda: ok(client.post("/players", json={"username": unique_name("bench").replace(" ", "_")})),
+    )
+
+
+# Items
+
+def test_get_items(client, benchmark):
+    benchmark("GET /items", lambda: ok(client.get("/items")))
+
+def test_get_items_filtered(client, benchmark):
+    benchmark(
+        "GET /items?item_type&rarity",
+        lambda: ok(client.get("/items", params={"item_type": "weapon", "rarity": "epic"})),
+    )
+
+def test_get_item(client, sample, benchmark):
+    benchmark("GET /items/{item_id}", lambda: ok(client.get(f"/items/{sample['item_id']}")))
+
+def test_create_item(client, benchmark):
+    benchmark(
+        "POST /items",
+        lambda: ok(client.post("/items", json={"name": unique_name("Bench Item"), "item_type": "weapon", "rarity": "common"})),
+        teardown=lambda response: ok(client.delete(f"/items/{response.json()['item']['item_id']}")),
+    )
+
+def test_delete_item(client, benchmark):
+    benchmark(
+        "DELETE /items/{item_id}",
+        lambda item_id: ok(client.delete(f"/items/{item_id}")),
+        setup=lambda: ok(client.post(
+            "/items", json={"name": unique_name("Bench Item"), "item_type": "food", "rarity": "rare"}
+        )).json()["item"]["item_id"],
+    )
+
+
+# Enchantments
+
+def enchantment_id(name: str) -> int:
+    # Enchantment responses don't include the id, so look it up by its unique name
+    from src import database as db
+    with db.engine.connect() as connection:
+        return connection.execute(
+            sqlalchemy.text("SELECT enchantment_id FROM enchantment WHERE name = :name"), {"name": name}
+        ).scalar_one()
+
+def create_enchantment(client) -> int:
+    name = unique_name("Bench Enchantment")
+    ok(client.post("/enchantments", json={"name": name, "effect_description": "Benchmark"}))
+    return enchantment_id(name)
+
+def test_get_enchantments(client, benchmark):
+    benchmark("GET /enchantments", lambda: ok(client.get("/enchantments")))
+
+def test_create_enchantment(client, benchmark):
+    benchmark(
+        "POST /enchantments",
+        lambda: ok(client.post(
+            "/enchantments", json={"name": unique_name("Bench Enchantment"), "effect_description": "Benchmark"}
+        )),
+        teardown=lambda response: ok(client.delete(
+            f"/enchantments/{enchantment_id(response.json()['enchantment']['name'])}"
+        )),
+    )
+
+def test_update_enchantment_effect_description(client, benchmark):
+    created_id = create_enchantment(client)
+    try:
+        benchmark(
+            "PUT /enchantments/{enchantment_id}/effect_description",
+            lambda: ok(client.put(
+                f"/enchantments/{created_id}/effect_description", json={"effect_description": "Benchmark"}
+            )),
+        )
+    finally:
+        ok(client.delete(f"/enchantments/{created_id}"))
+
+def test_delete_enchantment(client, benchmark):
+    benchmark(
+        "DELETE /enchantments/{enchantment_id}",
+        lambda created_id: ok(client.delete(f"/enchantments/{created_id}")),
+        setup=lambda: create_enchantment(client),
+    )
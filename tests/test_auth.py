@@ -0,0 +1,30 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from src.api import auth
+from src.api import server
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(auth, "admin_keys", {"ops-secret"})
+    # Without a with block, so the lifespan never connects to the database
+    return TestClient(server.app)
+
+
+def test_admin_key_reaches_admin_endpoints(client):
+    assert client.get("/admin/cache", headers={"access_token": "ops-secret"}).status_code == 200
+
+
+def test_game_server_key_is_forbidden_on_admin_endpoints(client):
+    assert client.get("/admin/cache", headers={"access_token": "brat"}).status_code == 403
+    assert client.delete("/admin/statements", headers={"access_token": "brat"}).status_code == 403
+
+
+def test_unknown_key_is_unauthorized_on_admin_endpoints(client):
+    assert client.get("/admin/cache", headers={"access_token": "nope"}).status_code == 401
+    assert client.get("/admin/cache").status_code == 401
+
+
+def test_admin_key_is_not_a_game_server_key(client):
+    assert client.get("/enchantments", headers={"access_token": "ops-secret"}).status_code == 401
@@ -0,0 +1,84 @@
+from src import cache
+
+
+def make_cache(max_entries: int = 3, ttl_seconds: float = 60) -> cache.LRUCache:
+    return cache.LRUCache(max_entries=max_entries, ttl_seconds=ttl_seconds)
+
+
+def test_put_then_get():
+    lru = make_cache()
+    assert lru.put("a", 1, lru.token())
+    assert lru.get("a") == 1
+    assert lru.get("b") is None
+    assert lru.stats()["hits"] == 1
+    assert lru.stats()["misses"] == 1
+
+
+def test_evicts_least_recently_used():
+    lru = make_cache(max_entries=2)
+    lru.put("a", 1, lru.token())
+    lru.put("b", 2, lru.token())
+    lru.get("a")
+    lru.put("c", 3, lru.token())
+    assert lru.get("b") is None
+    assert lru.get("a") == 1
+    assert lru.get("c") == 3
+    assert lru.stats()["evictions"] == 1
+
+
+def test_entries_expire(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache.time, "monotonic", lambda: now[0])
+    lru = make_cache(ttl_seconds=5)
+    lru.put("a", 1, lru.token())
+    now[0] += 4
+    assert lru.get("a") == 1
+    now[0] += 2
+    assert lru.get("a") is None
+    assert lru.stats()["expirations"] == 1
+
+
+def test_put_with_token_older_than_invalidation_is_dropped():
+    lru = make_cache()
+    token = lru.token()
+    # A write lands while the read that took the token is still running
+    lru.invalidate("a")
+    assert not lru.put("a", "stale", token)
+    assert lru.get("a") is None
+    assert lru.put("a", "fresh", lru.token())
+    assert lru.get("a") == "fresh"
+
+
+def test_invalidation_only_affects_its_key():
+    lru = make_cache()
+    token = lru.token()
+    lru.invalidate("a")
+    assert lru.put("b", 2, token)
+
+
+def test_clear_rejects_every_older_token():
+    lru = make_cache()
+    lru.put("a", 1, lru.token())
+    token = lru.token()
+    lru.clear()
+    assert lru.get("a") is None
+    assert not lru.put("b", 2, token)
+    assert lru.put("b", 2, lru.token())
+
+
+def test_invalidate_many_beyond_capacity_clears():
+    lru = make_cache(max_entries=2)
+    lru.put("a", 1, lru.token())
+    token = lru.token()
+    lru.invalidate_many(["x", "y", "z"])
+    assert lru.get("a") is None
+    assert not lru.put("a", 1, token)
+
+
+def test_forgotten_invalidations_still_reject_older_tokens():
+    lru = make_cache(max_entries=2)
+    token = lru.token()
+    for key in ("a", "b", "c"):
+        lru.invalidate(key)
+    # "a" fell out of the invalidation log, so the floor rose past it
+    assert not lru.put("a", "stale", token)
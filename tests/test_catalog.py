@@ -0,0 +1,44 @@
+from types import SimpleNamespace
+
+from src import catalog
+
+ITEMS = [
+    SimpleNamespace(item_id=1, name="Sword", item_type="weapon", rarity="common"),
+    SimpleNamespace(item_id=2, name="Shield", item_type="armor", rarity="rare"),
+    SimpleNamespace(item_id=3, name="Axe", item_type="weapon", rarity="rare"),
+    SimpleNamespace(item_id=4, name="Helm", item_type="armor", rarity="common"),
+]
+
+
+def snapshot() -> catalog.Catalog:
+    items = catalog.Catalog()
+    items._set_items(ITEMS, 1)
+    return items
+
+
+def ids(rows) -> list:
+    return [row.item_id for row in rows]
+
+
+def test_filter_items_without_filters():
+    assert ids(snapshot().filter_items(None, None)) == [1, 2, 3, 4]
+
+
+def test_filter_items_by_type():
+    assert ids(snapshot().filter_items("weapon", None)) == [1, 3]
+
+
+def test_filter_items_by_rarity():
+    assert ids(snapshot().filter_items(None, "rare")) == [2, 3]
+
+
+def test_filter_items_by_both():
+    assert ids(snapshot().filter_items("armor", "common")) == [4]
+    assert ids(snapshot().filter_items("armor", "legendary")) == []
+
+
+def test_ready_once_both_versions_are_loaded():
+    items = snapshot()
+    assert not items.ready
+    items._set_enchantments([], 1)
+    assert items.ready
@@ -0,0 +1,29 @@
+import pytest
+from fastapi import HTTPException
+
+from src.api.players import decode_cursor, encode_cursor
+
+
+def test_round_trip():
+    cursor = encode_cursor(5, "Iron Sword", 42)
+    assert decode_cursor(cursor) == (5, "Iron Sword", 42)
+
+
+def test_cursor_is_url_safe():
+    cursor = encode_cursor(1, "?&/+ é", 7)
+    assert all(character.isalnum() or character in "-_" for character in cursor)
+    assert decode_cursor(cursor) == (1, "?&/+ é", 7)
+
+
+@pytest.mark.parametrize("cursor", [
+    "not a cursor",
+    "",
+    encode_cursor(1, "Sword", 2)[:-3],
+    # Valid base64 of JSON with the wrong shape or types
+    "WzEsMl0",
+    "WyIxIiwiU3dvcmQiLDJd",
+])
+def test_invalid_cursor_is_a_400(cursor):
+    with pytest.raises(HTTPException) as raised:
+        decode_cursor(cursor)
+    assert raised.value.status_code == 400
@@ -0,0 +1,36 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from sqlalchemy import exc
+
+from src import database as db
+
+
+@pytest.fixture
+def stats(monkeypatch):
+    checkout_stats = db.CheckoutStats()
+    monkeypatch.setattr(db, "checkout_stats", checkout_stats)
+    return checkout_stats
+
+
+def test_waiting_returns_to_zero_under_concurrent_checkouts(stats):
+    def checkout(_):
+        with db._timed_checkout():
+            pass
+
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        list(pool.map(checkout, range(20000)))
+    assert stats.waiting == 0
+    assert stats.checkouts == 20000
+
+
+def test_timeouts_and_failures_stop_waiting(stats):
+    with pytest.raises(exc.TimeoutError):
+        with db._timed_checkout():
+            assert stats.waiting == 1
+            raise exc.TimeoutError()
+    with pytest.raises(ConnectionError):
+        with db._timed_checkout():
+            raise ConnectionError()
+    snapshot = stats.snapshot()
+    assert (snapshot["waiting"], snapshot["timeouts"], snapshot["checkouts"]) == (0, 1, 0)
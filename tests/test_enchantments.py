@@ -0,0 +1,43 @@
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+
+from src import catalog
+from src import streaming
+from src.api import server
+
+API_KEY = {"access_token": "brat"}
+
+
+@pytest.fixture
+def client(monkeypatch):
+    snapshot = catalog.Catalog()
+    snapshot._set_items([], 3)
+    snapshot._set_enchantments(
+        [SimpleNamespace(enchantment_id=1, name="Ember Blessing", effect_description="Burns")], 7
+    )
+    monkeypatch.setattr(catalog, "catalog", snapshot)
+    # Without a with block, so the lifespan never connects to the database
+    return TestClient(server.app)
+
+
+def test_json_and_ndjson_get_different_etags(client):
+    as_json = client.get("/enchantments", headers=API_KEY)
+    as_ndjson = client.get("/enchantments", headers={**API_KEY, "Accept": streaming.NDJSON})
+    assert as_json.status_code == as_ndjson.status_code == 200
+    assert as_json.headers["ETag"] != as_ndjson.headers["ETag"]
+    assert as_json.headers["Vary"] == as_ndjson.headers["Vary"] == "Accept"
+
+
+def test_if_none_match_only_matches_the_same_representation(client):
+    json_etag = client.get("/enchantments", headers=API_KEY).headers["ETag"]
+
+    same = client.get("/enchantments", headers={**API_KEY, "If-None-Match": json_etag})
+    assert same.status_code == 304
+
+    other = client.get(
+        "/enchantments", headers={**API_KEY, "If-None-Match": json_etag, "Accept": streaming.NDJSON}
+    )
+    assert other.status_code == 200
+    assert other.text == '{"name":"Ember Blessing","effect_description":"Burns"}\n'
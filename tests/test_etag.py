@@ -0,0 +1,44 @@
+from starlette.requests import Request
+
+from src import etag
+
+
+def request(if_none_match: str | None = None) -> Request:
+    headers = [(b"if-none-match", if_none_match.encode())] if if_none_match is not None else []
+    return Request({"type": "http", "headers": headers})
+
+
+def test_make_etag_quotes_the_joined_parts():
+    assert etag.make_etag("inventory", 5, 12) == '"inventory-5-12"'
+
+
+def test_make_etag_tells_ndjson_apart():
+    assert etag.make_etag("items", 3, ndjson=True) == '"items-3-ndjson"'
+    assert etag.make_etag("items", 3, ndjson=True) != etag.make_etag("items", 3)
+
+
+def test_matches_any_listed_etag():
+    assert etag.matches(request('"items-2", "items-3"'), '"items-3"')
+    assert not etag.matches(request('"items-2"'), '"items-3"')
+
+
+def test_matches_without_header():
+    assert not etag.matches(request(), '"items-3"')
+    assert not etag.matches(request(""), '"items-3"')
+
+
+def test_matches_wildcard():
+    assert etag.matches(request("*"), '"items-3"')
+
+
+def test_matches_weak_validators():
+    assert etag.matches(request('W/"items-3"'), '"items-3"')
+    assert etag.matches(request('"items-2", W/"items-3"'), '"items-3"')
+    assert not etag.matches(request('W/"items-2"'), '"items-3"')
+
+
+def test_not_modified_repeats_the_etag_and_vary():
+    response = etag.not_modified('"items-3"')
+    assert response.status_code == 304
+    assert response.headers["ETag"] == '"items-3"'
+    assert response.headers["Vary"] == "Accept"
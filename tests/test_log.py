@@ -0,0 +1,36 @@
+import logging
+
+from src import log
+
+
+def record(level: int) -> logging.LogRecord:
+    return logging.makeLogRecord({"levelno": level, "levelname": logging.getLevelName(level)})
+
+
+def test_sampling_filter_drops_records_past_the_rate(monkeypatch):
+    monkeypatch.setattr(log.random, "random", lambda: 0.5)
+    sampling = log.SamplingFilter({logging.INFO: 0.25, logging.DEBUG: 0.75})
+    assert not sampling.filter(record(logging.INFO))
+    assert sampling.filter(record(logging.DEBUG))
+
+
+def test_sampling_filter_keeps_levels_without_a_rate(monkeypatch):
+    monkeypatch.setattr(log.random, "random", lambda: 0.99)
+    sampling = log.SamplingFilter({logging.INFO: 0.0})
+    assert sampling.filter(record(logging.WARNING))
+    assert sampling.filter(record(logging.ERROR))
+
+
+def test_sampling_filter_keeps_everything_at_rate_one(monkeypatch):
+    monkeypatch.setattr(log.random, "random", lambda: 0.99)
+    assert log.SamplingFilter({logging.INFO: 1.0}).filter(record(logging.INFO))
+
+
+def test_sampling_filter_stamps_the_request_id():
+    token = log.request_id.set("abc123")
+    try:
+        kept = record(logging.WARNING)
+        assert log.SamplingFilter({}).filter(kept)
+        assert kept.request_id == "abc123"
+    finally:
+        log.request_id.reset(token)
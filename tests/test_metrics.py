@@ -0,0 +1,32 @@
+from fastapi import FastAPI
+
+from src import metrics
+
+app = FastAPI()
+
+
+@app.get("/players/{player_id}/inventory")
+def inventory(player_id: int):
+    return []
+
+
+def scope(path: str, **extra) -> dict:
+    return {"type": "http", "method": "GET", "path": path, "app": app, **extra}
+
+
+def test_route_template_uses_the_matched_route():
+    route = next(route for route in app.routes if route.path == "/players/{player_id}/inventory")
+    assert metrics.route_template(scope("/players/5/inventory", route=route)) == "/players/{player_id}/inventory"
+
+
+def test_route_template_matches_plain_starlette_routes():
+    assert metrics.route_template(scope("/openapi.json")) == "/openapi.json"
+    assert metrics.route_template(scope("/docs")) == "/docs"
+
+
+def test_route_template_groups_unmatched_paths():
+    assert metrics.route_template(scope("/players/5/nothing-here")) == "unmatched"
+
+
+def test_route_template_outside_a_request():
+    assert metrics.route_template(None) == "background"
@@ -0,0 +1,53 @@
+import pytest
+
+from src import profiling
+
+
+@pytest.mark.parametrize(
+    "statement",
+    [
+        "SELECT item_id, name FROM item WHERE item_id = %(item_id)s",
+        "select count(*) from player",
+        "   \n\tSELECT 1",
+        "-- inventory page\nSELECT * FROM player_inventory_item WHERE player_id = %(player_id)s",
+        "/* route: /items */ SELECT * FROM item",
+        "/* multi\n   line */\n-- and another\n  WITH owned AS (SELECT item_id FROM player_inventory_item) SELECT * FROM owned",
+        "SELECT pg_current_wal_lsn()",
+        "SELECT * FROM item WHERE name = 'updated_at'",
+    ],
+)
+def test_read_only_statements(statement):
+    assert profiling.read_only(statement)
+
+
+@pytest.mark.parametrize(
+    "statement",
+    [
+        # Writes inside a CTE still run under EXPLAIN ANALYZE
+        "WITH p AS (UPDATE player SET inventory_version = inventory_version + 1 RETURNING player_id) SELECT * FROM p",
+        "WITH removed AS (DELETE FROM item_enchantment RETURNING *) SELECT count(*) FROM removed",
+        "WITH added AS (INSERT INTO item (name) VALUES ('Sword') RETURNING item_id) SELECT item_id FROM added",
+        "with m as (merge into item using src on true when matched then do nothing) select 1",
+        # Side effects in a plain SELECT
+        "SELECT pg_notify('catalog_changed', 'item:3')",
+        "SELECT nextval('player_inventory_item_player_inventory_item_id_seq')",
+        "SELECT setval('item_item_id_seq', 10)",
+        "SELECT set_config('statement_timeout', '0', false)",
+        "SELECT pg_advisory_xact_lock(42)",
+        "SELECT * INTO item_copy FROM item",
+        # Row locks
+        "SELECT * FROM player WHERE player_id = %(player_id)s FOR UPDATE",
+        "SELECT * FROM player WHERE player_id = %(player_id)s FOR NO KEY UPDATE",
+        "SELECT * FROM player WHERE player_id = %(player_id)s FOR SHARE",
+        "SELECT * FROM player WHERE player_id = %(player_id)s FOR KEY SHARE",
+        # Not a query at all
+        "UPDATE item SET name = 'Axe' WHERE item_id = 1",
+        "INSERT INTO item (name) VALUES ('Sword')",
+        "-- SELECT\nDELETE FROM item",
+        "/* SELECT */ UPDATE item SET name = 'Axe'",
+        "EXPLAIN SELECT 1",
+        "",
+    ],
+)
+def test_statements_that_must_not_be_explained(statement):
+    assert not profiling.read_only(statement)
@@ -0,0 +1,52 @@
+from types import SimpleNamespace
+
+from src import ratelimit
+
+
+def freeze(monkeypatch, now: list):
+    monkeypatch.setattr(ratelimit.time, "monotonic", lambda: now[0])
+
+
+def test_bucket_allows_a_burst_then_limits(monkeypatch):
+    now = [100.0]
+    freeze(monkeypatch, now)
+    bucket = ratelimit.TokenBucket(rate=10, burst=3)
+    assert [bucket.take() for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert bucket.take() == 0.1
+
+
+def test_bucket_refills_at_its_rate_up_to_the_burst(monkeypatch):
+    now = [100.0]
+    freeze(monkeypatch, now)
+    bucket = ratelimit.TokenBucket(rate=10, burst=3)
+    for _ in range(3):
+        bucket.take()
+    now[0] += 0.25
+    assert [bucket.take() for _ in range(2)] == [0.0, 0.0]
+    assert bucket.take() > 0
+    now[0] += 60
+    assert [bucket.take() for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert bucket.take() > 0
+
+
+def test_zero_rate_is_unlimited():
+    bucket = ratelimit.TokenBucket(rate=0, burst=0)
+    assert all(bucket.take() == 0.0 for _ in range(1000))
+
+
+def test_parse_api_keys():
+    settings = SimpleNamespace(
+        API_KEY="main",
+        API_KEYS="ops:k1, load:k2:0 ,bot:k3:5,batch:k4:5:50",
+        RATE_LIMIT_PER_SECOND=100,
+        RATE_LIMIT_BURST=200,
+    )
+    clients = ratelimit.parse_api_keys(settings)
+    limits = {key: (client.name, client.bucket.rate, client.bucket.burst) for key, client in clients.items()}
+    assert limits == {
+        "main": ("default", 100, 200),
+        "k1": ("ops", 100, 200),
+        "k2": ("load", 0, 0),
+        "k3": ("bot", 5, 10),
+        "k4": ("batch", 5, 50),
+    }
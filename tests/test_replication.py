@@ -0,0 +1,51 @@
+import pytest
+
+from src import replication
+
+
+@pytest.mark.parametrize("text, lsn", [
+    ("0/0", 0),
+    ("0/16B3748", 0x16B3748),
+    ("1/0", 1 << 32),
+    ("FFFFFFFF/FFFFFFFF", (1 << 64) - 1),
+    ("a/b", (0xA << 32) | 0xB),
+])
+def test_parse_lsn(text, lsn):
+    assert replication.parse_lsn(text) == lsn
+    assert replication.parse_lsn(replication.format_lsn(lsn)) == lsn
+
+
+@pytest.mark.parametrize("text", [None, "", "16B3748", "0/", "/1", "0/123456789", "g/1", "0/1 "])
+def test_malformed_lsn_is_none(text):
+    assert replication.parse_lsn(text) is None
+
+
+def test_is_stale():
+    assert replication.is_stale(5, 6)
+    assert not replication.is_stale(6, 6)
+    assert not replication.is_stale(5, None)
+    # Copies read without replicas carry no LSN
+    assert not replication.is_stale(None, 6)
+
+
+def test_recent_writes_follow_the_request_commit():
+    writes = replication.RecentWrites(max_entries=2)
+    lsns = replication.RequestLsns()
+    token = replication.current.set(lsns)
+    try:
+        writes.record([1])
+        assert writes.min_lsn(1) is None
+
+        replication.record_commit(10)
+        writes.record([1, 2])
+        replication.record_commit(5)
+        assert lsns.commit_lsn == 10
+        writes.record([3])
+        assert writes.min_lsn(3) == 10
+        # Bounded: the oldest key fell out
+        assert writes.min_lsn(1) is None
+
+        lsns.min_lsn = 20
+        assert writes.min_lsn(3) == 20
+    finally:
+        replication.current.reset(token)
@@ -0,0 +1,79 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy.exc import DBAPIError
+
+from src import retry
+
+
+class DriverError(Exception):
+    def __init__(self, sqlstate):
+        super().__init__(sqlstate)
+        self.sqlstate = sqlstate
+
+
+def db_error(sqlstate) -> DBAPIError:
+    return DBAPIError("SELECT 1", {}, DriverError(sqlstate))
+
+
+@pytest.mark.parametrize("sqlstate, retryable", [
+    ("40001", "40001"),
+    ("40P01", "40P01"),
+    ("23505", None),
+    ("55P03", None),
+    (None, None),
+])
+def test_retryable_sqlstate(sqlstate, retryable):
+    assert retry.retryable_sqlstate(db_error(sqlstate)) == retryable
+
+
+@pytest.fixture
+def transactions(monkeypatch):
+    """Replaces db.begin with a fake that counts the transactions opened."""
+    opened = []
+
+    @asynccontextmanager
+    async def begin(isolation_level=None):
+        opened.append(isolation_level)
+        yield object()
+
+    monkeypatch.setattr(retry.db, "begin", begin)
+    monkeypatch.setattr(retry.settings, "TX_RETRY_BASE_DELAY_SECONDS", 0)
+    monkeypatch.setattr(retry.settings, "TX_MAX_RETRIES", 2)
+    return opened
+
+
+def failing(*sqlstates):
+    remaining = list(sqlstates)
+
+    async def work(connection):
+        if remaining:
+            raise db_error(remaining.pop(0))
+        return "done"
+
+    return work
+
+
+def test_retries_serialization_failures_and_deadlocks(transactions):
+    result = asyncio.run(retry.run_transaction("test_retry", failing("40001", "40P01")))
+    assert result == "done"
+    assert len(transactions) == 3
+    counters = retry.stats.snapshot()["test_retry"]
+    assert counters["serialization_failure"] >= 1
+    assert counters["deadlock_detected"] >= 1
+
+
+def test_other_errors_propagate_without_retrying(transactions):
+    with pytest.raises(DBAPIError):
+        asyncio.run(retry.run_transaction("test_no_retry", failing("23505")))
+    assert len(transactions) == 1
+
+
+def test_gives_up_with_a_503(transactions):
+    with pytest.raises(HTTPException) as raised:
+        asyncio.run(retry.run_transaction("test_give_up", failing("40001", "40001", "40001")))
+    assert raised.value.status_code == 503
+    assert raised.value.headers == {"Retry-After": "1"}
+    assert len(transactions) == 3
@@ -0,0 +1,24 @@
+import asyncio
+
+from starlette.requests import Request
+
+from src import streaming
+
+
+def request(accept: str | None) -> Request:
+    headers = [(b"accept", accept.encode())] if accept is not None else []
+    return Request({"type": "http", "headers": headers})
+
+
+def test_wants_ndjson():
+    assert streaming.wants_ndjson(request("application/x-ndjson"))
+    assert streaming.wants_ndjson(request("application/x-ndjson, application/json;q=0.5"))
+    assert not streaming.wants_ndjson(request("application/json"))
+    assert not streaming.wants_ndjson(request(None))
+
+
+def test_in_memory_batches_rows():
+    async def collect():
+        return [batch async for batch in streaming.in_memory(range(5), batch_size=2)]
+
+    assert asyncio.run(collect()) == [[0, 1], [2, 3], [4]]